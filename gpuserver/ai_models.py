@@ -1,27 +1,323 @@
+import _thread
 import asyncio
+import queue
+import threading
 import base64
+import hashlib
 import logging
-from typing import Optional, Dict, AsyncIterator
-from threading import Lock
+import os
+import time
+from collections import OrderedDict
+from functools import cached_property
+from typing import Optional, AsyncIterator, Awaitable, Callable, Dict, List, Sequence, Set, Tuple, Union
 
 # Initialize logger first
 logger = logging.getLogger(__name__)
 
 # Import LLM engine from llm module
-from llm import get_llm_engine
+from llm import FallbackText, get_llm_engine, remove_llm_engine, ResponseCache
 # Import ASR engine from asr module
 from asr import get_asr_engine
 # Import TTS engine from tts module
-from tts import get_tts_engine
+from tts import FallbackAudio, get_tts_engine
 # Import RAG engine from rag module
 from rag import get_rag_engine
 # Import Video engine from musetalk module
-from musetalk import get_video_engine, get_streaming_engine, warmup_streaming_engine
+from musetalk import FallbackVideo, get_video_engine, get_streaming_engine, warmup_streaming_engine
 
 from config import get_settings
+from webrtc_streamer import get_webrtc_streamer
 
 settings = get_settings()
 
+# 各子引擎的并发信号量（模块级，所有 tutor 共享同一块 GPU）
+_llm_sem = asyncio.Semaphore(settings.llm_max_concurrency)
+_asr_sem = asyncio.Semaphore(settings.asr_max_concurrency)
+_tts_sem = asyncio.Semaphore(settings.tts_max_concurrency)
+_video_sem = asyncio.Semaphore(settings.video_max_concurrency)
+
+# 视频生成排队超过该时间（秒）时通知调用方（如提示客户端显示等待状态）
+_VIDEO_QUEUED_NOTICE_DELAY = 0.2
+
+
+async def _acquire_video_slot(on_queued: Optional[Callable[[], Awaitable[None]]] = None):
+    """
+    获取视频生成并发名额（_video_sem），排队超过 _VIDEO_QUEUED_NOTICE_DELAY 秒时调用 on_queued
+
+    Args:
+        on_queued: 排队通知回调（可选）
+    """
+    if on_queued is None or not _video_sem.locked():
+        await _video_sem.acquire()
+        return
+
+    acquire = asyncio.ensure_future(_video_sem.acquire())
+    try:
+        done, _ = await asyncio.wait({acquire}, timeout=_VIDEO_QUEUED_NOTICE_DELAY)
+        if not done:
+            await on_queued()
+            await acquire
+    except BaseException:
+        # 已拿到名额则归还，否则撤销排队
+        if acquire.done() and not acquire.cancelled() and acquire.exception() is None:
+            _video_sem.release()
+        else:
+            acquire.cancel()
+        raise
+
+
+# 流式输出的合并粒度：凑够 N 个 token、距上次输出超过该间隔或遇到句末标点时输出一次
+_STREAM_CHUNK_TOKENS = 8
+_STREAM_CHUNK_INTERVAL = 0.02
+_SENTENCE_ENDINGS = frozenset("。！？.!?")
+
+def _split_sentences(sentence_buffer: str, token: str) -> Tuple[List[str], str]:
+    """
+    流式切句：把新 token 追加到缓冲区，只扫描新到达的字符
+
+    Args:
+        sentence_buffer: 尚未成句的文本
+        token: 新到达的文本
+
+    Returns:
+        Tuple[List[str], str]: (完整句子列表（含句末标点，已去除首尾空白）, 剩余未成句的文本)
+    """
+    # 快速路径：新文本中没有句末标点（最常见的情况）时直接拼接返回
+    if _SENTENCE_ENDINGS.isdisjoint(token):
+        return [], sentence_buffer + token
+
+    sentences = []
+    start = 0
+    offset = len(sentence_buffer)
+    sentence_buffer += token
+    for i in range(offset, len(sentence_buffer)):
+        if sentence_buffer[i] in _SENTENCE_ENDINGS:
+            sentence = sentence_buffer[start:i].strip()
+            if sentence:
+                sentences.append(sentence + sentence_buffer[i])
+            start = i + 1
+    return sentences, sentence_buffer[start:] if start else sentence_buffer
+
+
+# 推流帧数统计：热路径只累加计数，由后台任务每 _STATS_FLUSH_INTERVAL 秒汇总输出一次日志
+_STATS_FLUSH_INTERVAL = 5
+_frame_stats: Dict[str, int] = {}
+_stats_task: Optional[asyncio.Task] = None
+
+
+def _count_frames(session_id: str, count: int):
+    """
+    累加某个会话已推送的帧数，按需启动后台汇总任务
+
+    Args:
+        session_id: 会话 ID
+        count: 本次推送的帧数
+    """
+    global _stats_task
+    _frame_stats[session_id] = _frame_stats.get(session_id, 0) + count
+    if _stats_task is None or _stats_task.done():
+        _stats_task = asyncio.get_running_loop().create_task(_flush_frame_stats())
+
+
+async def _flush_frame_stats():
+    """定期输出各会话的推流帧数，没有新数据时退出（下次推流时重新启动）"""
+    while True:
+        await asyncio.sleep(_STATS_FLUSH_INTERVAL)
+        if not _frame_stats:
+            return
+        stats = _frame_stats.copy()
+        _frame_stats.clear()
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "Streamed frames in last %ds: %s",
+                _STATS_FLUSH_INTERVAL,
+                ", ".join(f"{session_id}={count}" for session_id, count in stats.items())
+            )
+
+
+# 视频帧批量推送：凑够 N 帧或距批次首帧超过该间隔（秒）时推送一次；每次流的首帧立即推送
+_FRAME_BATCH_SIZE = 4
+_FRAME_BATCH_INTERVAL = 0.04
+
+
+class _FrameBatcher:
+    """把逐帧的 stream_frame 调用合并为 stream_frames 批量推送"""
+
+    def __init__(self, streamer, session_id: str):
+        """
+        Args:
+            streamer: WebRTC streamer
+            session_id: 会话 ID
+        """
+        self.streamer = streamer
+        self.session_id = session_id
+        self.frame_count = 0
+        self._frames = []
+        self._first_at = 0.0
+
+    async def add(self, frame):
+        """
+        加入一帧，满足条件时推送当前批次
+
+        Args:
+            frame: numpy array (H, W, 3) BGR 帧
+        """
+        if not self._frames:
+            self._first_at = time.monotonic()
+        self._frames.append(frame)
+        if (
+            self.frame_count == 0
+            or len(self._frames) >= _FRAME_BATCH_SIZE
+            or time.monotonic() - self._first_at >= _FRAME_BATCH_INTERVAL
+        ):
+            await self.flush()
+
+    async def flush(self):
+        """推送剩余的帧"""
+        if self._frames:
+            frames, self._frames = self._frames, []
+            await self.streamer.stream_frames(self.session_id, frames)
+            self.frame_count += len(frames)
+            _count_frames(self.session_id, len(frames))
+
+
+# 每个 AIEngine 最多保留的 RAG 检索结果条数
+_RAG_MEMO_SIZE = 64
+
+# 帧泵线程最多领先消费端的帧数，以及帧队列空闲多久视为引擎已完成（秒）
+_FRAME_PUMP_CREDITS = 16
+_FRAME_PUMP_IDLE_TIMEOUT = 3
+
+
+def _pump_frames(
+    source: queue.Queue,
+    loop: asyncio.AbstractEventLoop,
+    target: asyncio.Queue,
+    credits: threading.Semaphore,
+    stop_event: threading.Event
+):
+    """
+    在专用线程中把引擎的视频帧从线程队列转发到事件循环的 asyncio.Queue
+
+    队列空闲超过 _FRAME_PUMP_IDLE_TIMEOUT 秒且为空时认为引擎已完成，发送 None 作为结束标记。
+
+    Args:
+        source: 引擎的视频帧队列（queue.Queue）
+        loop: 消费端所在的事件循环
+        target: 消费端读取的 asyncio.Queue
+        credits: 在途帧数限制，消费端每推送一帧释放一次
+        stop_event: 消费端退出时置位，泵线程随之结束
+    """
+    while not stop_event.is_set():
+        credits.acquire()
+        if stop_event.is_set():
+            return
+        try:
+            frame = source.get(timeout=_FRAME_PUMP_IDLE_TIMEOUT)
+        except queue.Empty:
+            credits.release()
+            if source.empty():
+                break
+            continue
+        loop.call_soon_threadsafe(target.put_nowait, frame)
+
+    if not stop_event.is_set():
+        loop.call_soon_threadsafe(target.put_nowait, None)
+
+
+# 合成结果缓存（与 TTS/Video 引擎一样全进程共享）：相同回复文本的音频、相同音频的视频直接复用
+# 键中不含 kb_id：回复文本本身已经反映了知识库内容，知识库更新后新的回复自然不会命中旧条目
+_tts_cache: OrderedDict[tuple, bytes] = OrderedDict()
+_video_cache: OrderedDict[tuple, bytes] = OrderedDict()
+
+
+def _media_cache_get(cache: OrderedDict, key: tuple):
+    """
+    查询合成结果缓存
+
+    Args:
+        cache: _tts_cache 或 _video_cache
+        key: 缓存键
+
+    Returns:
+        缓存的结果，未命中返回 None
+    """
+    value = cache.get(key)
+    if value is not None:
+        try:
+            cache.move_to_end(key)
+        except KeyError:
+            pass
+    return value
+
+
+def _media_cache_put(cache: OrderedDict, key: tuple, value, max_size: int):
+    """
+    写入合成结果缓存，超出上限时淘汰最久未使用的条目
+
+    Args:
+        cache: _tts_cache 或 _video_cache
+        key: 缓存键
+        value: 合成结果
+        max_size: 最大条目数
+    """
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > max_size:
+        cache.popitem(last=False)
+
+
+# 已确认存在的 avatar 目录（只缓存命中结果，新上传的 avatar 不会被误判为不存在）
+_avatar_paths: Dict[str, str] = {}
+
+
+def _find_avatar_path(avatar_id: str) -> Optional[str]:
+    """
+    查找 avatar 目录，存在时缓存结果，避免每次请求都做一次 stat
+
+    Args:
+        avatar_id: Avatar ID
+
+    Returns:
+        str: avatar 目录路径，不存在返回 None
+    """
+    avatar_path = _avatar_paths.get(avatar_id)
+    if avatar_path is None:
+        candidate = os.path.join(settings.avatars_dir, avatar_id)
+        if not os.path.isdir(candidate):
+            return None
+        avatar_path = _avatar_paths[avatar_id] = candidate
+    return avatar_path
+
+
+# 保护跨 tutor 共享子引擎的创建
+# 临界区很小，直接使用 C 层的原始锁
+_engines_lock = _thread.allocate_lock()
+
+# 跨 tutor 共享的子引擎实例（ASR/TTS/RAG/Video），按名称索引
+_shared_engines: Dict[str, object] = {}
+
+
+def _get_shared_engine(name: str, factory: Callable[[], object]):
+    """
+    获取跨 tutor 共享的子引擎，首次访问时创建（双重检查加锁）
+
+    Args:
+        name: 子引擎名称
+        factory: 创建子引擎的函数
+
+    Returns:
+        子引擎实例
+    """
+    engine = _shared_engines.get(name)
+    if engine is None:
+        with _engines_lock:
+            engine = _shared_engines.get(name)
+            if engine is None:
+                engine = factory()
+                _shared_engines[name] = engine
+    return engine
+
 
 class AIEngine:
     """
@@ -41,48 +337,159 @@ class AIEngine:
             tutor_id: 导师 ID，用于标识不同的模型实例
         """
         self.tutor_id = tutor_id
+        # 最近一次被 get_ai_engine 取用的时间（用于空闲淘汰）
+        self.last_used = time.monotonic()
+
+        # 子引擎在首次访问时才创建，只使用文本的 tutor 不会加载 ASR/TTS/MuseTalk 模型。
+        # 只有 LLM 引擎按 tutor 隔离；ASR/TTS/RAG/Video 与 tutor 无关，全进程共享一份。
+        # 该锁保证并发首次访问时 LLM 引擎只初始化一次。
+        self._init_lock = _thread.allocate_lock()
+
+        # 每次请求都会用到的配置项，初始化时读取一次，避免热路径上反复访问 pydantic Settings
+        self._asr_language = settings.asr_language
+        self._tts_voice = settings.tts_voice
+        self._tts_rate = settings.tts_rate
+        self._tts_pitch = settings.tts_pitch
+
+        # LLM 微批处理：等待合并的请求 (text, context, future)、窗口定时任务、执行中的批次
+        self._llm_batch_size = settings.llm_batch_size
+        self._llm_batch_window = settings.llm_batch_window_ms / 1000
+        self._pending: List[Tuple[str, Optional[str], asyncio.Future]] = []
+        self._batch_task: Optional[asyncio.Task] = None
+        self._batch_runs: Set[asyncio.Task] = set()
+
+        # LLM 响应缓存（按 kb_id + 规范化问题文本），命中时跳过 RAG 和 LLM
+        self._response_cache: Optional[ResponseCache] = (
+            ResponseCache(settings.llm_response_cache_size) if settings.llm_response_cache_size > 0 else None
+        )
 
-        # 初始化 LLM 引擎（从 llm 模块获取）
-        self.llm_engine = get_llm_engine(tutor_id)
+        # RAG 检索结果的短期复用：{(kb_id, user_id, text): (过期时间, 格式化后的上下文)}
+        self._rag_memo_ttl = settings.rag_memo_ttl_seconds
+        self._rag_memo: OrderedDict[tuple, Tuple[float, str]] = OrderedDict()
 
-        # 初始化 ASR 引擎（从 asr 模块获取）
-        self.asr_engine = get_asr_engine(
+        logger.info(f"AI Engine initialized for tutor_id={tutor_id}")
+
+    @cached_property
+    def llm_engine(self):
+        """LLM 引擎（从 llm 模块获取）"""
+        with self._init_lock:
+            return get_llm_engine(self.tutor_id)
+
+    @property
+    def asr_engine(self):
+        """ASR 引擎（全局共享，从 asr 模块获取）"""
+        return _get_shared_engine("asr", lambda: get_asr_engine(
             model_name=settings.asr_model,
             enable_real=settings.enable_asr,
-            device=settings.asr_device
-        )
-
-        # 初始化 TTS 引擎（从 tts 模块获取）
-        self.tts_engine = get_tts_engine(
+            device=settings.asr_device,
+            compute_type=settings.asr_compute_type,
+            max_workers=settings.asr_max_concurrency
+        ))
+
+    @property
+    def tts_engine(self):
+        """TTS 引擎（全局共享，从 tts 模块获取）"""
+        return _get_shared_engine("tts", lambda: get_tts_engine(
             voice=settings.tts_voice,
             enable_real=settings.enable_tts
-        )
+        ))
 
-        # 初始化 RAG 引擎（从 rag 模块获取）
-        self.rag_engine = get_rag_engine(
+    @property
+    def rag_engine(self):
+        """RAG 引擎（全局共享，从 rag 模块获取）"""
+        return _get_shared_engine("rag", lambda: get_rag_engine(
             enable_real=settings.enable_rag,
             rag_url=settings.rag_url,
             top_k=settings.rag_top_k
-        )
+        ))
 
-        # 初始化 Video 引擎（从 video 模块获取）
-        self.video_engine = get_video_engine(
+    @property
+    def video_engine(self):
+        """Video 引擎（全局共享，从 video 模块获取）"""
+        return _get_shared_engine("video", lambda: get_video_engine(
             enable_real=settings.enable_avatar,
             musetalk_base=settings.musetalk_base,
             avatars_dir=settings.avatars_dir,
             conda_env=settings.musetalk_conda_env
-        )
+        ))
 
-        # 添加 avatar_manager 别名（用于 websocket_server 中的预热调用）
-        self.avatar_manager = self.video_engine
+    @property
+    def avatar_manager(self):
+        """avatar_manager 别名（用于 websocket_server 中的预热调用）"""
+        return self.video_engine
 
-        logger.info(f"AI Engine initialized for tutor_id={tutor_id}")
+    async def _retrieve_context(
+        self,
+        text: str,
+        kb_id: Union[str, Sequence[str]],
+        user_id: int
+    ) -> Optional[str]:
+        """
+        RAG 检索并格式化为 LLM 上下文
+
+        传入多个知识库 ID 时并发检索（asyncio.gather），
+        总耗时取决于最慢的一次检索而不是各次之和。
+
+        Args:
+            text: 查询文本
+            kb_id: 知识库 ID 或 ID 列表
+            user_id: 用户 ID（用于个人知识库）
+
+        Returns:
+            Optional[str]: 格式化的上下文，检索失败时返回 None
+        """
+        kb_ids = [kb_id] if isinstance(kb_id, str) else list(kb_id)
+
+        # 同一请求链路（如 process_text 之后紧接着流式接口）在 TTL 内不重复检索
+        memo_key = (tuple(kb_ids), user_id, text)
+        now = time.monotonic()
+        memo = self._rag_memo.get(memo_key)
+        if memo is not None and memo[0] > now:
+            logger.info("RAG memo hit for kb_id=%s", kb_id)
+            return memo[1]
+
+        logger.info("Performing RAG retrieval for kb_id=%s", kb_id)
+        try:
+            # 检索相关文档
+            results = await asyncio.gather(*(
+                self.rag_engine.retrieve(query=text, kb_id=kb, user_id=user_id)
+                for kb in kb_ids
+            ))
+            retrieved_docs = [doc for docs in results for doc in docs]
+
+            # 格式化为 LLM 上下文
+            context = self.rag_engine.format_context(retrieved_docs)
+            logger.info("RAG retrieved %d documents", len(retrieved_docs))
+            if self._rag_memo_ttl > 0:
+                self._remember_context(memo_key, context, now)
+            return context
+        except Exception as e:
+            logger.error("RAG retrieval failed: %s, using direct LLM", e)
+            return None
+
+    def _remember_context(self, memo_key: tuple, context: str, now: float):
+        """
+        记录 RAG 检索结果，并清理过期或超出上限的条目
+
+        Args:
+            memo_key: (kb_ids, user_id, text)
+            context: 格式化后的上下文
+            now: 当前时间（time.monotonic）
+        """
+        self._rag_memo[memo_key] = (now + self._rag_memo_ttl, context)
+        self._rag_memo.move_to_end(memo_key)
+        # 条目按写入顺序排列，最早写入的最先过期
+        while self._rag_memo:
+            oldest_key, (expires_at, _) = next(iter(self._rag_memo.items()))
+            if expires_at > now and len(self._rag_memo) <= _RAG_MEMO_SIZE:
+                break
+            self._rag_memo.pop(oldest_key, None)
 
     async def process_text(
         self,
         text: str,
         tutor_id: int,
-        kb_id: Optional[str] = None,
+        kb_id: Optional[Union[str, Sequence[str]]] = None,
         session_id: Optional[str] = None
     ) -> str:
         """
@@ -91,48 +498,130 @@ class AIEngine:
         Args:
             text: 用户输入的文本
             tutor_id: 导师 ID（用于验证，应该与实例的 tutor_id 一致）
-            kb_id: 知识库 ID（可选，用于 RAG，当前版本暂未实现 RAG 检索）
+            kb_id: 知识库 ID 或 ID 列表（可选，用于 RAG）
             session_id: 会话 ID（可选，用于区分不同的聊天历史）
 
         Returns:
             str: AI 生成的响应文本
         """
-        # 验证 tutor_id 是否匹配
-        if tutor_id != self.tutor_id:
-            logger.warning(f"tutor_id mismatch: instance={self.tutor_id}, request={tutor_id}")
+        # 验证 tutor_id 是否匹配（仅调试模式，python -O 时移除；实例缓存已保证隔离）
+        if __debug__ and tutor_id != self.tutor_id:
+            logger.warning("tutor_id mismatch: instance=%s, request=%s", self.tutor_id, tutor_id)
 
-        logger.info(f"Processing text: tutor_id={tutor_id}, kb_id={kb_id}, session_id={session_id}, text={text[:50]}...")
+        logger.info("Processing text: kb_id=%s, text=%.50s...", kb_id, text)
 
-        # RAG 检索：如果 kb_id 存在，先进行知识库检索
-        context = None
-        if kb_id:
-            logger.info(f"Performing RAG retrieval for kb_id={kb_id}")
-            try:
-                # 检索相关文档
-                retrieved_docs = await self.rag_engine.retrieve(
-                    query=text,
-                    kb_id=kb_id,
-                    user_id=tutor_id  # 使用 tutor_id 作为 user_id
-                )
+        # 响应缓存：相同问题直接返回
+        cache_key = self._cache_key(text, kb_id)
+        if cache_key is not None:
+            cached = self._response_cache.get(cache_key)
+            if cached is not None:
+                logger.info("Response cache hit")
+                return cached
 
-                # 格式化为 LLM 上下文
-                context = self.rag_engine.format_context(retrieved_docs)
-                logger.info(f"RAG retrieved {len(retrieved_docs)} documents")
-            except Exception as e:
-                logger.error(f"RAG retrieval failed: {e}, using direct LLM")
-                context = None
+        # RAG 检索：如果 kb_id 存在，先进行知识库检索（使用 tutor_id 作为 user_id）
+        context = await self._retrieve_context(text, kb_id, tutor_id) if kb_id else None
 
         # 调用 LLM 引擎生成响应
-        response = await self.llm_engine.generate(text=text, context=context)
+        if self._llm_batch_size > 1:
+            response = await self._generate_batched(text, context)
+        else:
+            async with _llm_sem:
+                response = await self.llm_engine.generate(text=text, context=context)
+
+        # LLM 调用失败时返回的是降级文本，不写入缓存
+        if cache_key is not None and not isinstance(response, FallbackText):
+            self._response_cache.put(cache_key, response)
         
-        logger.info(f"Generated response: {response[:100]}...")
+        logger.info("Generated response: %.100s...", response)
         return response
 
+    def _cache_key(self, text: str, kb_id: Optional[Union[str, Sequence[str]]]) -> Optional[tuple]:
+        """
+        生成响应缓存键；缓存关闭或 LLM 处于 Mock 模式时返回 None
+
+        Args:
+            text: 用户输入的文本
+            kb_id: 知识库 ID 或 ID 列表
+
+        Returns:
+            tuple: 缓存键，不使用缓存时为 None
+        """
+        if self._response_cache is None or not self.llm_engine.use_llm:
+            return None
+        return ResponseCache.make_key(text, kb_id)
+
+    async def _generate_batched(self, text: str, context: Optional[str]) -> str:
+        """
+        将请求加入微批队列，等待批量生成的结果
+
+        队列达到 llm_batch_size 时立即提交，否则在 llm_batch_window_ms 窗口结束时提交。
+
+        Args:
+            text: 用户输入的文本
+            context: RAG 上下文（可选）
+
+        Returns:
+            str: AI 生成的响应文本
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((text, context, future))
+
+        if len(self._pending) >= self._llm_batch_size:
+            self._flush_pending()
+        elif self._batch_task is None:
+            self._batch_task = asyncio.create_task(self._flush_after_window())
+
+        return await future
+
+    async def _flush_after_window(self):
+        """等待批处理窗口结束后提交队列中的请求"""
+        await asyncio.sleep(self._llm_batch_window)
+        self._batch_task = None
+        self._flush_pending()
+
+    def _flush_pending(self):
+        """取出当前队列并启动一个批次"""
+        if self._batch_task is not None:
+            self._batch_task.cancel()
+            self._batch_task = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._run_batch(batch))
+        self._batch_runs.add(task)
+        task.add_done_callback(self._batch_runs.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, Optional[str], asyncio.Future]]):
+        """
+        执行一个批次并把结果分发给各个等待者
+
+        Args:
+            batch: (text, context, future) 列表
+        """
+        try:
+            async with _llm_sem:
+                responses = await self.llm_engine.generate_batch(
+                    [text for text, _, _ in batch],
+                    [context for _, context, _ in batch]
+                )
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, _, future), response in zip(batch, responses):
+            # 调用方可能已取消等待
+            if not future.done():
+                future.set_result(response)
+
     async def stream_text_response(
         self,
         text: str,
         tutor_id: int = None,
-        kb_id: Optional[str] = None,
+        kb_id: Optional[Union[str, Sequence[str]]] = None,
         session_id: Optional[str] = None
     ) -> AsyncIterator[str]:
         """
@@ -141,63 +630,113 @@ class AIEngine:
         Args:
             text: 用户输入的文本
             tutor_id: 导师 ID（用于验证，应该与实例的 tutor_id 一致）
-            kb_id: 知识库 ID（可选，用于 RAG）
+            kb_id: 知识库 ID 或 ID 列表（可选，用于 RAG）
             session_id: 会话 ID（可选，用于区分不同的聊天历史）
 
         Yields:
-            str: LLM 生成的 token 流
+            str: LLM 生成的文本块（若干 token 合并，句末标点处一定断开）
         """
-        # 验证 tutor_id 是否匹配
-        if tutor_id and tutor_id != self.tutor_id:
-            logger.warning(f"tutor_id mismatch: instance={self.tutor_id}, request={tutor_id}")
-
-        logger.info(f"Streaming text response: tutor_id={tutor_id}, kb_id={kb_id}, session_id={session_id}, text={text[:50]}...")
-
-        # RAG 检索：如果 kb_id 存在，先进行知识库检索
-        context = None
-        if kb_id:
-            logger.info(f"Performing RAG retrieval for kb_id={kb_id}")
-            try:
-                # 检索相关文档
-                retrieved_docs = await self.rag_engine.retrieve(
-                    query=text,
-                    kb_id=kb_id,
-                    user_id=tutor_id or self.tutor_id  # 使用 tutor_id 作为 user_id
-                )
-
-                # 格式化为 LLM 上下文
-                context = self.rag_engine.format_context(retrieved_docs)
-                logger.info(f"RAG retrieved {len(retrieved_docs)} documents")
-            except Exception as e:
-                logger.error(f"RAG retrieval failed: {e}, using direct LLM")
-                context = None
-
-        # 流式生成 LLM 响应
-        async for token in self.llm_engine.stream_generate(text=text, context=context):
-            yield token
+        # 验证 tutor_id 是否匹配（仅调试模式，python -O 时移除；实例缓存已保证隔离）
+        if __debug__ and tutor_id and tutor_id != self.tutor_id:
+            logger.warning("tutor_id mismatch: instance=%s, request=%s", self.tutor_id, tutor_id)
+
+        logger.info("Streaming text response: kb_id=%s, text=%.50s...", kb_id, text)
+
+        # 响应缓存：命中时一次性输出完整响应
+        cache_key = self._cache_key(text, kb_id)
+        if cache_key is not None:
+            cached = self._response_cache.get(cache_key)
+            if cached is not None:
+                logger.info("Response cache hit")
+                yield cached
+                return
+
+        # RAG 检索：如果 kb_id 存在，先进行知识库检索（使用 tutor_id 作为 user_id）
+        context = await self._retrieve_context(text, kb_id, tutor_id or self.tutor_id) if kb_id else None
+
+        # 流式生成 LLM 响应（完整生成后写入缓存）
+        # 逐 token 合并成小块再输出，减少事件循环切换和 WebSocket 帧数；首个 token 立即输出
+        # LLM 并发名额只在生产任务读取 token 期间持有：消费方等待 WebSocket 发送（慢客户端）
+        # 或中途放弃生成器时不会占住名额；生成器关闭时取消生产任务，名额随之释放
+        token_queue: asyncio.Queue = asyncio.Queue()
+        producer = asyncio.create_task(self._pump_llm_stream(text, context, token_queue))
+
+        tokens = []
+        buffer = []
+        fell_back = False
+        last_flush = time.monotonic()
+        try:
+            while True:
+                token = await token_queue.get()
+                if token is None:
+                    break
+                fell_back = fell_back or isinstance(token, FallbackText)
+                tokens.append(token)
+                buffer.append(token)
+                now = time.monotonic()
+                if (
+                    len(tokens) == 1
+                    or len(buffer) >= _STREAM_CHUNK_TOKENS
+                    or now - last_flush >= _STREAM_CHUNK_INTERVAL
+                    or (token and token[-1] in _SENTENCE_ENDINGS)
+                ):
+                    yield "".join(buffer)
+                    buffer.clear()
+                    last_flush = now
+        finally:
+            producer.cancel()
+
+        # 生产任务中的异常（如 LLM 引擎内部错误）在这里抛给调用方
+        await producer
+
+        if buffer:
+            yield "".join(buffer)
+
+        # 流中途失败时已输出的部分 token 加上降级文本不是完整回复，不写入缓存
+        if cache_key is not None and not fell_back:
+            self._response_cache.put(cache_key, "".join(tokens))
+
+    async def _pump_llm_stream(self, text: str, context: Optional[str], token_queue: asyncio.Queue):
+        """
+        持有 LLM 并发名额读取 stream_generate 的 token 放入队列，结束时放入 None
 
-    async def process_audio(self, audio_data: str) -> str:
+        Args:
+            text: 用户输入的文本
+            context: RAG 上下文（可选）
+            token_queue: 消费方读取的队列
+        """
+        try:
+            async with _llm_sem:
+                async for token in self.llm_engine.stream_generate(text=text, context=context):
+                    token_queue.put_nowait(token)
+        finally:
+            token_queue.put_nowait(None)
+
+    async def process_audio(self, audio_data: Union[bytes, str]) -> str:
         """
         处理音频输入（ASR: 语音转文本）
 
         Args:
-            audio_data: base64 编码的音频数据
+            audio_data: 原始音频字节；传入 base64 字符串时在这里解码一次
 
         Returns:
             str: 转录的文本
         """
-        logger.info(f"Processing audio (tutor_id={self.tutor_id}): data_length={len(audio_data)}")
-
-        # 调用 ASR 引擎进行转录
-        transcription = await self.asr_engine.transcribe(
-            audio_data=audio_data,
-            language=settings.asr_language
-        )
-
-        logger.info(f"Transcribed: {transcription}")
+        if isinstance(audio_data, str):
+            audio_data = base64.b64decode(audio_data)
+        logger.info("Processing audio: audio_bytes=%d", len(audio_data))
+
+        # 调用 ASR 引擎进行转录（memoryview 避免再拷贝一份音频数据）
+        async with _asr_sem:
+            transcription = await self.asr_engine.transcribe(
+                audio_data=memoryview(audio_data),
+                language=self._asr_language
+            )
+
+        logger.info("Transcribed: %s", transcription)
         return transcription
 
-    async def synthesize_speech(self, text: str) -> str:
+    async def synthesize_speech(self, text: str) -> bytes:
         """
         文本转语音（TTS）
 
@@ -205,58 +744,156 @@ class AIEngine:
             text: 要合成的文本
 
         Returns:
-            str: base64 编码的音频数据
+            bytes: 原始音频数据（base64 编码只在发给客户端时做一次）
         """
-        logger.info(f"Synthesizing speech (tutor_id={self.tutor_id}): text={text[:50]}...")
+        logger.info("Synthesizing speech: text=%.50s...", text)
 
-        # 调用 TTS 引擎进行语音合成
-        audio_data = await self.tts_engine.synthesize(
-            text=text,
-            language=settings.asr_language  # 使用与 ASR 相同的语言设置
-        )
+        cache_key = (text, self._asr_language, self._tts_voice, self._tts_rate, self._tts_pitch)
+        if settings.tts_cache_size > 0:
+            audio_data = _media_cache_get(_tts_cache, cache_key)
+            if audio_data is not None:
+                logger.info("TTS cache hit: length=%d", len(audio_data))
+                return audio_data
 
-        logger.info(f"Synthesized audio: length={len(audio_data)}")
+        # 调用 TTS 引擎进行语音合成
+        async with _tts_sem:
+            audio_data = await self.tts_engine.synthesize_bytes(
+                text=text,
+                language=self._asr_language  # 使用与 ASR 相同的语言设置
+            )
+
+        logger.info("Synthesized audio: length=%d", len(audio_data))
+        # Edge TTS 失败时返回的是 Mock 静音音频，不写入缓存
+        if settings.tts_cache_size > 0 and audio_data and not isinstance(audio_data, FallbackAudio):
+            _media_cache_put(_tts_cache, cache_key, audio_data, settings.tts_cache_size)
         return audio_data
 
+    async def turn(
+        self,
+        audio_bytes: bytes,
+        kb_id: Optional[Union[str, Sequence[str]]] = None,
+        session_id: Optional[str] = None
+    ) -> Tuple[str, str, bytes]:
+        """
+        完整的一轮语音对话：ASR → LLM → TTS
+
+        音频全程以原始字节在引擎间传递，base64 编解码只在 API 边界各做一次。
+
+        Args:
+            audio_bytes: 原始输入音频字节
+            kb_id: 知识库 ID（可选，可为多个）
+            session_id: 会话 ID（可选）
+
+        Returns:
+            Tuple[str, str, bytes]: (转录文本, AI 回复文本, 合成音频字节)
+        """
+        transcription = await self.process_audio(audio_bytes)
+        response = await self.process_text(transcription, self.tutor_id, kb_id, session_id)
+        audio_out = await self.synthesize_speech(response)
+
+        logger.info("Turn completed: audio_out_bytes=%d", len(audio_out))
+        return transcription, response, audio_out
+
     async def generate_video(
         self,
-        audio_data: str,
+        audio_data: bytes,
         avatar_id: str,
-        fps: int = 25
-    ) -> Optional[str]:
+        fps: int = 25,
+        on_queued: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> Optional[bytes]:
         """
         生成口型同步视频（Avatar + Audio）
 
+        所有连接共享 video_max_concurrency 个并发名额，超出的请求排队，避免多个请求在 GPU 上互相抢占。
+
         Args:
-            audio_data: base64 编码的音频数据
+            audio_data: 原始音频字节
             avatar_id: Avatar ID
             fps: 视频帧率
+            on_queued: 排队超过 200ms 时调用的回调（可选）
 
         Returns:
-            str: base64 编码的视频数据，失败返回 None
+            bytes: MP4 视频数据（base64 编码只在发给 JSON 客户端时做一次），失败返回 None
         """
-        logger.info(f"Generating video (tutor_id={self.tutor_id}): avatar_id={avatar_id}")
+        logger.info("Generating video: avatar_id=%s", avatar_id)
+
+        cache_key = None
+        if settings.video_cache_size > 0:
+            cache_key = (avatar_id, fps, hashlib.blake2b(audio_data, digest_size=16).digest())
+            video_data = _media_cache_get(_video_cache, cache_key)
+            if video_data is not None:
+                logger.info("Video cache hit: length=%d", len(video_data))
+                return video_data
 
         # 调用 Video 引擎生成视频
-        video_data = await self.video_engine.generate_video(
-            audio_data=audio_data,
-            avatar_id=avatar_id,
-            fps=fps
-        )
+        await _acquire_video_slot(on_queued)
+        try:
+            video_data = await self.video_engine.generate_video(
+                audio_data=audio_data,
+                avatar_id=avatar_id,
+                fps=fps
+            )
+        finally:
+            _video_sem.release()
 
         if video_data:
-            logger.info(f"Video generated: length={len(video_data)}")
+            logger.info("Video generated: length=%d", len(video_data))
+            # MuseTalk 失败时返回的是静态降级视频，不写入缓存
+            if cache_key is not None and not isinstance(video_data, FallbackVideo):
+                _media_cache_put(_video_cache, cache_key, video_data, settings.video_cache_size)
         else:
             logger.error("Video generation failed")
 
         return video_data
 
+    async def synthesize_sentences(
+        self,
+        text: str,
+        avatar_id: Optional[str] = None,
+        fps: int = 25
+    ) -> AsyncIterator[Tuple[str, bytes, Optional[bytes]]]:
+        """
+        按句流水线合成音频和视频
+
+        所有句子的 TTS 立即并发启动（受 _tts_sem 限制），视频按句子顺序生成；
+        第 i 句生成视频时，后续句子的 TTS 同时进行，首段音视频的延迟从
+        T_tts(全文) + T_video(全文) 降到 T_tts(首句) + T_video(首句)。
+
+        Args:
+            text: 完整的回复文本
+            avatar_id: Avatar ID（为 None 时只合成音频）
+            fps: 视频帧率
+
+        Yields:
+            Tuple[str, bytes, Optional[bytes]]: (句子, 原始音频字节, MP4 视频字节或 None)
+        """
+        sentences, remainder = _split_sentences("", text)
+        if remainder.strip():
+            sentences.append(remainder.strip())
+
+        tts_tasks = [asyncio.create_task(self.synthesize_speech(sentence)) for sentence in sentences]
+        try:
+            for sentence, tts_task in zip(sentences, tts_tasks):
+                audio_data = await tts_task
+                video_data = None
+                if avatar_id:
+                    video_data = await self.generate_video(
+                        audio_data=audio_data,
+                        avatar_id=avatar_id,
+                        fps=fps
+                    )
+                yield sentence, audio_data, video_data
+        finally:
+            # 调用方提前退出（如连接断开）时取消尚未完成的 TTS
+            for tts_task in tts_tasks:
+                tts_task.cancel()
+
     async def get_idle_video(
         self,
         avatar_id: str,
         duration: int = 5,
         fps: int = 25
-    ) -> Optional[str]:
+    ) -> Optional[bytes]:
         """
         获取 Avatar 的待机视频（循环播放的静态视频）
 
@@ -266,9 +903,9 @@ class AIEngine:
             fps: 视频帧率
 
         Returns:
-            str: base64 编码的待机视频数据，失败返回 None
+            bytes: MP4 待机视频数据，失败返回 None
         """
-        logger.info(f"Getting idle video (tutor_id={self.tutor_id}): avatar_id={avatar_id}")
+        logger.info("Getting idle video: avatar_id=%s", avatar_id)
 
         # 调用 Video 引擎获取待机视频
         video_data = await self.video_engine.get_idle_video(
@@ -278,7 +915,7 @@ class AIEngine:
         )
 
         if video_data:
-            logger.info(f"Idle video retrieved: length={len(video_data)}")
+            logger.info("Idle video retrieved: length=%d", len(video_data))
         else:
             logger.error("Failed to get idle video")
 
@@ -294,10 +931,10 @@ class AIEngine:
         """
         通过 WebRTC 实时流式传输视频
 
-        处理流程:
-        1. LLM 生成文本响应
-        2. TTS 生成音频
-        3. MuseTalk 逐帧生成视频
+        处理流程（按句子流水线并行）:
+        1. LLM 流式生成文本响应，按句切分
+        2. 每个句子立即开始 TTS
+        3. MuseTalk 按句子顺序逐帧生成视频
         4. 每生成一帧就通过 WebRTC 推送
 
         Args:
@@ -307,55 +944,92 @@ class AIEngine:
             fps: 视频帧率
 
         Returns:
-            tuple: (response_text, audio_data) 文本响应和音频数据
+            tuple: (response_text, audio_segments) 文本响应和按句子顺序的音频字节列表
         """
-        logger.info(f"Starting WebRTC video streaming (tutor_id={self.tutor_id}): avatar_id={avatar_id}")
-
-        # 1. LLM 生成文本响应
-        response_text = await self.process_text(
-            text=text,
-            tutor_id=self.tutor_id
-        )
-
-        # 2. TTS 生成音频
-        audio_data = await self.synthesize_speech(response_text)
+        logger.info("Starting WebRTC video streaming: avatar_id=%s", avatar_id)
 
-        # 3. 获取 WebRTC streamer
-        from webrtc_streamer import get_webrtc_streamer
         streamer = get_webrtc_streamer()
 
-        # 4. 延迟音频推送，等视频开始生成后再同步推送
-        audio_task = None
-        audio_started = False
-
-        # 5. 实时生成并推流视频帧
-        frame_count = 0
-        async for frame in self.video_engine.generate_frames_stream(
-            audio_data=audio_data,
-            avatar_id=avatar_id,
-            fps=fps
-        ):
-            # 在推送第一帧视频时，同时启动音频推送（实现音视频同步）
-            if not audio_started:
-                audio_task = asyncio.create_task(streamer.stream_audio(session_id, audio_data))
-                audio_started = True
-                logger.info(f"✅ Started audio streaming synchronized with video for session {session_id}")
-
-            # 推送帧到 WebRTC
-            await streamer.stream_frame(session_id, frame)
-            frame_count += 1
-
-            if frame_count % 25 == 0:  # 每秒日志一次
-                logger.info(f"Streamed {frame_count} frames to session {session_id}")
+        # 1. LLM 流式生成，每凑成一个完整句子立即启动该句的 TTS 任务（按句子顺序入队）
+        tts_tasks: asyncio.Queue = asyncio.Queue()
+        response_parts = []
 
-        logger.info(f"WebRTC streaming completed: {frame_count} frames")
+        async def produce_sentences():
+            sentence_buffer = ""
+            try:
+                async for token in self.stream_text_response(text=text, tutor_id=self.tutor_id):
+                    response_parts.append(token)
+                    sentences, sentence_buffer = _split_sentences(sentence_buffer, token)
+                    for sentence in sentences:
+                        tts_tasks.put_nowait(asyncio.create_task(self.synthesize_speech(sentence)))
+                if sentence_buffer.strip():
+                    tts_tasks.put_nowait(asyncio.create_task(self.synthesize_speech(sentence_buffer.strip())))
+            finally:
+                tts_tasks.put_nowait(None)
+
+        producer = asyncio.create_task(produce_sentences())
+
+        # 2. 按句子顺序取 TTS 结果，逐帧生成视频并推流；后续句子的 LLM/TTS 与当前句子的视频生成并行
+        audio_segments = []
+        audio_task = None
+        batcher = _FrameBatcher(streamer, session_id)
+        try:
+            while (tts_task := await tts_tasks.get()) is not None:
+                audio_data = await tts_task
+                audio_segments.append(audio_data)
+                audio_started = False
+
+                async for frame in self.video_engine.generate_frames_stream(
+                    audio_data=audio_data,
+                    avatar_id=avatar_id,
+                    fps=fps
+                ):
+                    # 在推送该句第一帧视频时启动该句音频推送（排在上一句音频之后，实现音视频同步）
+                    if not audio_started:
+                        audio_task = asyncio.create_task(
+                            self._stream_audio_after(streamer, session_id, audio_data, audio_task)
+                        )
+                        audio_started = True
+                        logger.info("✅ Started audio streaming synchronized with video for session %s", session_id)
+
+                    # 推送帧到 WebRTC（按批合并）
+                    await batcher.add(frame)
+
+                # 句子结束时推送剩余帧，不让尾帧等待下一句
+                await batcher.flush()
+
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+            while not tts_tasks.empty():
+                pending = tts_tasks.get_nowait()
+                if pending is not None:
+                    pending.cancel()
+
+        logger.info("WebRTC streaming completed: %d frames, %d sentences", batcher.frame_count, len(audio_segments))
 
         # 等待音频推送完成
         if audio_task:
             await audio_task
-            logger.info(f"Audio streaming completed for session {session_id}")
+            logger.info("Audio streaming completed for session %s", session_id)
+
+        return "".join(response_parts), audio_segments
+
+    @staticmethod
+    async def _stream_audio_after(streamer, session_id: str, audio_data: bytes, previous: Optional[asyncio.Task]):
+        """
+        等上一段音频推送完成后再推送本段，保证多句音频按顺序、不交错地进入音轨
 
-        return response_text, audio_data
+        Args:
+            streamer: WebRTC streamer
+            session_id: 会话 ID
+            audio_data: 原始音频字节
+            previous: 上一段音频的推送任务
+        """
+        if previous is not None:
+            await previous
+        await streamer.stream_audio(session_id, audio_data)
 
     async def stream_video_realtime(
         self,
@@ -384,14 +1058,12 @@ class AIEngine:
         Returns:
             int: 推送的帧数
         """
-        import os
-        
-        logger.info(f"[Realtime Streaming] Starting for avatar: {avatar_id}")
+        logger.info("[Realtime Streaming] Starting for avatar: %s", avatar_id)
         
         # 1. 获取或创建流式引擎
-        avatar_path = os.path.join(settings.avatars_dir, avatar_id)
-        if not os.path.exists(avatar_path):
-            logger.error(f"Avatar not found: {avatar_path}")
+        avatar_path = _find_avatar_path(avatar_id)
+        if avatar_path is None:
+            logger.error(f"Avatar not found: {avatar_id}")
             return 0
             
         engine = get_streaming_engine(
@@ -399,38 +1071,36 @@ class AIEngine:
             avatar_path=avatar_path,
             batch_size=8,
             fps=50,  # 音频帧率 50fps = 20ms/chunk
-            voice=settings.tts_voice,
-            tts_rate=settings.tts_rate,
-            tts_pitch=settings.tts_pitch
+            voice=self._tts_voice,
+            tts_rate=self._tts_rate,
+            tts_pitch=self._tts_pitch
         )
         
         # 2. 获取 WebRTC streamer
-        from webrtc_streamer import get_webrtc_streamer
         streamer = get_webrtc_streamer()
         
         # 3. 实时处理文本，生成同步的音视频帧
-        frame_count = 0
-        audio_started = False
+        batcher = _FrameBatcher(streamer, session_id)
         
         async for video_frame, audio_samples in engine.process_text(text):
-            # 推送视频帧
-            await streamer.stream_frame(session_id, video_frame)
+            # 推送视频帧（按批合并）
+            first_frame = batcher.frame_count == 0
+            await batcher.add(video_frame)
             
-            # 推送音频（将float32转为int16）
-            audio_int16 = (audio_samples * 32767).astype('int16')
             # TODO: 需要在 WebRTCStreamer 中添加 stream_audio_samples 方法
-            # await streamer.stream_audio_samples(session_id, audio_int16)
-            
-            frame_count += 1
+            # 启用时用预分配的 int16 缓冲区原地转换，避免每个 chunk 分配新数组：
+            # np.multiply(audio_samples, 32767, out=scratch_f32)
+            # np.clip(scratch_f32, -32768, 32767, out=scratch_f32)
+            # scratch_i16[:] = scratch_f32
+            # await streamer.stream_audio_samples(session_id, scratch_i16)
             
-            if frame_count == 1:
-                logger.info(f"⚡ First frame pushed to WebRTC for session {session_id}")
-                
-            if frame_count % 25 == 0:
-                logger.info(f"Streamed {frame_count} frames to session {session_id}")
+            if first_frame:
+                logger.info("⚡ First frame pushed to WebRTC for session %s", session_id)
+
+        await batcher.flush()
                 
-        logger.info(f"[Realtime Streaming] Completed: {frame_count} frames")
-        return frame_count
+        logger.info("[Realtime Streaming] Completed: %d frames", batcher.frame_count)
+        return batcher.frame_count
 
     async def stream_text_and_video_realtime(
         self,
@@ -461,15 +1131,12 @@ class AIEngine:
         Returns:
             str: 完整的 LLM 响应文本
         """
-        import os
-        import re
-        
-        logger.info(f"[Full Realtime Streaming] Starting for avatar: {avatar_id}")
+        logger.info("[Full Realtime Streaming] Starting for avatar: %s", avatar_id)
         
         # 1. 获取或创建流式引擎
-        avatar_path = os.path.join(settings.avatars_dir, avatar_id)
-        if not os.path.exists(avatar_path):
-            logger.error(f"Avatar not found: {avatar_path}")
+        avatar_path = _find_avatar_path(avatar_id)
+        if avatar_path is None:
+            logger.error(f"Avatar not found: {avatar_id}")
             return ""
             
         engine = get_streaming_engine(
@@ -477,15 +1144,14 @@ class AIEngine:
             avatar_path=avatar_path,
             batch_size=8,
             fps=50,
-            voice=settings.tts_voice,
-            tts_rate=settings.tts_rate,
-            tts_pitch=settings.tts_pitch
+            voice=self._tts_voice,
+            tts_rate=self._tts_rate,
+            tts_pitch=self._tts_pitch
         )
         
         # 2. 流式生成 LLM 响应
         full_response = ""
         sentence_buffer = ""
-        sentence_endings = re.compile(r'[。！？.!?]')
         
         async for token in self.stream_text_response(
             text=text,
@@ -493,61 +1159,106 @@ class AIEngine:
             kb_id=kb_id
         ):
             full_response += token
-            sentence_buffer += token
-            
-            # 检查是否有完整句子
-            if sentence_endings.search(sentence_buffer):
-                # 找到句子结束符，发送到TTS
-                sentences = sentence_endings.split(sentence_buffer)
-                for i, sentence in enumerate(sentences[:-1]):
-                    if sentence.strip():
-                        engine.tts.put_text(sentence.strip() + sentences[i+1] if i+1 < len(sentences) else sentence.strip())
-                        logger.info(f"[Realtime] Sent sentence to TTS: {sentence[:30]}...")
-                sentence_buffer = sentences[-1] if sentences[-1] else ""
+
+            # 遇到句末标点即把完整句子（含标点）发送到 TTS
+            sentences, sentence_buffer = _split_sentences(sentence_buffer, token)
+            for sentence in sentences:
+                engine.tts.put_text(sentence)
+                logger.info("[Realtime] Sent sentence to TTS: %.30s...", sentence)
                 
         # 发送剩余的文本
         if sentence_buffer.strip():
             engine.tts.put_text(sentence_buffer.strip())
-            logger.info(f"[Realtime] Sent final text to TTS: {sentence_buffer[:30]}...")
+            logger.info("[Realtime] Sent final text to TTS: %.30s...", sentence_buffer)
             
-        logger.info(f"[Full Realtime Streaming] LLM complete: {len(full_response)} chars")
+        logger.info("[Full Realtime Streaming] LLM complete: %d chars", len(full_response))
         
         # 3. 等待并推送所有视频帧
-        from webrtc_streamer import get_webrtc_streamer
         streamer = get_webrtc_streamer()
         
+        # 由一个专用线程阻塞读取引擎的帧队列，通过 call_soon_threadsafe 转入 asyncio.Queue，
+        # 避免每帧一次 run_in_executor + wait_for；credits 限制在途帧数，保留对引擎的反压
+        loop = asyncio.get_running_loop()
+        frame_queue: asyncio.Queue = asyncio.Queue()
+        credits = threading.Semaphore(_FRAME_PUMP_CREDITS)
+        stop_event = threading.Event()
+        threading.Thread(
+            target=_pump_frames,
+            args=(engine.video_frame_queue, loop, frame_queue, credits, stop_event),
+            daemon=True
+        ).start()
+
         frame_count = 0
-        # 持续读取视频帧直到引擎完成
-        while True:
-            try:
-                video_frame = await asyncio.wait_for(
-                    asyncio.get_event_loop().run_in_executor(
-                        None,
-                        lambda: engine.video_frame_queue.get(timeout=3)
-                    ),
-                    timeout=5
-                )
-                
-                await streamer.stream_frame(session_id, video_frame)
-                frame_count += 1
+        try:
+            # 持续读取视频帧直到引擎完成（泵线程在队列空闲超时后发送 None）
+            # 每次唤醒时顺带取走队列中已就绪的帧（最多 _FRAME_BATCH_SIZE 帧）一起推送，不额外等待
+            finished = False
+            while not finished:
+                frames = [await frame_queue.get()]
+                while len(frames) < _FRAME_BATCH_SIZE and not frame_queue.empty():
+                    frames.append(frame_queue.get_nowait())
+                if frames[-1] is None:
+                    frames.pop()
+                    finished = True
+                if not frames:
+                    continue
+
+                await streamer.stream_frames(session_id, frames)
+                for _ in frames:
+                    credits.release()
+                _count_frames(session_id, len(frames))
                 
-                if frame_count == 1:
-                    logger.info(f"⚡ First frame pushed!")
-                    
-                if frame_count % 25 == 0:
-                    logger.info(f"Streamed {frame_count} frames")
-                    
-            except (asyncio.TimeoutError, Exception):
-                if engine.video_frame_queue.empty():
-                    break
+                if frame_count == 0:
+                    logger.info("⚡ First frame pushed!")
+                frame_count += len(frames)
+        finally:
+            stop_event.set()
+            credits.release()
                     
-        logger.info(f"[Full Realtime Streaming] Complete: {frame_count} frames, {len(full_response)} chars")
+        logger.info("[Full Realtime Streaming] Complete: %d frames, %d chars", frame_count, len(full_response))
         return full_response
 
+    def close(self):
+        """
+        释放该 tutor 独占的资源
+
+        LLM 引擎按 tutor_id 缓存，随 AIEngine 一起从缓存中移除；
+        ASR/TTS/RAG/Video 引擎由所有 tutor 共享，不在这里释放。
+        仍持有该实例的连接可以继续使用，最后一个引用释放后即被回收。
+        """
+        remove_llm_engine(self.tutor_id)
+        if self._response_cache is not None:
+            self._response_cache.clear()
+        self._rag_memo.clear()
+        logger.info(f"AI Engine closed for tutor_id={self.tutor_id}")
+
+
+# 按 tutor_id 隔离的 AI 引擎实例缓存（LRU，上限为 settings.max_cached_engines）
+_tutor_engines: OrderedDict[int, AIEngine] = OrderedDict()
 
-# 按 tutor_id 隔离的 AI 引擎实例缓存
-_tutor_engines: Dict[int, AIEngine] = {}
-_engines_lock = Lock()
+# 按 tutor_id 划分的创建锁：只串行化同一 tutor 的并发创建，不同 tutor 互不阻塞
+_creation_locks: Dict[int, object] = {}
+
+
+def invalidate_kb_responses(kb_id: str) -> int:
+    """
+    删除所有 tutor 的响应缓存中使用了指定知识库的条目（知识库文档变化时调用）
+
+    Args:
+        kb_id: 知识库 ID
+
+    Returns:
+        int: 删除的条目数
+    """
+    removed = 0
+    for engine in list(_tutor_engines.values()):
+        if engine._response_cache is not None:
+            removed += engine._response_cache.invalidate(kb_id)
+        # 同一知识库的短期 RAG 检索结果也一并丢弃
+        for memo_key in [key for key in list(engine._rag_memo) if kb_id in key[0]]:
+            engine._rag_memo.pop(memo_key, None)
+    logger.info("Invalidated %d cached responses for kb_id=%s", removed, kb_id)
+    return removed
 
 
 def get_ai_engine(tutor_id: int) -> AIEngine:
@@ -558,6 +1269,8 @@ def get_ai_engine(tutor_id: int) -> AIEngine:
     - 每个 tutor_id 对应一个独立的 AIEngine 实例
     - 不同 tutor 使用不同的模型实例
     - 模型实例会被缓存，避免重复创建
+    - 缓存数量超过 settings.max_cached_engines 时淘汰最久未使用的实例
+    - 创建新实例时顺带淘汰空闲超过 settings.engine_idle_ttl_seconds 的实例
     
     Args:
         tutor_id: 导师 ID
@@ -565,20 +1278,57 @@ def get_ai_engine(tutor_id: int) -> AIEngine:
     Returns:
         AIEngine: 对应 tutor_id 的 AI 引擎实例
     """
-    global _tutor_engines
+    # 快速路径：get/move_to_end 在 GIL 下是原子操作，命中时无需加锁
+    now = time.monotonic()
+    engine = _tutor_engines.get(tutor_id)
+    if engine is not None:
+        engine.last_used = now
+        try:
+            _tutor_engines.move_to_end(tutor_id)
+        except KeyError:
+            # 刚好被其他线程淘汰，仍返回当前实例
+            pass
+        return engine
     
-    # 如果已存在，直接返回
-    if tutor_id in _tutor_engines:
-        return _tutor_engines[tutor_id]
-    
-    # 线程安全地创建新实例
-    with _engines_lock:
+    # 仅在插入新实例时加锁（dict.setdefault 在 GIL 下是原子操作，并发调用拿到同一把锁）
+    evicted = []
+    creation_lock = _creation_locks.setdefault(tutor_id, _thread.allocate_lock())
+    with creation_lock:
         # 双重检查，避免并发创建
-        if tutor_id not in _tutor_engines:
-            _tutor_engines[tutor_id] = AIEngine(tutor_id=tutor_id)
+        engine = _tutor_engines.get(tutor_id)
+        if engine is None:
+            engine = AIEngine(tutor_id=tutor_id)
+            _tutor_engines[tutor_id] = engine
             logger.info(f"Created new AI Engine instance for tutor_id={tutor_id}")
-        
-        return _tutor_engines[tutor_id]
+
+            while len(_tutor_engines) > settings.max_cached_engines:
+                try:
+                    evicted.append(_tutor_engines.popitem(last=False)[1])
+                except KeyError:
+                    # 其他 tutor 的创建线程已同时完成淘汰
+                    break
+
+            # 按 LRU 顺序从最旧的一端淘汰空闲超时的实例
+            if settings.engine_idle_ttl_seconds > 0:
+                deadline = now - settings.engine_idle_ttl_seconds
+                for idle_id in list(_tutor_engines):
+                    idle_engine = _tutor_engines.get(idle_id)
+                    if idle_engine is None:
+                        continue
+                    if idle_engine.last_used >= deadline:
+                        break
+                    if _tutor_engines.pop(idle_id, None) is not None:
+                        evicted.append(idle_engine)
+
+    # 实例已进入缓存，后续请求走快速路径，创建锁不再需要
+    _creation_locks.pop(tutor_id, None)
+
+    # 在锁外释放被淘汰的实例
+    for old_engine in evicted:
+        logger.info(f"Evicting least recently used or idle AI Engine for tutor_id={old_engine.tutor_id}")
+        old_engine.close()
+
+    return engine
 
 
 def remove_ai_engine(tutor_id: int) -> bool:
@@ -591,14 +1341,13 @@ def remove_ai_engine(tutor_id: int) -> bool:
     Returns:
         bool: 是否成功移除
     """
-    global _tutor_engines
-    
-    with _engines_lock:
-        if tutor_id in _tutor_engines:
-            del _tutor_engines[tutor_id]
-            logger.info(f"Removed AI Engine instance for tutor_id={tutor_id}")
-            return True
-        return False
+    # dict.pop 在 GIL 下是原子操作，无需加锁
+    engine = _tutor_engines.pop(tutor_id, None)
+    if engine is not None:
+        engine.close()
+        logger.info(f"Removed AI Engine instance for tutor_id={tutor_id}")
+        return True
+    return False
 
 
 def get_all_tutor_ids() -> list:
@@ -608,8 +1357,8 @@ def get_all_tutor_ids() -> list:
     Returns:
         list: tutor_id 列表
     """
-    with _engines_lock:
-        return list(_tutor_engines.keys())
+    # list(dict) 在 GIL 下是原子快照
+    return list(_tutor_engines)
 
 
 # TODO: 在真实环境中，需要实现以下模块：
@@ -1,15 +1,143 @@
-from fastapi import FastAPI, HTTPException, status, File, UploadFile, Form
+from fastapi import FastAPI, HTTPException, Query, Request, status, File, UploadFile, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import BinaryIO, Dict, List, Optional
 import uvicorn
+import asyncio
+import bisect
+import io
+import logging
+import orjson
 import os
 import shutil
 import tempfile
+import time
 
 from config import settings
 from session_manager import get_session_manager
-from musetalk import get_avatar_manager
+from musetalk import AvatarManager, get_avatar_manager
+
+logger = logging.getLogger(__name__)
+
+# 无法使用 os.sendfile 时（如上传内容仍在内存中）按该块大小（4 MiB）复制
+_UPLOAD_CHUNK_SIZE = 1 << 22
+
+
+def _copy_file(src: BinaryIO, dst: BinaryIO) -> int:
+    """
+    把 src 的全部内容复制到 dst（在线程池中调用）
+
+    src 有真实文件描述符时使用 os.sendfile 由内核直接复制，否则回退到分块 copyfileobj。
+
+    Args:
+        src: 源文件对象（从头开始读取）
+        dst: 已打开的目标文件
+
+    Returns:
+        int: 复制的字节数
+    """
+    src.seek(0)
+    start = dst.tell()
+    # SpooledTemporaryFile 未落盘时调用 fileno() 会强制写一次磁盘，直接从内存复制即可
+    if getattr(src, "_rolled", True):
+        try:
+            in_fd = src.fileno()
+            size = os.fstat(in_fd).st_size
+            offset = 0
+            while offset < size:
+                sent = os.sendfile(dst.fileno(), in_fd, offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+            if offset == size:
+                return size
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            pass
+        dst.seek(start)
+        dst.truncate()
+        src.seek(0)
+
+    shutil.copyfileobj(src, dst, _UPLOAD_CHUNK_SIZE)
+    return dst.tell() - start
+
+
+def _save_upload(src: BinaryIO, dst_path: str) -> int:
+    """
+    保存上传的文件（在线程池中调用）
+
+    Args:
+        src: UploadFile 底层的文件对象
+        dst_path: 目标路径
+
+    Returns:
+        int: 写入的字节数
+    """
+    with open(dst_path, "wb") as dst:
+        return _copy_file(src, dst)
+
+
+def _concat_files(part_paths: List[str], dst_path: str):
+    """
+    按顺序拼接分块文件并删除分块（在线程池中调用）
+
+    Args:
+        part_paths: 分块文件路径（按顺序）
+        dst_path: 拼接后的文件路径
+    """
+    with open(dst_path, "wb") as dst:
+        for part_path in part_paths:
+            with open(part_path, "rb") as part:
+                _copy_file(part, dst)
+            os.remove(part_path)
+
+
+@dataclass
+class ChunkUploadState:
+    """分块上传状态（按 avatar_id 索引）"""
+    temp_dir: str
+    total_chunks: int
+    filename: str
+    chunk_sizes: Dict[int, int] = field(default_factory=dict)
+    assembling: bool = False
+    updated_at: float = field(default_factory=time.time)
+
+    @property
+    def received_bytes(self) -> int:
+        """从第 0 块开始连续收到的字节数（用于 Range 响应头）"""
+        total = 0
+        for idx in range(self.total_chunks):
+            size = self.chunk_sizes.get(idx)
+            if size is None:
+                break
+            total += size
+        return total
+
+    def part_path(self, chunk_index: int) -> str:
+        return os.path.join(self.temp_dir, f"part{chunk_index}")
+
+
+# 进行中的分块上传
+_chunk_uploads: Dict[str, ChunkUploadState] = {}
+
+
+@lru_cache(maxsize=1)
+def _get_avatar_manager() -> AvatarManager:
+    """
+    获取按当前配置创建的 Avatar 管理器（参数来自 settings，只解析一次）
+
+    Returns:
+        AvatarManager: Avatar 管理器实例
+    """
+    return get_avatar_manager(
+        enable_real=settings.enable_avatar,
+        avatars_dir=settings.avatars_dir,
+        musetalk_base=settings.musetalk_base,
+        conda_env=settings.musetalk_conda_env,
+        ffmpeg_path=settings.ffmpeg_path
+    )
 
 
 # Pydantic 模型
@@ -43,9 +171,30 @@ class SessionStatusResponse(BaseModel):
 app = FastAPI(
     title="GPU Server Management API",
     description="AI 推理引擎管理接口",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
+@app.exception_handler(Exception)
+async def unhandled_exception_handler(request: Request, exc: Exception):
+    """
+    未处理异常统一返回 500（HTTPException 由 FastAPI 直接返回对应的 4xx/5xx，不经过这里）
+
+    Args:
+        request: 请求对象
+        exc: 异常
+
+    Returns:
+        ORJSONResponse: 500 错误响应
+    """
+    # 异常详情只写日志，不返回给客户端
+    logger.error("Unhandled error on %s %s: %s", request.method, request.url.path, exc, exc_info=exc)
+    return ORJSONResponse(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        content={"detail": "Internal server error"}
+    )
+
+
 # 配置 CORS
 app.add_middleware(
     CORSMiddleware,
@@ -157,8 +306,8 @@ async def get_session_status(session_id: str):
         student_id=session.student_id,
         kb_id=session.kb_id,
         status=session.status,
-        created_at=session.to_dict()["created_at"],
-        last_activity=session.to_dict()["last_activity"]
+        created_at=session.created_at_iso,
+        last_activity=session.last_activity_iso
     )
 
 
@@ -191,15 +340,20 @@ async def list_sessions():
     列出所有活跃会话（调试用）
 
     Returns:
-        dict: 所有会话信息
+        StreamingResponse: 所有会话信息（逐个会话序列化输出，不在内存中拼出完整列表）
     """
     manager = get_session_manager()
     sessions = manager.get_all_sessions()
 
-    return {
-        "total": len(sessions),
-        "sessions": [session.to_dict() for session in sessions.values()]
-    }
+    def iter_sessions():
+        yield b'{"total":%d,"sessions":[' % len(sessions)
+        for i, session in enumerate(sessions.values()):
+            if i:
+                yield b","
+            yield orjson.dumps(session.to_dict())
+        yield b"]}"
+
+    return StreamingResponse(iter_sessions(), media_type="application/json")
 
 
 # ====================================
@@ -235,37 +389,48 @@ async def create_avatar_from_path(request: CreateAvatarRequest):
     Returns:
         AvatarResponse: Avatar 创建结果
     """
-    try:
-        avatar_manager = get_avatar_manager(
-            enable_real=settings.enable_avatar,
-            avatars_dir=settings.avatars_dir,
-            musetalk_base=settings.musetalk_base,
-            conda_env=settings.musetalk_conda_env,
-            ffmpeg_path=settings.ffmpeg_path
+    avatar_manager = _get_avatar_manager()
+
+    # 验证视频文件存在（在线程池中检查，网络存储较慢时不阻塞事件循环）
+    if not await asyncio.to_thread(os.path.exists, request.video_path):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Video file not found: {request.video_path}"
         )
 
-        # 验证视频文件存在
-        if not os.path.exists(request.video_path):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Video file not found: {request.video_path}"
-            )
+    # 创建 Avatar
+    result = await avatar_manager.create_avatar(
+        avatar_id=request.avatar_id,
+        video_path=request.video_path,
+        apply_blur=request.apply_blur,
+        tutor_id=request.tutor_id
+    )
 
-        # 创建 Avatar
-        result = await avatar_manager.create_avatar(
-            avatar_id=request.avatar_id,
-            video_path=request.video_path,
-            apply_blur=request.apply_blur,
-            tutor_id=request.tutor_id
-        )
+    return AvatarResponse(**result)
 
-        return AvatarResponse(**result)
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to create avatar: {str(e)}"
-        )
+def _make_upload_temp_dir(prefix: str, expected_size: Optional[int]) -> str:
+    """
+    创建上传视频的临时目录
+
+    上传的视频保存后会立刻被 ffmpeg 读回，放在 tmpfs 上可以完全避开块设备 I/O。
+    tmpfs 占用的是内存，只有在已知文件大小且剩余空间足够（留一倍余量）时才使用。
+
+    Args:
+        prefix: 目录名前缀
+        expected_size: 预计写入的字节数，未知时为 None
+
+    Returns:
+        str: 临时目录路径
+    """
+    tmpfs_dir = settings.upload_tmpfs_dir
+    if tmpfs_dir and expected_size and os.path.isdir(tmpfs_dir):
+        try:
+            if shutil.disk_usage(tmpfs_dir).free > expected_size * 2:
+                return tempfile.mkdtemp(prefix=prefix, dir=tmpfs_dir)
+        except OSError as e:
+            logger.warning("tmpfs upload dir unavailable, falling back to disk: %s", e)
+    return tempfile.mkdtemp(prefix=prefix)
 
 
 @app.post("/v1/avatars/upload", response_model=AvatarResponse, status_code=status.HTTP_201_CREATED)
@@ -288,24 +453,15 @@ async def create_avatar_from_upload(
     Returns:
         AvatarResponse: Avatar 创建结果
     """
-    temp_video_path = None
-
-    try:
-        avatar_manager = get_avatar_manager(
-            enable_real=settings.enable_avatar,
-            avatars_dir=settings.avatars_dir,
-            musetalk_base=settings.musetalk_base,
-            conda_env=settings.musetalk_conda_env,
-            ffmpeg_path=settings.ffmpeg_path
-        )
+    avatar_manager = _get_avatar_manager()
 
-        # 创建临时目录保存上传的视频
-        temp_dir = tempfile.mkdtemp(prefix="avatar_upload_")
-        temp_video_path = os.path.join(temp_dir, video_file.filename)
+    # 创建临时目录保存上传的视频（空间足够时放在 tmpfs 上）
+    temp_dir = await asyncio.to_thread(_make_upload_temp_dir, "avatar_upload_", video_file.size)
+    temp_video_path = os.path.join(temp_dir, os.path.basename(video_file.filename or "video.mp4"))
 
-        # 保存上传的文件
-        with open(temp_video_path, "wb") as f:
-            shutil.copyfileobj(video_file.file, f)
+    try:
+        # 保存上传的文件（在线程池中复制，不阻塞事件循环）
+        await asyncio.to_thread(_save_upload, video_file.file, temp_video_path)
 
         # 创建 Avatar
         result = await avatar_manager.create_avatar(
@@ -317,19 +473,149 @@ async def create_avatar_from_upload(
 
         return AvatarResponse(**result)
 
-    except Exception as e:
+    finally:
+        # 清理临时文件
+        await asyncio.to_thread(shutil.rmtree, temp_dir, ignore_errors=True)
+
+
+async def _sweep_chunk_uploads():
+    """清理超时未续传的分块上传"""
+    deadline = time.time() - settings.avatar_upload_chunk_ttl_seconds
+    expired = [
+        avatar_id for avatar_id, state in _chunk_uploads.items()
+        if state.updated_at < deadline and not state.assembling
+    ]
+    for avatar_id in expired:
+        state = _chunk_uploads.pop(avatar_id)
+        await asyncio.to_thread(shutil.rmtree, state.temp_dir, ignore_errors=True)
+
+
+@app.post("/v1/avatars/upload/chunk", response_model=AvatarResponse, status_code=status.HTTP_201_CREATED)
+@app.post("/mgmt/v1/avatars/upload/chunk", response_model=AvatarResponse, status_code=status.HTTP_201_CREATED)
+async def upload_avatar_chunk(
+    avatar_id: str = Form(...),
+    chunk_index: int = Form(...),
+    total_chunks: int = Form(...),
+    apply_blur: bool = Form(False),
+    tutor_id: Optional[int] = Form(None),
+    filename: str = Form("video.mp4"),
+    data: UploadFile = File(...)
+):
+    """
+    分块上传视频并创建 Avatar（教师端使用，支持断点续传）
+
+    每块单独保存为临时文件，失败时只需重传该块；分块可以乱序或并行上传。
+    未收齐时返回 308 和 Range 头（从第 0 块开始连续收到的字节范围），
+    收齐最后一块后按顺序拼接并创建 Avatar。
+
+    Args:
+        avatar_id: Avatar 唯一标识符
+        chunk_index: 分块序号（从 0 开始）
+        total_chunks: 分块总数
+        apply_blur: 是否应用背景模糊
+        tutor_id: 关联的 Tutor ID
+        filename: 原始视频文件名
+        data: 分块数据
+
+    Returns:
+        AvatarResponse: 收齐所有分块后的 Avatar 创建结果
+    """
+    await _sweep_chunk_uploads()
+
+    if total_chunks <= 0 or not 0 <= chunk_index < total_chunks:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid chunk_index {chunk_index} for total_chunks {total_chunks}"
+        )
+
+    state = _chunk_uploads.get(avatar_id)
+    if state is None:
+        state = ChunkUploadState(
+            temp_dir=tempfile.mkdtemp(prefix="avatar_chunks_"),
+            total_chunks=total_chunks,
+            filename=os.path.basename(filename) or "video.mp4"
+        )
+        _chunk_uploads[avatar_id] = state
+    elif state.total_chunks != total_chunks:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to create avatar: {str(e)}"
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"total_chunks mismatch: expected {state.total_chunks}"
         )
+    elif state.assembling:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload for {avatar_id} is already being processed"
+        )
+
+    # 保存分块
+    size = await asyncio.to_thread(_save_upload, data.file, state.part_path(chunk_index))
+    state.chunk_sizes[chunk_index] = size
+    state.updated_at = time.time()
+
+    if len(state.chunk_sizes) < state.total_chunks:
+        received_bytes = state.received_bytes
+        headers = {"Range": f"bytes=0-{received_bytes - 1}"} if received_bytes else {}
+        return ORJSONResponse(
+            status_code=308,
+            headers=headers,
+            content={
+                "status": "incomplete",
+                "avatar_id": avatar_id,
+                "received_chunks": sorted(state.chunk_sizes),
+                "total_chunks": state.total_chunks
+            }
+        )
+
+    # 所有分块已收齐：按顺序拼接后创建 Avatar
+    state.assembling = True
+    video_path = os.path.join(state.temp_dir, state.filename)
+    try:
+        await asyncio.to_thread(
+            _concat_files,
+            [state.part_path(idx) for idx in range(state.total_chunks)],
+            video_path
+        )
+
+        avatar_manager = _get_avatar_manager()
+        result = await avatar_manager.create_avatar(
+            avatar_id=avatar_id,
+            video_path=video_path,
+            apply_blur=apply_blur,
+            tutor_id=tutor_id
+        )
+
+        return AvatarResponse(**result)
+
     finally:
-        # 清理临时文件
-        if temp_video_path and os.path.exists(temp_video_path):
-            try:
-                os.remove(temp_video_path)
-                os.rmdir(os.path.dirname(temp_video_path))
-            except:
-                pass
+        # 清理分块上传状态和临时文件
+        _chunk_uploads.pop(avatar_id, None)
+        await asyncio.to_thread(shutil.rmtree, state.temp_dir, ignore_errors=True)
+
+
+@app.get("/v1/avatars/upload/chunk/{avatar_id}")
+@app.get("/mgmt/v1/avatars/upload/chunk/{avatar_id}")
+async def get_avatar_upload_status(avatar_id: str):
+    """
+    查询分块上传进度（断点续传时用于确定需要重传的分块）
+
+    Args:
+        avatar_id: Avatar 唯一标识符
+
+    Returns:
+        dict: 已收到的分块序号和分块总数
+    """
+    state = _chunk_uploads.get(avatar_id)
+    if state is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No upload in progress for {avatar_id}"
+        )
+
+    return {
+        "avatar_id": avatar_id,
+        "received_chunks": sorted(state.chunk_sizes),
+        "total_chunks": state.total_chunks
+    }
 
 
 @app.get("/v1/avatars/{avatar_id}")
@@ -346,10 +632,7 @@ async def get_avatar(avatar_id: str):
     Raises:
         HTTPException: 如果 Avatar 不存在
     """
-    avatar_manager = get_avatar_manager(
-        enable_real=settings.enable_avatar,
-        avatars_dir=settings.avatars_dir
-    )
+    avatar_manager = _get_avatar_manager()
 
     avatar_info = await avatar_manager.get_avatar(avatar_id)
 
@@ -373,10 +656,7 @@ async def delete_avatar(avatar_id: str):
     Raises:
         HTTPException: 如果 Avatar 不存在
     """
-    avatar_manager = get_avatar_manager(
-        enable_real=settings.enable_avatar,
-        avatars_dir=settings.avatars_dir
-    )
+    avatar_manager = _get_avatar_manager()
 
     success = await avatar_manager.delete_avatar(avatar_id)
 
@@ -390,26 +670,65 @@ async def delete_avatar(avatar_id: str):
 
 
 @app.get("/v1/avatars")
-async def list_avatars():
+async def list_avatars(
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="每页数量（不传则返回全部）"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor")
+):
     """
-    列出所有 Avatar
+    列出 Avatar（支持按游标分页）
+
+    Args:
+        limit: 每页数量，不传时返回全部（兼容旧客户端）
+        cursor: 从该 Avatar ID 之后开始返回
 
     Returns:
-        dict: Avatar 列表
+        dict: Avatar 列表；分页时带 next_cursor（没有下一页时为 None）
     """
-    avatar_manager = get_avatar_manager(
-        enable_real=settings.enable_avatar,
-        avatars_dir=settings.avatars_dir
-    )
+    avatar_manager = _get_avatar_manager()
 
     avatars = await avatar_manager.list_avatars()
 
+    if limit is None:
+        return {
+            "total": len(avatars),
+            "avatars": avatars
+        }
+
+    # avatar 列表按 ID 排序，游标之后的位置用二分查找定位
+    start = bisect.bisect_right(avatars, cursor) if cursor else 0
+    page = avatars[start:start + limit]
+    has_more = start + limit < len(avatars)
+
     return {
         "total": len(avatars),
-        "avatars": avatars
+        "avatars": page,
+        "next_cursor": page[-1] if has_more else None
     }
 
 
+# WebRTC 配置在运行期间不变，模块加载时构建并序列化一次（前端会轮询该接口）
+_WEBRTC_CONFIG = {
+    "iceServers": [
+        {
+            "urls": [settings.webrtc_stun_server]
+        },
+        {
+            "urls": [settings.webrtc_turn_server],
+            "username": settings.webrtc_turn_username,
+            "credential": settings.webrtc_turn_password
+        }
+    ],
+    "iceTransportPolicy": "relay",  # 强制使用 TURN relay，确保流量通过中继
+    "publicIp": settings.webrtc_public_ip,
+    "portRange": {
+        "min": settings.webrtc_port_min,
+        "max": settings.webrtc_port_max
+    },
+    "sdpSemantics": "unified-plan"
+}
+_WEBRTC_CONFIG_BODY = orjson.dumps(_WEBRTC_CONFIG)
+
+
 @app.get("/v1/webrtc/config")
 @app.get("/mgmt/v1/webrtc/config")
 @app.get("/api/webrtc/config")
@@ -421,36 +740,22 @@ async def get_webrtc_config():
     前端需要这些配置来正确建立WebRTC连接
     
     Returns:
-        dict: WebRTC 配置，包括 ICE 服务器等
+        Response: WebRTC 配置（JSON），包括 ICE 服务器等
     """
-    # 使用环境变量配置的 TURN 服务器
-    return {
-        "iceServers": [
-            {
-                "urls": [settings.webrtc_stun_server]
-            },
-            {
-                "urls": [settings.webrtc_turn_server],
-                "username": settings.webrtc_turn_username,
-                "credential": settings.webrtc_turn_password
-            }
-        ],
-        "iceTransportPolicy": "relay",  # 强制使用 TURN relay，确保流量通过中继
-        "publicIp": settings.webrtc_public_ip,
-        "portRange": {
-            "min": settings.webrtc_port_min,
-            "max": settings.webrtc_port_max
-        },
-        "sdpSemantics": "unified-plan"
-    }
+    # 使用环境变量配置的 TURN 服务器（已预先序列化）
+    return Response(content=_WEBRTC_CONFIG_BODY, media_type="application/json")
 
 
 def main():
     """启动管理 API 服务"""
+    workers = settings.management_api_workers
     uvicorn.run(
-        app,
+        app if workers == 1 else "api.management_api:app",
         host=settings.management_api_host,
         port=settings.management_api_port,
+        loop="uvloop",
+        http="httptools",
+        workers=workers,
         log_level="info"
     )
 
@@ -1,27 +1,38 @@
 import asyncio
-import json
+import binascii
+import functools
+import hmac
 import logging
 import time
-from typing import Optional, Dict
-from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
 import os
 import cv2
 import numpy as np
+import orjson
+import ormsgpack
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Query, status
+from fastapi import FastAPI, Header, HTTPException, WebSocket, WebSocketDisconnect, Query, status
 from fastapi.responses import JSONResponse
+from pydantic import BaseModel, ConfigDict, TypeAdapter, ValidationError
 import uvicorn
 
 from config import settings
 from session_manager import get_session_manager
-from ai_models import get_ai_engine
+from ai_models import get_ai_engine, invalidate_kb_responses
 from webrtc_streamer import get_webrtc_streamer
+from log_context import LOG_FORMAT, install_session_filter, set_session_context
+from connection_registry import ConnectionRegistry
+from ws_codec import b64decode, now_iso, send_ws_message
 
-# 配置日志
+# 配置日志（tutor_id / session_id 由 SessionContextFilter 从请求上下文注入）
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    format=LOG_FORMAT
 )
+install_session_filter()
 logger = logging.getLogger(__name__)
 
 
@@ -33,57 +44,387 @@ app = FastAPI(
 )
 
 
-# 活跃的 WebSocket 连接（按 connection_id 索引）
-active_connections: Dict[str, WebSocket] = {}
+@dataclass(slots=True)
+class AssistantMessage:
+    """助手回复的纯文本消息（orjson 直接序列化 dataclass，不再逐条构建 dict）"""
+    type: str
+    content: str
+    timestamp: str
+    role: str = "assistant"
 
-# Session 上下文管理（按 engine_session_id 索引）
+
+@dataclass(slots=True)
+class TextStreamToken:
+    """流式回复中的单个 token 消息（每个 token 发送一次，是最频繁的消息）"""
+    token: str
+    timestamp: str
+    type: str = "text_stream"
+    role: str = "assistant"
+
+
+# 活跃的 WebSocket 连接（按 connection_id 分片索引）
+active_connections = ConnectionRegistry()
+
+# Session 上下文管理（按 engine_session_id 索引，LRU 顺序）
 # 用于存储每个 session 的上下文信息（对话历史、状态等）
-session_contexts: Dict[str, dict] = {}
+# 数量超过 settings.session_context_cache_size 时淘汰最久未使用的上下文，
+# 插入新上下文时顺带淘汰空闲超过 settings.session_context_ttl_seconds 的上下文
+session_contexts: "OrderedDict[str, dict]" = OrderedDict()
 
 
-async def load_idle_frames(avatar_id: str) -> list:
+def get_session_context(engine_session_id: str) -> Optional[dict]:
     """
-    Load idle video frames for WebRTC streaming
+    查询 session 上下文并刷新其最近使用时间
 
     Args:
-        avatar_id: Avatar identifier
+        engine_session_id: 引擎 session ID
 
     Returns:
-        List of numpy arrays (frames)
+        dict: 上下文（session / ai_engine），不存在返回 None
     """
-    try:
-        # 获取 avatar 目录
-        avatar_dir = f"/workspace/gpuserver/data/avatars/{avatar_id}"
+    ctx = session_contexts.get(engine_session_id)
+    if ctx is not None:
+        ctx["last_used"] = time.monotonic()
+        session_contexts.move_to_end(engine_session_id)
+    return ctx
 
-        if not os.path.exists(avatar_dir):
-            logger.warning(f"Avatar directory not found: {avatar_dir}")
-            return []
 
-        # 尝试从 full_imgs 子目录加载
-        full_imgs_dir = os.path.join(avatar_dir, "full_imgs")
-        if os.path.exists(full_imgs_dir):
-            search_dir = full_imgs_dir
-        else:
-            search_dir = avatar_dir
+def put_session_context(engine_session_id: str, session, ai_engine) -> dict:
+    """
+    创建 session 上下文，并淘汰超出上限或空闲超时的旧上下文
 
-        # 读取所有帧
-        frames = []
-        frame_files = sorted([f for f in os.listdir(search_dir) if f.endswith('.png')])
+    Args:
+        engine_session_id: 引擎 session ID
+        session: 会话对象
+        ai_engine: 该会话使用的 AI 引擎
+
+    Returns:
+        dict: 新建的上下文
+    """
+    now = time.monotonic()
+    ctx = {"session": session, "ai_engine": ai_engine, "last_used": now}
+    session_contexts[engine_session_id] = ctx
+    session_contexts.move_to_end(engine_session_id)
+
+    while len(session_contexts) > settings.session_context_cache_size:
+        session_contexts.popitem(last=False)
+
+    # 按 LRU 顺序从最旧的一端淘汰空闲超时的上下文
+    if settings.session_context_ttl_seconds > 0:
+        deadline = now - settings.session_context_ttl_seconds
+        while session_contexts:
+            oldest_id, oldest = next(iter(session_contexts.items()))
+            if oldest["last_used"] >= deadline:
+                break
+            del session_contexts[oldest_id]
+            logger.info(f"Evicted idle session context: engine_session_id={oldest_id}")
+
+    return ctx
+
+
+# 待机帧数量（5秒 @ 25fps）
+_IDLE_FRAME_COUNT = 125
+# 每个 avatar 目录下预编码的待机视频（首次从 PNG 加载后生成）；文件名带帧尺寸，
+# 修改 idle_frame_width / idle_frame_height 后会从源 PNG 重新生成，而不是从旧尺寸的视频缩放
+_IDLE_CLIP_NAME = "idle.mp4"
+_IDLE_CLIP_SIZED_NAME = "idle_{width}x{height}.mp4"
+
+# 正在后台写入的待机视频（按路径）：保留 future 的引用，同一路径不重复写入
+_idle_clip_writes: Dict[str, asyncio.Future] = {}
+
+
+# 解码后的待机帧缓存（按 avatar_id，LRU 淘汰）；帧只读，所有 WebRTC 连接共享同一份
+_idle_frame_cache: "OrderedDict[str, Union[np.ndarray, list]]" = OrderedDict()
+# 每个 avatar 一把锁：同一 avatar 并发的 offer 只解码一次
+_idle_frame_locks: Dict[str, asyncio.Lock] = {}
+
+
+# 待机帧 PNG 解码进程池（settings.idle_frame_decode_processes 开启时首次使用时创建）
+_decode_pool: Optional[ProcessPoolExecutor] = None
+# 待机帧读取 / 编码线程池（首次使用时创建），避免大量解码任务占满 asyncio.to_thread 的默认线程池
+_image_io_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _idle_frame_size() -> Optional[Tuple[int, int]]:
+    """
+    待机帧的目标分辨率
+
+    Returns:
+        (宽, 高)，未配置时返回 None（保持原始分辨率）
+    """
+    if settings.idle_frame_width > 0 and settings.idle_frame_height > 0:
+        return settings.idle_frame_width, settings.idle_frame_height
+    return None
+
+
+def _fit_frame(frame: np.ndarray, size: Optional[Tuple[int, int]]) -> np.ndarray:
+    """把帧缩放到目标分辨率（缩小用 INTER_AREA），尺寸已符合或未配置时原样返回"""
+    if size is None or (frame.shape[1], frame.shape[0]) == size:
+        return frame
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+def _decode_png(path: str, size: Optional[Tuple[int, int]] = None) -> Optional[np.ndarray]:
+    """
+    解码一张 PNG 为 BGR 帧，并在解码后立即缩放到目标分辨率（顶层函数，可在子进程中执行）
+
+    Args:
+        path: PNG 路径
+        size: 目标 (宽, 高)，None 表示保持原始分辨率
+
+    Returns:
+        BGR 帧，读取失败返回 None
+    """
+    frame = cv2.imread(path, cv2.IMREAD_COLOR)
+    if frame is None:
+        return None
+    return _fit_frame(frame, size)
+
+
+def _get_decode_pool() -> ProcessPoolExecutor:
+    """获取待机帧解码进程池（单例）"""
+    global _decode_pool
+    if _decode_pool is None:
+        _decode_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+    return _decode_pool
+
+
+def _get_image_io_pool() -> ThreadPoolExecutor:
+    """获取待机帧读取 / 编码线程池（单例）"""
+    global _image_io_pool
+    if _image_io_pool is None:
+        _image_io_pool = ThreadPoolExecutor(
+            max_workers=settings.image_io_workers, thread_name_prefix="image-io"
+        )
+    return _image_io_pool
 
-        # 只加载前 125 帧（5秒 @ 25fps）
-        for frame_file in frame_files[:125]:
-            frame_path = os.path.join(search_dir, frame_file)
-            frame = cv2.imread(frame_path)
-            if frame is not None:
+
+def _idle_clip_path(avatar_dir: str, size: Optional[Tuple[int, int]]) -> str:
+    """
+    待机视频的路径（与待机帧的目标分辨率对应）
+
+    Args:
+        avatar_dir: avatar 目录
+        size: 目标 (宽, 高)，None 表示原始分辨率
+
+    Returns:
+        str: 待机视频路径
+    """
+    if size is None:
+        return os.path.join(avatar_dir, _IDLE_CLIP_NAME)
+    return os.path.join(avatar_dir, _IDLE_CLIP_SIZED_NAME.format(width=size[0], height=size[1]))
+
+
+def _read_idle_clip(
+    clip_path: str,
+    max_frames: int,
+    fps: int = 25,
+    size: Optional[Tuple[int, int]] = None
+) -> list:
+    """
+    从预编码的待机视频解码帧（在线程池中运行）
+
+    安装了 ffmpegcv 且开启 settings.idle_frame_nvdec 时优先用 NVDEC 硬件解码（缩放也由解码器完成），
+    不可用时回退到 CPU 解码。解码结果拷回主机内存：aiortc 只接受主机内存中的帧（VideoFrame.from_ndarray）
+    并自行编码，帧无法以 GPU 显存的形式交给推流端。
+    视频帧率高于 fps 时按步长抽帧；CPU 路径对跳过的帧只 grab() 不解码。
+
+    Args:
+        clip_path: 待机视频路径
+        max_frames: 最多读取的帧数
+        fps: 输出帧率
+        size: 目标 (宽, 高)，None 表示保持原始分辨率
+
+    Returns:
+        List of numpy arrays (BGR frames)
+    """
+    try:
+        import ffmpegcv
+    except ImportError:
+        ffmpegcv = None
+
+    if ffmpegcv is not None:
+        cap = None
+        if settings.idle_frame_nvdec:
+            try:
+                cap = ffmpegcv.VideoCaptureNV(clip_path, pix_fmt="bgr24", resize=size)
+            except Exception as e:
+                logger.info(f"NVDEC unavailable, decoding idle clip on CPU: {e}")
+        if cap is None:
+            cap = ffmpegcv.VideoCapture(clip_path, pix_fmt="bgr24", resize=size)
+        with cap:
+            stride = max(1, round((getattr(cap, "fps", 0) or fps) / fps))
+            frames = []
+            for index, frame in enumerate(cap):
+                if index % stride:
+                    continue
                 frames.append(frame)
+                if len(frames) >= max_frames:
+                    break
+            return frames
+
+    cap = cv2.VideoCapture(clip_path)
+    try:
+        source_fps = cap.get(cv2.CAP_PROP_FPS) or fps
+        stride = max(1, round(source_fps / fps))
+        frames = []
+        index = 0
+        while len(frames) < max_frames and cap.grab():
+            if index % stride == 0:
+                ok, frame = cap.retrieve()
+                if ok:
+                    frames.append(_fit_frame(frame, size))
+            index += 1
+        return frames
+    finally:
+        cap.release()
+
+
+def _stack_frames(frames: list) -> Union[np.ndarray, list]:
+    """
+    把帧合并为一块连续内存的 (N, H, W, 3) uint8 数组
 
-        logger.info(f"Loaded {len(frames)} idle frames for avatar {avatar_id} from {search_dir}")
+    连续存储便于顺序读取，推流时 buf[i] 直接是连续切片，不需要逐帧追引用。
+    帧尺寸不一致时无法合并，原样返回列表。
+
+    Args:
+        frames: BGR 帧列表
+
+    Returns:
+        (N, H, W, 3) 数组，或原始列表
+    """
+    if not frames:
         return frames
+    shape = frames[0].shape
+    if any(frame.shape != shape for frame in frames):
+        logger.warning("Idle frames have mixed sizes, keeping them as a list")
+        return frames
+    buf = np.empty((len(frames),) + shape, dtype=np.uint8)
+    for i, frame in enumerate(frames):
+        buf[i] = frame
+    return buf
+
+
+async def load_idle_frames(avatar_id: str, avatar_manager=None) -> Union[np.ndarray, list]:
+    """
+    Load idle video frames for WebRTC streaming (cached per avatar)
+
+    Args:
+        avatar_id: Avatar identifier
+        avatar_manager: AvatarManager used to pre-encode idle.mp4 after a PNG load (optional)
 
+    Returns:
+        (N, H, W, 3) uint8 array of frames (a list if frame sizes differ),
+        shared between connections and must not be modified
+    """
+    frames = _idle_frame_cache.get(avatar_id)
+    if frames is not None:
+        _idle_frame_cache.move_to_end(avatar_id)
+        return frames
+
+    lock = _idle_frame_locks.setdefault(avatar_id, asyncio.Lock())
+    async with lock:
+        # 等锁期间可能已被其他连接加载
+        frames = _idle_frame_cache.get(avatar_id)
+        if frames is not None:
+            return frames
+
+        frames = await _decode_idle_frames(avatar_id, avatar_manager)
+        if len(frames) and settings.idle_frame_cache_size > 0:
+            _idle_frame_cache[avatar_id] = frames
+            while len(_idle_frame_cache) > settings.idle_frame_cache_size:
+                _idle_frame_cache.popitem(last=False)
+        return frames
+
+
+async def _decode_idle_frames(avatar_id: str, avatar_manager=None) -> Union[np.ndarray, list]:
+    """
+    Decode idle video frames from disk (idle.mp4 if present, otherwise PNG frames)
+
+    目录扫描和解码全部在专用的 image-io 线程池中进行，不阻塞事件循环，
+    也不占用其他 asyncio.to_thread 调用共享的默认线程池。
+
+    Args:
+        avatar_id: Avatar identifier
+        avatar_manager: AvatarManager used to pre-encode idle.mp4 after a PNG load (optional)
+
+    Returns:
+        (N, H, W, 3) uint8 array of frames (a list if frame sizes differ)
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        frames, idle_clip = await loop.run_in_executor(
+            _get_image_io_pool(), _load_idle_frames_sync, avatar_id
+        )
     except Exception as e:
         logger.error(f"Failed to load idle frames: {e}")
         return []
 
+    # 从 PNG 加载时，后台把待机帧编码为视频，之后的连接直接解码视频
+    if len(frames) and idle_clip and avatar_manager is not None and idle_clip not in _idle_clip_writes:
+        future = loop.run_in_executor(
+            _get_image_io_pool(), avatar_manager.save_idle_clip, frames, idle_clip, 25
+        )
+        _idle_clip_writes[idle_clip] = future
+        future.add_done_callback(lambda _: _idle_clip_writes.pop(idle_clip, None))
+
+    return frames
+
+
+def _load_idle_frames_sync(avatar_id: str) -> Tuple[Union[np.ndarray, list], Optional[str]]:
+    """
+    从磁盘读取待机帧（在 image-io 线程池中运行）
+
+    Args:
+        avatar_id: Avatar identifier
+
+    Returns:
+        (帧列表, 待生成的待机视频路径)；帧来自待机视频时路径为 None
+    """
+    # 获取 avatar 目录
+    avatar_dir = f"/workspace/gpuserver/data/avatars/{avatar_id}"
+
+    if not os.path.exists(avatar_dir):
+        logger.warning(f"Avatar directory not found: {avatar_dir}")
+        return [], None
+
+    # 解码时直接缩放到 WebRTC 目标分辨率，缓存的帧更小、推流时编码的像素更少
+    size = _idle_frame_size()
+
+    # 优先解码预编码的待机视频（比逐帧解码 PNG 快得多）；视频按目标分辨率从源 PNG 生成
+    idle_clip = _idle_clip_path(avatar_dir, size)
+    if os.path.exists(idle_clip):
+        frames = _read_idle_clip(idle_clip, _IDLE_FRAME_COUNT, size=size)
+        if frames:
+            logger.info(f"Loaded {len(frames)} idle frames for avatar {avatar_id} from {idle_clip}")
+            return _stack_frames(frames), None
+        logger.warning(f"Idle clip is empty or unreadable, falling back to PNG frames: {idle_clip}")
+
+    # 尝试从 full_imgs 子目录加载
+    full_imgs_dir = os.path.join(avatar_dir, "full_imgs")
+    if os.path.exists(full_imgs_dir):
+        search_dir = full_imgs_dir
+    else:
+        search_dir = avatar_dir
+
+    # 只加载前 125 帧（5秒 @ 25fps）
+    frame_files = sorted([f for f in os.listdir(search_dir) if f.endswith('.png')])
+    frame_paths = [os.path.join(search_dir, f) for f in frame_files[:_IDLE_FRAME_COUNT]]
+
+    # 并行解码；PNG 可能带 alpha 通道，IMREAD_COLOR 直接解码为 BGR
+    decode = functools.partial(_decode_png, size=size)
+    if settings.idle_frame_decode_processes:
+        # 进程池：不受 GIL 限制，用满所有核
+        decoded = _get_decode_pool().map(decode, frame_paths, chunksize=16)
+        frames = [frame for frame in decoded if frame is not None]
+    else:
+        # 线程池：imread 解码时释放 GIL
+        with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+            frames = [frame for frame in executor.map(decode, frame_paths) if frame is not None]
+
+    logger.info(f"Loaded {len(frames)} idle frames for avatar {avatar_id} from {search_dir}")
+    return _stack_frames(frames), idle_clip
+
 
 @app.get("/health")
 async def health_check():
@@ -95,12 +436,131 @@ async def health_check():
     }
 
 
+class WsMessage(BaseModel):
+    """客户端 WebSocket 消息（未声明的字段保留在 model_extra 中）"""
+    model_config = ConfigDict(extra="allow")
+
+    type: str  # 未知类型在分发时返回 "Unsupported message type"
+    content: str = ""
+    data: Union[bytes, str] = ""  # 音频：JSON 消息中为 base64 字符串，MessagePack 消息中为原始字节
+    avatar_id: Optional[str] = None
+    tutor_id: Optional[Union[int, str]] = None
+    session_id: Optional[Union[int, str]] = None
+    engine_session_id: Optional[str] = None
+    user_id: Optional[Union[int, str]] = None
+    kb_id: Optional[Union[str, List[str]]] = None
+    stream: bool = False
+    caps: Optional[Dict[str, bool]] = None
+    sdp: Optional[str] = None
+    candidate: Optional[Dict[str, Any]] = None
+
+
+# 预先构建的校验器：直接从 JSON 文本解析并校验（pydantic-core 实现），畸形消息在入口处被拒绝
+_WS_MESSAGE_ADAPTER = TypeAdapter(WsMessage)
+
+
+class TurnRequest(BaseModel):
+    """一轮语音对话请求"""
+    token: str
+    audio: str  # base64 编码的输入音频
+    kb_id: Optional[str] = None
+
+
+class TurnResponse(BaseModel):
+    """一轮语音对话响应"""
+    transcription: str
+    content: str
+    audio: str  # base64 编码的合成音频
+
+
+@app.post("/v1/turn", response_model=TurnResponse)
+async def turn(request: TurnRequest):
+    """
+    一轮完整语音对话（ASR → LLM → TTS）
+
+    只在入口做一次 base64 解码、在出口做一次 base64 编码，引擎内部全程使用原始字节。
+
+    Args:
+        request: 包含 engine_token、base64 音频和可选 kb_id 的请求（未指定 kb_id 时使用会话的知识库）
+
+    Returns:
+        TurnResponse: 转录文本、AI 回复和合成音频
+
+    Raises:
+        HTTPException: token 无效或音频数据格式错误
+    """
+    manager = get_session_manager()
+    session_id = manager.verify_token(request.token)
+    session = manager.get_session(session_id) if session_id else None
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token"
+        )
+
+    try:
+        audio_bytes = b64decode(request.audio)
+    except binascii.Error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid audio data"
+        )
+
+    set_session_context(tutor_id=session.tutor_id, session_id=session_id)
+    # 与 WebSocket 消息一样更新会话活动时间，并在请求未指定时使用会话绑定的知识库
+    manager.update_activity(session_id)
+    ai_engine = get_ai_engine(session.tutor_id)
+    transcription, content, audio_out = await ai_engine.turn(
+        audio_bytes,
+        kb_id=request.kb_id or session.kb_id,
+        session_id=session_id
+    )
+
+    return TurnResponse(
+        transcription=transcription,
+        content=content,
+        audio=binascii.b2a_base64(audio_out, newline=False).decode("ascii")
+    )
+
+
+@app.post("/v1/knowledge-bases/{kb_id}/invalidate")
+async def invalidate_knowledge_base(
+    kb_id: str,
+    x_admin_token: Optional[str] = Header(None, description="settings.admin_token")
+):
+    """
+    知识库文档变化后丢弃基于旧内容的缓存回复（由知识库的管理方在文档增删改后调用）
+
+    会清除所有 tutor 的缓存条目，因此需要 settings.admin_token，而不是会话 token。
+
+    Args:
+        kb_id: 知识库 ID
+        x_admin_token: 请求头 X-Admin-Token
+
+    Returns:
+        dict: 知识库 ID 和删除的缓存条目数
+
+    Raises:
+        HTTPException: 未配置 admin_token 或 X-Admin-Token 不匹配
+    """
+    if not settings.admin_token or not x_admin_token or not hmac.compare_digest(
+        x_admin_token.encode(), settings.admin_token.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid admin token"
+        )
+    return {"kb_id": kb_id, "invalidated": invalidate_kb_responses(kb_id)}
+
+
 @app.websocket("/ws/{connection_id}")
 @app.websocket("/ws/ws/{connection_id}")
 async def websocket_endpoint(
     websocket: WebSocket,
     connection_id: str,
-    token: Optional[str] = Query(None, description="engine_token or auth_token for authentication (optional)")
+    token: Optional[str] = Query(None, description="engine_token or auth_token for authentication (optional)"),
+    binary: bool = Query(False, description="use binary frames for audio/video payloads instead of base64 (optional)"),
+    msgpack: bool = Query(False, description="encode server messages as MessagePack binary frames (optional)")
 ):
     """
     WebSocket 实时对话接口
@@ -109,6 +569,8 @@ async def websocket_endpoint(
         websocket: WebSocket 连接对象
         connection_id: 连接标识符（可以是 session_id 或 user_{user_id}）
         token: engine_token（用于验证）
+        binary: 是否以二进制帧发送音视频数据（见 send_media_message）
+        msgpack: 是否以 MessagePack 二进制帧发送所有消息（音视频为原始字节，不做 base64）
 
     连接模式:
         1. 新模式（基于 user_id）: connection_id = "user_{user_id}"
@@ -131,7 +593,12 @@ async def websocket_endpoint(
                 "engine_session_id": "uuid-here",  # 有 session 模式可选
                 "user_id": 123,  # WebRTC 相关消息必需
                 "avatar_id": "avatar_tutor_13",  # 可选
-                "kb_id": "knowledge_base_id"  # 可选
+                "kb_id": "knowledge_base_id",  # 可选
+                "stream": true,  # 可选，text / audio 消息按句流式返回音视频
+                "caps": {"video": false}  # 可选，声明客户端能力（只需发送一次），video=false 时不生成视频，
+                                          # repeat_content=false 时 text 消息之后的 audio / video 消息不再重复携带回复文本
+                                          # ice_batch=true 时服务端的 ICE candidates 合并为一条 webrtc_ice_candidates 消息
+                                          # video_stream=true 时视频改为 video_stream_start + 若干二进制分块 + video_stream_end
             }
 
         说明：
@@ -146,8 +613,17 @@ async def websocket_endpoint(
                 "role": "assistant",
                 "timestamp": "2024-01-01T12:00:00"
             }
+            binary=true 时音视频不再以 base64 字段嵌入，而是在消息后以二进制帧单独发送
+            msgpack=true 时所有消息以 MessagePack 二进制帧发送，audio / video 字段为原始字节
+
+        客户端消息可以是 JSON 文本帧，也可以是 MessagePack 二进制帧（此时 data 可直接放原始音频字节），
+        两种格式在同一连接上都被接受。
     """
     manager = get_session_manager()
+    websocket.state.binary_frames = binary
+    websocket.state.msgpack = msgpack
+    # 客户端能力（由消息中的 "caps" 字段声明，如 {"video": false} 表示只听音频）
+    websocket.state.caps = {}
 
     # 判断连接模式
     is_user_based = connection_id.startswith("user_")
@@ -173,7 +649,7 @@ async def websocket_endpoint(
 
         # 接受连接（无论是否有 session）
         await websocket.accept()
-        active_connections[connection_id] = websocket
+        await active_connections.register(connection_id, websocket)
         logger.info(f"WebSocket connected (user-based): connection_id={connection_id}, user_id={user_id}, has_session={session is not None}")
 
     else:
@@ -197,7 +673,7 @@ async def websocket_endpoint(
 
         # 接受连接
         await websocket.accept()
-        active_connections[connection_id] = websocket
+        await active_connections.register(connection_id, websocket)
         logger.info(f"WebSocket connected (session-based): session_id={session_id}, tutor_id={session.tutor_id}")
 
     # 获取 AI 引擎（按 tutor_id 隔离）
@@ -233,13 +709,12 @@ async def websocket_endpoint(
             )
 
             if video_response:
-                await send_message(websocket, {
+                await send_media_message(websocket, {
                     "type": "video",
                     "content": "",  # 待机视频没有文本内容
-                    "video": video_response,
                     "role": "assistant",
-                    "timestamp": datetime.now().isoformat()
-                })
+                    "timestamp": now_iso()
+                }, video=video_response)
                 logger.info(f"Idle video sent automatically: video_size={len(video_response)} bytes")
             else:
                 logger.warning("Failed to get idle video, skipping auto-send")
@@ -251,21 +726,29 @@ async def websocket_endpoint(
             "type": "text",
             "content": f"欢迎！您已连接到虚拟导师 (Tutor ID: {session.tutor_id})",
             "role": "assistant",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         })
 
     try:
         # 消息处理循环
         while True:
-            # 接收客户端消息
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            # 接收客户端消息（JSON 文本帧由 pydantic-core 直接解析校验，MessagePack 二进制帧由 ormsgpack 解析）
+            try:
+                message = await receive_message(websocket)
+            except ValidationError as e:
+                logger.warning("Invalid message: %d validation errors", e.error_count())
+                await send_error(websocket, f"Invalid message format: {e.errors(include_url=False, include_input=False)}")
+                continue
+            except ormsgpack.MsgpackDecodeError as e:
+                logger.warning("Invalid MessagePack frame: %s", e)
+                await send_error(websocket, "Invalid message format: malformed MessagePack frame")
+                continue
 
             # 在 user-based 模式下，从消息中获取 engine_session_id（可选）
             if is_user_based:
                 # 无 session 模式：从消息中获取 tutor_id
                 if not session:
-                    tutor_id = message.get("tutor_id")
+                    tutor_id = message.tutor_id
                     if not tutor_id:
                         await send_error(websocket, "tutor_id is required in sessionless mode")
                         continue
@@ -290,7 +773,7 @@ async def websocket_endpoint(
                     await handle_message(websocket, None, message, ai_engine, is_user_based)
                 else:
                     # 有 session 模式
-                    engine_session_id = message.get("engine_session_id")
+                    engine_session_id = message.engine_session_id
 
                     # 如果没有提供 engine_session_id，使用默认的 session（连接时验证的那个）
                     if not engine_session_id:
@@ -298,7 +781,8 @@ async def websocket_endpoint(
                         logger.info(f"No engine_session_id provided, using default session: {engine_session_id}")
 
                     # 获取或创建 session 上下文
-                    if engine_session_id not in session_contexts:
+                    ctx = get_session_context(engine_session_id)
+                    if ctx is None:
                         # 验证 engine_session_id 是否有效
                         target_session = manager.get_session(engine_session_id)
                         if not target_session:
@@ -306,17 +790,17 @@ async def websocket_endpoint(
                             continue
 
                         # 创建 session 上下文
-                        session_contexts[engine_session_id] = {
-                            "session": target_session,
-                            "ai_engine": get_ai_engine(target_session.tutor_id)
-                        }
+                        ctx = put_session_context(
+                            engine_session_id,
+                            target_session,
+                            get_ai_engine(target_session.tutor_id)
+                        )
                         logger.info(f"Created session context for engine_session_id={engine_session_id}")
 
                     # 更新会话活动时间
                     manager.update_activity(engine_session_id)
 
                     # 处理消息（使用 engine_session_id 对应的 session）
-                    ctx = session_contexts[engine_session_id]
                     await handle_message(websocket, ctx["session"], message, ctx["ai_engine"], is_user_based)
 
             else:
@@ -327,20 +811,17 @@ async def websocket_endpoint(
 
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected: connection_id={connection_id}")
-    except json.JSONDecodeError as e:
-        logger.error(f"Invalid JSON: {e}")
-        await send_error(websocket, "Invalid message format")
     except Exception as e:
         logger.error(f"Error in WebSocket handler: {e}", exc_info=True)
         await send_error(websocket, f"Internal server error: {str(e)}")
     finally:
         # 清理连接
-        active_connections.pop(connection_id, None)
+        await active_connections.unregister(connection_id, websocket)
 
         # 在 user-based 模式下，清理该用户的所有 session 上下文
         if is_user_based:
             # 注意：这里不清理 session_contexts，因为用户可能会重新连接
-            # session_contexts 会在 session 过期时自动清理
+            # session_contexts 按 LRU / 空闲时间淘汰（见 put_session_context）
             logger.info(f"Connection cleaned up (user-based): connection_id={connection_id}")
         else:
             logger.info(f"Connection cleaned up (session-based): connection_id={connection_id}")
@@ -635,378 +1116,592 @@ async def stream_audio_video(
         await send_error(websocket, f"Processing failed: {str(e)}")
 
 
-async def handle_message(websocket: WebSocket, session, message: dict, ai_engine, is_user_based: bool = False):
+@dataclass(slots=True)
+class TurnState:
     """
-    处理客户端消息
+    一轮消息处理中各处理函数共用的状态
 
-    Args:
-        websocket: WebSocket 连接
-        session: 会话对象（可以为 None，在 sessionless 模式下）
-        message: 客户端消息
-        ai_engine: AI 引擎实例
-        is_user_based: 是否为 user-based 模式
+    Attributes:
+        timestamp: 本轮同步发出的消息共用的时间戳
+        video_enabled: 本轮是否生成口型视频
+        repeat_content: 音视频消息是否重复携带回复文本
     """
-    msg_type = message.get("type")
-    content = message.get("content", "")
+    timestamp: str
+    video_enabled: bool
+    repeat_content: bool
 
-    session_id = session.session_id if session else "sessionless"
-    logger.info(f"Received message: session_id={session_id}, type={msg_type}")
 
-    try:
-        if msg_type == "init":
-            # 处理初始化消息 - 返回待机视频（idle video）
-            avatar_id = message.get("avatar_id")  # 必需的 avatar_id
+async def _handle_init(websocket: WebSocket, session, message: WsMessage, ai_engine, turn: TurnState):
+    """处理 init 消息：返回待机视频（idle video）"""
+    avatar_id = message.avatar_id  # 必需的 avatar_id
 
-            if not avatar_id:
-                await send_error(websocket, "avatar_id is required for init message")
-                return
+    if not avatar_id:
+        await send_error(websocket, "avatar_id is required for init message")
+        return
 
-            logger.info(f"Processing init message: avatar_id={avatar_id}")
+    logger.info(f"Processing init message: avatar_id={avatar_id}")
 
-            # 获取待机视频（不生成 TTS，只返回循环的静态视频）
-            video_response = None
-            if settings.enable_avatar:
-                logger.info(f"Getting idle video for avatar_id={avatar_id}")
-                video_response = await ai_engine.get_idle_video(
-                    avatar_id=avatar_id,
-                    duration=5,  # 5秒循环视频
-                    fps=25
-                )
+    # 获取待机视频（不生成 TTS，只返回循环的静态视频）
+    video_response = None
+    if settings.enable_avatar:
+        logger.info(f"Getting idle video for avatar_id={avatar_id}")
+        video_response = await ai_engine.get_idle_video(
+            avatar_id=avatar_id,
+            duration=5,  # 5秒循环视频
+            fps=25
+        )
 
-            if video_response:
-                # 构建响应消息 - 只包含视频，不包含音频和文本
-                response_message = {
-                    "type": "video",
-                    "content": "",  # 待机视频没有文本内容
-                    "video": video_response,  # base64 编码的视频
-                    "role": "assistant",
-                    "timestamp": datetime.now().isoformat()
-                }
-                logger.info(f"Sending idle video: video_size={len(video_response)} bytes")
-            else:
-                # 如果无法获取待机视频，返回错误
-                await send_error(websocket, "Failed to get idle video")
-                return
+    if video_response:
+        # 构建响应消息 - 只包含视频，不包含音频和文本
+        response_message = {
+            "type": "video",
+            "content": "",  # 待机视频没有文本内容
+            "role": "assistant",
+            "timestamp": turn.timestamp
+        }
+        logger.info(f"Sending idle video: video_size={len(video_response)} bytes")
+    else:
+        # 如果无法获取待机视频，返回错误
+        await send_error(websocket, "Failed to get idle video")
+        return
 
-            # 发送响应
-            await send_message(websocket, response_message)
-            logger.info("Idle video sent successfully")
-            
-            # 后台预加载 MuseRealEngine（避免首次请求延迟）
-            def preload_engine():
-                try:
-                    logger.info(f"[Preload] Starting MuseRealEngine preload for {avatar_id}...")
-                    engine = get_muse_real_engine(avatar_id)
-                    logger.info(f"[Preload] MuseRealEngine ready for {avatar_id}")
-                except Exception as e:
-                    logger.warning(f"[Preload] Failed to preload MuseRealEngine: {e}")
-            
-            import threading
-            preload_thread = threading.Thread(target=preload_engine, daemon=True)
-            preload_thread.start()
-
-        elif msg_type == "text_webrtc":
-            # 处理文本消息 - WebRTC 实时流式传输模式（三阶段流式 Pipeline）
-            avatar_id = message.get("avatar_id")  # 必需的 avatar_id
-            user_id = message.get("user_id")  # 前端传入的 user_id
-            engine_session_id = message.get("engine_session_id")  # 用于路由的 session_id
-
-            if not avatar_id:
-                await send_error(websocket, "avatar_id is required for WebRTC streaming")
-                return
-
-            if not user_id:
-                await send_error(websocket, "user_id is required for WebRTC streaming")
-                return
-
-            # 获取 tutor_id、kb_id 和 session_id（从 session 或消息中）
-            tutor_id = session.tutor_id if session else message.get("tutor_id")
-            kb_id = session.kb_id if session else message.get("kb_id")
-            session_id_for_chat = message.get("session_id")  # 用于区分聊天历史
-
-            # 在 user-based 模式下，engine_session_id 应该已经在外层处理
-            # 这里记录日志以便调试
-            session_id_log = session.session_id if session else "sessionless"
-            logger.info(f"Processing text with WebRTC streaming: avatar_id={avatar_id}, user_id={user_id}, engine_session_id={engine_session_id}, session_id={session_id_log}")
-
-            # 记录开始时间
-            start_time = time.time()
-
-            # ====== 阶段1: LLM 流式生成 ======
-            full_text = ""
-            first_token_time = None
-
-            async for token in ai_engine.stream_text_response(
-                text=content, tutor_id=tutor_id, kb_id=kb_id, session_id=session_id_for_chat
-            ):
-                # 记录首 token 时间
-                if first_token_time is None:
-                    first_token_time = time.time()
-                    logger.info(f"⚡ First token: {first_token_time - start_time:.2f}s")
-
-                # 立即发送 token
-                await send_message(websocket, {
-                    "type": "text_stream",
-                    "token": token,
-                    "role": "assistant",
-                    "timestamp": datetime.now().isoformat()
-                })
-                
-                # 调试：记录发送
-                if first_token_time is not None and (time.time() - first_token_time) < 0.1:
-                    logger.info(f"📤 Sent first text_stream token: {token[:20]}...")
-
-                full_text += token
-
-            # 发送完成信号
-            await send_message(websocket, {
-                "type": "text_complete",
-                "content": full_text,
-                "role": "assistant",
-                "timestamp": datetime.now().isoformat()
-            })
-
-            text_complete_time = time.time()
-            logger.info(f"Text complete: {text_complete_time - start_time:.2f}s")
-
-            # 发送状态消息，告知前端音视频生成已启动
-            await send_message(websocket, {
-                "type": "processing_status",
-                "status": "generating_audio_video",
-                "message": "正在生成音视频...",
-                "timestamp": datetime.now().isoformat()
-            })
-
-            # ====== 阶段2+3: 音视频异步处理 ======
-            asyncio.create_task(
-                stream_audio_video(ai_engine, full_text, avatar_id, user_id, websocket)
-            )
+    # 发送响应
+    await send_media_message(websocket, response_message, video=video_response)
+    logger.info("Idle video sent successfully")
 
-            logger.info("WebRTC streaming response initiated (audio + video via WebRTC)")
+    # 后台预加载 MuseRealEngine（避免首次请求延迟）
+    def preload_engine():
+        try:
+            logger.info(f"[Preload] Starting MuseRealEngine preload for {avatar_id}...")
+            engine = get_muse_real_engine(avatar_id)
+            logger.info(f"[Preload] MuseRealEngine ready for {avatar_id}")
+        except Exception as e:
+            logger.warning(f"[Preload] Failed to preload MuseRealEngine: {e}")
 
-        elif msg_type == "text":
-            # 处理文本消息 - 流式响应模式（立即发送文本）
-            avatar_id = message.get("avatar_id")  # 可选的 avatar_id
-            user_id = message.get("user_id")  # 用户 ID (用于 WebRTC 音频)
+    import threading
+    preload_thread = threading.Thread(target=preload_engine, daemon=True)
+    preload_thread.start()
 
-            # 获取 tutor_id、kb_id 和 session_id（从 session 或消息中）
-            tutor_id = session.tutor_id if session else message.get("tutor_id")
-            kb_id = session.kb_id if session else message.get("kb_id")
-            session_id_for_chat = message.get("session_id")  # 用于区分聊天历史
 
-            # 1. LLM: 生成响应
-            response = await ai_engine.process_text(
-                text=content,
-                tutor_id=tutor_id,
-                kb_id=kb_id,
-                session_id=session_id_for_chat  # 传递 session_id 用于聊天历史
-            )
+async def _handle_text_webrtc(websocket: WebSocket, session, message: WsMessage, ai_engine, turn: TurnState):
+    """处理 text_webrtc 消息：LLM 流式输出文本，音视频经 WebRTC 推送"""
+    avatar_id = message.avatar_id  # 必需的 avatar_id
+    user_id = message.user_id  # 前端传入的 user_id
+    engine_session_id = message.engine_session_id  # 用于路由的 session_id
 
-            # 2. 立即发送文本响应
-            await send_message(websocket, {
-                "type": "text",
-                "content": response,
-                "role": "assistant",
-                "timestamp": datetime.now().isoformat()
-            })
-            logger.info("Text response sent immediately")
-
-            # 3. TTS: 文本转语音
-            audio_response = await ai_engine.synthesize_speech(response)
-
-            # 4. 发送音频 (通过 WebRTC 或 WebSocket,取决于是否有 user_id)
-            if user_id:
-                # 通过 WebRTC 发送音频（使用全局导入的 get_webrtc_streamer）
-                streamer = get_webrtc_streamer()
-                asyncio.create_task(streamer.stream_audio(f"user_{user_id}", audio_response))
-                logger.info(f"Audio sent via WebRTC for user {user_id}")
-            else:
-                # 回退到 WebSocket 发送音频 (向后兼容)
-                await send_message(websocket, {
-                    "type": "audio",
-                    "content": response,
-                    "audio": audio_response,  # base64 编码的音频
-                    "role": "assistant",
-                    "timestamp": datetime.now().isoformat()
-                })
-                logger.info("Audio response sent via WebSocket (no user_id provided)")
-
-            # 5. 可选：后台生成视频（不阻塞）
-            if settings.enable_avatar and avatar_id:
-                logger.info(f"Starting background video generation for avatar_id={avatar_id}")
-
-                # 在后台异步生成视频
-                async def generate_video_background():
-                    try:
-                        video_response = await ai_engine.generate_video(
-                            audio_data=audio_response,
-                            avatar_id=avatar_id,
-                            fps=25
-                        )
+    if not avatar_id:
+        await send_error(websocket, "avatar_id is required for WebRTC streaming")
+        return
 
-                        if video_response:
-                            # 视频生成完成后发送
-                            await send_message(websocket, {
-                                "type": "video",
-                                "content": response,
-                                "video": video_response,
-                                "role": "assistant",
-                                "timestamp": datetime.now().isoformat()
-                            })
-                            logger.info(f"Background video sent: video_size={len(video_response)} bytes")
-                    except Exception as e:
-                        logger.error(f"Background video generation failed: {e}")
-
-                # 启动后台任务（不等待）
-                asyncio.create_task(generate_video_background())
-
-        elif msg_type == "audio":
-            # 处理音频消息
-            audio_data = message.get("data", "")
-            avatar_id = message.get("avatar_id")  # 可选的 avatar_id
-
-            logger.info(f"Audio message received: avatar_id={avatar_id}, enable_avatar={settings.enable_avatar}")
-
-            # ASR: 音频转文本
-            transcription = await ai_engine.process_audio(audio_data)
-
-            # 发送转录结果
-            await send_message(websocket, {
-                "type": "transcription",
-                "content": transcription,
-                "role": "user",
-                "timestamp": datetime.now().isoformat()
-            })
-
-            # LLM: 生成响应
-            tutor_id = session.tutor_id if session else message.get("tutor_id")
-            kb_id = session.kb_id if session else message.get("kb_id")
-            session_id_for_chat = message.get("session_id")  # 用于区分聊天历史
-
-            response = await ai_engine.process_text(
-                text=transcription,
-                tutor_id=tutor_id,
-                kb_id=kb_id,
-                session_id=session_id_for_chat  # 传递 session_id 用于聊天历史
-            )
+    if not user_id:
+        await send_error(websocket, "user_id is required for WebRTC streaming")
+        return
+
+    # 获取 tutor_id、kb_id 和 session_id（从 session 或消息中）
+    tutor_id = session.tutor_id if session else message.tutor_id
+    kb_id = session.kb_id if session else message.kb_id
+    session_id_for_chat = message.session_id  # 用于区分聊天历史
+
+    # 在 user-based 模式下，engine_session_id 应该已经在外层处理
+    # 这里记录日志以便调试
+    logger.info("Processing text with WebRTC streaming: avatar_id=%s, user_id=%s, engine_session_id=%s", avatar_id, user_id, engine_session_id)
+
+    # 记录开始时间
+    start_time = time.time()
+
+    # ====== 阶段1: LLM 流式生成 ======
+    full_text = ""
+    first_token_time = None
+
+    async for token in ai_engine.stream_text_response(
+        text=message.content, tutor_id=tutor_id, kb_id=kb_id, session_id=session_id_for_chat
+    ):
+        # 记录首 token 时间
+        if first_token_time is None:
+            first_token_time = time.time()
+            logger.info(f"⚡ First token: {first_token_time - start_time:.2f}s")
+
+        # 立即发送 token
+        await send_message(websocket, TextStreamToken(token, turn.timestamp))
+
+        # 调试：记录发送
+        if first_token_time is not None and (time.time() - first_token_time) < 0.1:
+            logger.info(f"📤 Sent first text_stream token: {token[:20]}...")
+
+        full_text += token
+
+    # 发送完成信号
+    await send_message(websocket, AssistantMessage("text_complete", full_text, turn.timestamp))
+
+    text_complete_time = time.time()
+    logger.info(f"Text complete: {text_complete_time - start_time:.2f}s")
+
+    # 发送状态消息，告知前端音视频生成已启动
+    await send_message(websocket, {
+        "type": "processing_status",
+        "status": "generating_audio_video",
+        "message": "正在生成音视频...",
+        "timestamp": turn.timestamp
+    })
+
+    # ====== 阶段2+3: 音视频异步处理 ======
+    asyncio.create_task(
+        stream_audio_video(ai_engine, full_text, avatar_id, user_id, websocket)
+    )
+
+    logger.info("WebRTC streaming response initiated (audio + video via WebRTC)")
 
-            # TTS: 文本转语音
-            audio_response = await ai_engine.synthesize_speech(response)
 
-            # 如果启用了 Avatar 且提供了 avatar_id，生成视频
-            video_response = None
-            if settings.enable_avatar and avatar_id:
-                logger.info(f"Generating video for avatar_id={avatar_id}")
+async def _handle_text(websocket: WebSocket, session, message: WsMessage, ai_engine, turn: TurnState):
+    """处理 text 消息：先发送文本，再发送音频（视频在后台生成）"""
+    avatar_id = message.avatar_id  # 可选的 avatar_id
+    user_id = message.user_id  # 用户 ID (用于 WebRTC 音频)
+
+    # 获取 tutor_id、kb_id 和 session_id（从 session 或消息中）
+    tutor_id = session.tutor_id if session else message.tutor_id
+    kb_id = session.kb_id if session else message.kb_id
+    session_id_for_chat = message.session_id  # 用于区分聊天历史
+
+    # 1. LLM: 生成响应
+    response = await ai_engine.process_text(
+        text=message.content,
+        tutor_id=tutor_id,
+        kb_id=kb_id,
+        session_id=session_id_for_chat  # 传递 session_id 用于聊天历史
+    )
+
+    # 客户端请求按句流式返回音视频（不经 WebRTC）时，TTS 与视频生成按句流水线进行
+    pipelined = message.stream and not user_id
+
+    # 2. TTS 立即在后台启动，与发送文本并行
+    tts_task = None if pipelined else asyncio.create_task(ai_engine.synthesize_speech(response))
+
+    # 3. 立即发送文本响应
+    await send_message(websocket, AssistantMessage("text", response, turn.timestamp))
+    logger.info("Text response sent immediately")
+
+    if pipelined:
+        await send_sentence_media(
+            websocket, ai_engine, response,
+            avatar_id if turn.video_enabled else None
+        )
+        return
+
+    # 4. 可选：后台生成视频（不阻塞）；先于音频发送启动，TTS 一完成就开始生成，与音频发送重叠
+    if turn.video_enabled and avatar_id:
+        logger.info(f"Starting background video generation for avatar_id={avatar_id}")
+
+        # 在后台异步生成视频（等待同一个 TTS 任务的结果）
+        async def generate_video_background():
+            try:
                 video_response = await ai_engine.generate_video(
-                    audio_data=audio_response,
+                    audio_data=await tts_task,
                     avatar_id=avatar_id,
-                    fps=25
+                    fps=25,
+                    on_queued=lambda: send_video_queued(websocket)
                 )
 
-            # 构建响应消息
-            response_message = {
-                "type": "video" if video_response else "audio",
-                "content": response,
-                "audio": audio_response,  # base64 编码的音频
-                "role": "assistant",
-                "timestamp": datetime.now().isoformat()
-            }
+                if video_response:
+                    # 视频生成完成后发送
+                    await send_media_message(websocket, {
+                        "type": "video",
+                        "content": response if turn.repeat_content else "",
+                        "role": "assistant",
+                        "timestamp": now_iso()
+                    }, video=video_response)
+                    logger.info(f"Background video sent: video_size={len(video_response)} bytes")
+            except Exception as e:
+                logger.error(f"Background video generation failed: {e}")
+
+        # 启动后台任务（不等待）
+        asyncio.create_task(generate_video_background())
+
+    # 5. 等待 TTS 结果
+    audio_response = await tts_task
+
+    # 6. 发送音频 (通过 WebRTC 或 WebSocket,取决于是否有 user_id)
+    if user_id:
+        # 通过 WebRTC 发送音频（使用全局导入的 get_webrtc_streamer）
+        streamer = get_webrtc_streamer()
+        asyncio.create_task(streamer.stream_audio(f"user_{user_id}", audio_response))
+        logger.info(f"Audio sent via WebRTC for user {user_id}")
+    else:
+        # 回退到 WebSocket 发送音频 (向后兼容)
+        await send_media_message(websocket, {
+            "type": "audio",
+            "content": response if turn.repeat_content else "",
+            "role": "assistant",
+            "timestamp": turn.timestamp
+        }, audio=audio_response)
+        logger.info("Audio response sent via WebSocket (no user_id provided)")
 
-            # 如果有视频，添加视频数据
-            if video_response:
-                response_message["video"] = video_response  # base64 编码的视频
 
-            # 发送响应
-            await send_message(websocket, response_message)
+async def _handle_audio(websocket: WebSocket, session, message: WsMessage, ai_engine, turn: TurnState):
+    """处理 audio 消息：ASR → LLM → TTS（→ 视频）"""
+    audio_data = message.data
+    avatar_id = message.avatar_id  # 可选的 avatar_id
 
-        elif msg_type == "webrtc_offer":
-            # 处理 WebRTC offer
-            offer_sdp = message.get("sdp")
-            user_id = message.get("user_id")  # 前端传入的 user_id
-            avatar_id = message.get("avatar_id", "avatar_tutor_13")  # 可选的 avatar_id
+    logger.info(f"Audio message received: avatar_id={avatar_id}, enable_avatar={settings.enable_avatar}")
 
-            if not offer_sdp:
-                await send_error(websocket, "SDP offer is required")
-                return
+    # ASR: 音频转文本（在入口处一次性解码 base64，内部传递原始字节；MessagePack 消息已是原始字节）
+    if isinstance(audio_data, str):
+        audio_data = b64decode(audio_data)
+    transcription = await ai_engine.process_audio(audio_data)
 
-            if not user_id:
-                await send_error(websocket, "user_id is required for WebRTC")
-                return
+    # 发送转录结果
+    await send_message(websocket, {
+        "type": "transcription",
+        "content": transcription,
+        "role": "user",
+        "timestamp": turn.timestamp
+    })
 
-            session_id_log = session.session_id if session else "sessionless"
-            logger.info(f"Received WebRTC offer from session {session_id_log}, user_id={user_id}")
+    # LLM: 生成响应
+    tutor_id = session.tutor_id if session else message.tutor_id
+    kb_id = session.kb_id if session else message.kb_id
+    session_id_for_chat = message.session_id  # 用于区分聊天历史
 
-            # 获取 WebRTC streamer
-            webrtc_streamer = get_webrtc_streamer()
+    response = await ai_engine.process_text(
+        text=transcription,
+        tutor_id=tutor_id,
+        kb_id=kb_id,
+        session_id=session_id_for_chat  # 传递 session_id 用于聊天历史
+    )
 
-            # 加载待机视频帧
-            idle_frames = await load_idle_frames(avatar_id)
+    # 客户端请求按句流式返回时，TTS 与视频生成按句流水线进行
+    if message.stream:
+        await send_sentence_media(
+            websocket, ai_engine, response,
+            avatar_id if turn.video_enabled else None
+        )
+        return
+
+    # TTS: 文本转语音
+    audio_response = await ai_engine.synthesize_speech(response)
+
+    # 如果启用了 Avatar 且提供了 avatar_id，生成视频
+    video_response = None
+    if turn.video_enabled and avatar_id:
+        logger.info(f"Generating video for avatar_id={avatar_id}")
+        video_response = await ai_engine.generate_video(
+            audio_data=audio_response,
+            avatar_id=avatar_id,
+            fps=25,
+            on_queued=lambda: send_video_queued(websocket)
+        )
 
-            # 处理 offer 并生成 answer（使用 user_id，同一用户共享）
-            # 传递 websocket 以便发送 ICE candidates
-            answer_sdp = await webrtc_streamer.handle_offer(
-                session_id=f"user_{user_id}",  # 使用 user_id 作为标识
-                offer_sdp=offer_sdp,
-                idle_frames=idle_frames,  # 传入待机帧
-                websocket=websocket  # 传入 WebSocket 连接
-            )
+    # 构建响应消息
+    response_message = {
+        "type": "video" if video_response else "audio",
+        "content": response,
+        "role": "assistant",
+        "timestamp": turn.timestamp
+    }
 
-            # 发送 answer 回客户端
-            await send_message(websocket, {
-                "type": "webrtc_answer",
-                "sdp": answer_sdp,
-                "timestamp": datetime.now().isoformat()
-            })
+    # 发送响应（音频和可选的视频）
+    await send_media_message(websocket, response_message, audio=audio_response, video=video_response)
 
-            logger.info(f"WebRTC answer sent to user {user_id} with idle frames")
 
-        elif msg_type == "webrtc_ice_candidate":
-            # 处理 ICE candidate
-            candidate = message.get("candidate")
-            user_id = message.get("user_id")  # 前端传入的 user_id
+async def _handle_webrtc_offer(websocket: WebSocket, session, message: WsMessage, ai_engine, turn: TurnState):
+    """处理 WebRTC offer：加载待机帧并返回 answer"""
+    offer_sdp = message.sdp
+    user_id = message.user_id  # 前端传入的 user_id
+    avatar_id = (message.avatar_id or "avatar_tutor_13")  # 可选的 avatar_id
 
-            if not candidate:
-                await send_error(websocket, "ICE candidate is required")
-                return
+    if not offer_sdp:
+        await send_error(websocket, "SDP offer is required")
+        return
 
-            if not user_id:
-                await send_error(websocket, "user_id is required for WebRTC")
-                return
+    if not user_id:
+        await send_error(websocket, "user_id is required for WebRTC")
+        return
 
-            session_id_log = session.session_id if session else "sessionless"
-            logger.info(f"Received ICE candidate from session {session_id_log}, user_id={user_id}")
+    session_id_log = session.session_id if session else "sessionless"
+    logger.info(f"Received WebRTC offer from session {session_id_log}, user_id={user_id}")
 
-            # 获取 WebRTC streamer
-            webrtc_streamer = get_webrtc_streamer()
+    # 获取 WebRTC streamer
+    webrtc_streamer = get_webrtc_streamer()
 
-            # 添加 ICE candidate（使用 user_id）
-            await webrtc_streamer.add_ice_candidate(
-                session_id=f"user_{user_id}",  # 使用 user_id 作为标识
-                candidate=candidate
-            )
+    # 加载待机视频帧
+    idle_frames = await load_idle_frames(avatar_id, ai_engine.avatar_manager)
 
-        else:
+    # 处理 offer 并生成 answer（使用 user_id，同一用户共享）
+    # 传递 websocket 以便发送 ICE candidates
+    answer_sdp = await webrtc_streamer.handle_offer(
+        session_id=f"user_{user_id}",  # 使用 user_id 作为标识
+        offer_sdp=offer_sdp,
+        idle_frames=idle_frames,  # 传入待机帧
+        websocket=websocket  # 传入 WebSocket 连接
+    )
+
+    # 发送 answer 回客户端
+    await send_message(websocket, {
+        "type": "webrtc_answer",
+        "sdp": answer_sdp,
+        "timestamp": turn.timestamp
+    })
+
+    logger.info(f"WebRTC answer sent to user {user_id} with idle frames")
+
+
+async def _handle_webrtc_ice_candidate(websocket: WebSocket, session, message: WsMessage, ai_engine, turn: TurnState):
+    """处理客户端的 ICE candidate"""
+    candidate = message.candidate
+    user_id = message.user_id  # 前端传入的 user_id
+
+    if not candidate:
+        await send_error(websocket, "ICE candidate is required")
+        return
+
+    if not user_id:
+        await send_error(websocket, "user_id is required for WebRTC")
+        return
+
+    session_id_log = session.session_id if session else "sessionless"
+    logger.info(f"Received ICE candidate from session {session_id_log}, user_id={user_id}")
+
+    # 获取 WebRTC streamer
+    webrtc_streamer = get_webrtc_streamer()
+
+    # 添加 ICE candidate（使用 user_id）
+    await webrtc_streamer.add_ice_candidate(
+        session_id=f"user_{user_id}",  # 使用 user_id 作为标识
+        candidate=candidate
+    )
+
+
+# 消息类型 → 处理函数（每条消息一次字典查找，代替逐个比较的 if/elif 链）
+_MESSAGE_HANDLERS = {
+    "init": _handle_init,
+    "text_webrtc": _handle_text_webrtc,
+    "text": _handle_text,
+    "audio": _handle_audio,
+    "webrtc_offer": _handle_webrtc_offer,
+    "webrtc_ice_candidate": _handle_webrtc_ice_candidate,
+}
+
+
+async def handle_message(websocket: WebSocket, session, message: WsMessage, ai_engine, is_user_based: bool = False):
+    """
+    处理客户端消息
+
+    Args:
+        websocket: WebSocket 连接
+        session: 会话对象（可以为 None，在 sessionless 模式下）
+        message: 客户端消息
+        ai_engine: AI 引擎实例
+        is_user_based: 是否为 user-based 模式
+    """
+    msg_type = message.type
+
+    session_id = session.session_id if session else "sessionless"
+
+    # 客户端声明的能力只需发送一次，之后的消息沿用
+    caps = message.caps
+    if caps:
+        websocket.state.caps.update(caps)
+    turn = TurnState(
+        # 本轮所有同步发出的消息共用一个时间戳（后台任务发送的消息另取当前时间）
+        timestamp=now_iso(),
+        # 只听音频的客户端不生成口型视频（每轮省去一次完整的 GPU 推理）
+        video_enabled=settings.enable_avatar and websocket.state.caps.get("video", True),
+        # 文本已单独发送过时，后续音视频消息是否重复携带回复文本（客户端可声明 repeat_content=false 省去重复的文本）
+        repeat_content=websocket.state.caps.get("repeat_content", True),
+    )
+
+    set_session_context(
+        tutor_id=session.tutor_id if session else message.tutor_id,
+        session_id=session_id
+    )
+    logger.info("Received message: type=%s", msg_type)
+
+    try:
+        handler = _MESSAGE_HANDLERS.get(msg_type)
+        if handler is None:
             await send_error(websocket, f"Unsupported message type: {msg_type}")
+            return
+        await handler(websocket, session, message, ai_engine, turn)
 
     except Exception as e:
         logger.error(f"Error processing message: {e}", exc_info=True)
         await send_error(websocket, f"Failed to process message: {str(e)}")
 
 
-async def send_message(websocket: WebSocket, message: dict):
-    """发送消息给客户端"""
+async def receive_message(websocket: WebSocket) -> WsMessage:
+    """
+    接收并校验一条客户端消息
+
+    文本帧按 JSON 解析，二进制帧按 MessagePack 解析。
+
+    Returns:
+        WsMessage: 校验后的消息
+
+    Raises:
+        WebSocketDisconnect: 连接已断开
+        ValidationError: 消息字段不合法
+        ormsgpack.MsgpackDecodeError: 二进制帧不是合法的 MessagePack
+    """
+    frame = await websocket.receive()
+    if frame["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(frame.get("code", 1000))
+    if frame.get("text") is not None:
+        return _WS_MESSAGE_ADAPTER.validate_json(frame["text"])
+    return _WS_MESSAGE_ADAPTER.validate_python(ormsgpack.unpackb(frame["bytes"]))
+
+
+async def send_message(websocket: WebSocket, message: Union[dict, AssistantMessage, TextStreamToken]):
+    """
+    发送消息给客户端
+
+    使用 orjson 序列化（消息中常带有数 MB 的 base64 音视频字符串，比标准库 json 快数倍），
+    仍以文本帧发送，客户端协议不变。message 可以是 dict 或消息 dataclass。
+    连接时带 msgpack=true 的客户端改为收到 MessagePack 二进制帧。
+    """
     try:
-        await websocket.send_json(message)
+        await send_ws_message(websocket, message)
     except Exception as e:
         logger.error(f"Failed to send message: {e}")
 
 
+async def send_media_message(
+    websocket: WebSocket,
+    message: dict,
+    audio: Optional[bytes] = None,
+    video: Optional[bytes] = None
+):
+    """
+    发送带音视频数据的消息
+
+    音视频在服务端内部全程是原始字节，只在这里按连接的协议编码一次。
+    默认把音视频以 base64 字段（audio / video）嵌入 JSON，兼容现有客户端。
+    连接时带 binary=true 的客户端先收到 JSON 头（has_audio / has_video 标记），
+    随后按音频、视频的顺序收到对应的二进制帧，省去 base64 带来的 33% 体积膨胀和客户端解码。
+    声明了 caps.video_stream 的 JSON 客户端，只含视频的消息改为分块发送（见 send_video_stream）。
+
+    Args:
+        websocket: WebSocket 连接
+        message: 消息头（不含音视频数据）
+        audio: 原始音频字节（可选）
+        video: MP4 视频字节（可选）
+    """
+    if getattr(websocket.state, "msgpack", False):
+        # MessagePack 的 bin 类型直接承载原始字节，不需要 base64
+        if audio is not None:
+            message["audio"] = bytes(audio)
+        if video is not None:
+            message["video"] = bytes(video)
+        await send_message(websocket, message)
+        return
+
+    if video is not None and audio is None and websocket.state.caps.get("video_stream", False):
+        await send_video_stream(websocket, message, video)
+        return
+
+    if not getattr(websocket.state, "binary_frames", False):
+        if audio is not None:
+            message["audio"] = binascii.b2a_base64(audio, newline=False).decode("ascii")
+        if video is not None:
+            message["video"] = binascii.b2a_base64(video, newline=False).decode("ascii")
+        await send_message(websocket, message)
+        return
+
+    message["has_audio"] = audio is not None
+    message["has_video"] = video is not None
+    try:
+        await websocket.send_text(orjson.dumps(message).decode("utf-8"))
+        if audio is not None:
+            await websocket.send_bytes(bytes(audio))
+        if video is not None:
+            await websocket.send_bytes(bytes(video))
+    except Exception as e:
+        logger.error(f"Failed to send media message: {e}")
+
+
+async def send_video_stream(websocket: WebSocket, message: dict, video: bytes):
+    """
+    分块发送视频
+
+    先发送 video_stream_start 消息头（原消息字段加上 codec / size / chunks），
+    随后是若干个不超过 websocket_video_chunk_size 字节的二进制帧，最后是 video_stream_end。
+    避免单个数百 KB 的 WebSocket 帧（及其 base64 编码）阻塞连接，客户端可以边收边缓冲。
+
+    Args:
+        websocket: WebSocket 连接
+        message: 消息头（不含视频数据）
+        video: MP4 视频字节
+    """
+    chunk_size = settings.websocket_video_chunk_size
+    view = memoryview(video)
+    chunks = (len(view) + chunk_size - 1) // chunk_size
+
+    message["type"] = "video_stream_start"
+    message["codec"] = "h264"
+    message["container"] = "mp4"
+    message["size"] = len(view)
+    message["chunks"] = chunks
+    try:
+        await websocket.send_text(orjson.dumps(message).decode("utf-8"))
+        for offset in range(0, len(view), chunk_size):
+            await websocket.send_bytes(bytes(view[offset:offset + chunk_size]))
+        await websocket.send_text(orjson.dumps({
+            "type": "video_stream_end",
+            "chunks": chunks,
+            "timestamp": now_iso()
+        }).decode("utf-8"))
+    except Exception as e:
+        logger.error(f"Failed to send video stream: {e}")
+
+
+async def send_sentence_media(websocket: WebSocket, ai_engine, response: str, avatar_id: Optional[str]):
+    """
+    按句发送音视频（消息中带 "stream": true 时使用）
+
+    每句合成完成后立即发送一条 audio / video 消息（content 为该句文本，带 sentence_index），
+    全部发送完后再发送一条 stream_end 消息。后续句子的 TTS 与当前句的视频生成并行进行。
+
+    Args:
+        websocket: WebSocket 连接
+        ai_engine: AI 引擎实例
+        response: 完整的回复文本
+        avatar_id: Avatar ID（为 None 时只发送音频）
+    """
+    sentence_index = 0
+    async for sentence, audio_data, video_data in ai_engine.synthesize_sentences(response, avatar_id=avatar_id):
+        await send_media_message(websocket, {
+            "type": "video" if video_data else "audio",
+            "content": sentence,
+            "sentence_index": sentence_index,
+            "role": "assistant",
+            "timestamp": now_iso()
+        }, audio=audio_data, video=video_data)
+        sentence_index += 1
+
+    await send_message(websocket, {
+        "type": "stream_end",
+        "content": response,
+        "sentences": sentence_index,
+        "role": "assistant",
+        "timestamp": now_iso()
+    })
+    logger.info("Sentence-pipelined media sent: sentences=%d", sentence_index)
+
+
+async def send_video_queued(websocket: WebSocket):
+    """通知客户端视频生成正在排队（客户端可显示等待状态）"""
+    await send_message(websocket, {
+        "type": "status",
+        "content": "video_queued",
+        "queued": True,
+        "timestamp": now_iso()
+    })
+
+
 async def send_error(websocket: WebSocket, error: str):
     """发送错误消息"""
     await send_message(websocket, {
         "type": "error",
         "content": error,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now_iso()
     })
 
 
@@ -1017,17 +1712,30 @@ def main():
     logger.info("Starting GPU Server...")
     logger.info("=" * 50)
     
-    try:
-        load_global_model()
-        logger.info("✅ Global model ready")
-    except Exception as e:
-        logger.error(f"❌ Failed to load global model: {e}")
-        # 继续启动，让后续请求时再加载
-    
+    workers = settings.websocket_workers
+
+    # 多 worker 时每个 worker 进程各自加载模型，主进程不预加载（避免多占一份显存）
+    if workers == 1:
+        try:
+            load_global_model()
+            logger.info("✅ Global model ready")
+        except Exception as e:
+            logger.error(f"❌ Failed to load global model: {e}")
+            # 继续启动，让后续请求时再加载
+
+    # uvloop + httptools 事件循环和 HTTP 解析（uvicorn[standard] 提供）
+    # 多 worker 时 uvicorn 需要以导入字符串的形式传入 app
     uvicorn.run(
-        app,
+        app if workers == 1 else "api.websocket_server:app",
         host=settings.websocket_host,
         port=settings.websocket_port,
+        loop="uvloop",
+        http="httptools",
+        ws="websockets",
+        ws_ping_interval=settings.websocket_ping_interval,
+        ws_ping_timeout=settings.websocket_ping_timeout,
+        ws_per_message_deflate=settings.websocket_per_message_deflate,
+        workers=workers,
         log_level="info"
     )
 
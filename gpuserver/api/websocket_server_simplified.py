@@ -4,15 +4,17 @@
 保留完整的 token 验证和 WebSocket 连接逻辑
 """
 import asyncio
-import json
+import importlib
 import logging
-from typing import Optional, Dict
-from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Query, status
 from fastapi.responses import JSONResponse
+import orjson
 import uvicorn
 
+from ws_codec import now_iso
+
 # 尝试导入，如果失败则使用简化版本
 try:
     from config import settings
@@ -21,6 +23,7 @@ except ImportError:
     class Settings:
         websocket_host = "0.0.0.0"
         websocket_port = 19001
+        websocket_workers = 1
         enable_avatar = False
     settings = Settings()
 
@@ -28,9 +31,17 @@ try:
     from session_manager import get_session_manager
 except ImportError:
     # 简化的 session manager
+    class SimpleSession:
+        """简化的 session 对象"""
+
+        def __init__(self, session_id: str):
+            self.session_id = session_id
+            self.tutor_id = 13
+            self.kb_id = None
+
     class SimpleSessionManager:
         def __init__(self):
-            self.sessions = {}
+            self.sessions: Dict[str, SimpleSession] = {}
             self.tokens = {}
 
         def verify_token(self, token: str) -> Optional[str]:
@@ -42,14 +53,11 @@ except ImportError:
             return None
 
         def get_session(self, session_id: str):
-            """获取 session 信息"""
-            # 返回一个简化的 session 对象
-            class SimpleSession:
-                def __init__(self):
-                    self.session_id = session_id
-                    self.tutor_id = 13
-                    self.kb_id = None
-            return SimpleSession()
+            """获取 session 信息（同一 session_id 复用同一个对象，握手和每条消息不再重复创建）"""
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = self.sessions[session_id] = SimpleSession(session_id)
+            return session
 
         def update_activity(self, session_id: str):
             """更新活动时间"""
@@ -97,7 +105,8 @@ async def health_check():
 async def websocket_endpoint(
     websocket: WebSocket,
     connection_id: str,
-    token: str = Query(..., description="engine_token for authentication")
+    token: str = Query(..., description="engine_token for authentication"),
+    binary_json: bool = Query(False, description="send JSON messages as binary frames (optional)")
 ):
     """
     WebSocket 实时对话接口
@@ -105,8 +114,12 @@ async def websocket_endpoint(
     支持两种连接模式:
         1. User-based: connection_id = "user_{user_id}"
         2. Session-based: connection_id = "{session_id}"
+
+    连接时带 binary_json=true 的客户端以二进制帧收到 UTF-8 JSON（内容与文本帧相同），
+    服务端省去把 orjson 输出解码为 str 的一步。
     """
     manager = get_session_manager()
+    websocket.state.binary_json = binary_json
 
     # 判断连接模式
     is_user_based = connection_id.startswith("user_")
@@ -165,58 +178,55 @@ async def websocket_endpoint(
         "connection_id": connection_id,
         "mode": "user-based" if is_user_based else "session-based",
         "message": f"Connected to GPU Server (Simplified)",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now_iso()
     })
 
+    # 循环中每条消息都会用到的方法先取到局部变量
+    update_activity = manager.update_activity
+
     try:
         # 消息处理循环
         while True:
             # 接收客户端消息
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            message = await receive_message(websocket)
 
             # 在 user-based 模式下，从消息中获取 engine_session_id
             if is_user_based:
                 engine_session_id = message.get("engine_session_id")
-                if not engine_session_id and message.get("type") not in ["webrtc_offer", "webrtc_ice_candidate"]:
-                    await send_error(websocket, "engine_session_id is required in user-based mode")
+                if not engine_session_id:
+                    # WebRTC 信令消息不需要 engine_session_id，使用连接时的 session
+                    if message.get("type") in ("webrtc_offer", "webrtc_ice_candidate"):
+                        await handle_message(websocket, session, message, is_user_based)
+                    else:
+                        await send_error(websocket, "engine_session_id is required in user-based mode")
                     continue
 
-                # 获取或创建 session 上下文
-                if engine_session_id and engine_session_id not in session_contexts:
+                # 获取或创建 session 上下文（只查找一次）
+                ctx = session_contexts.get(engine_session_id)
+                if ctx is None:
                     target_session = manager.get_session(engine_session_id)
                     if not target_session:
                         await send_error(websocket, f"Invalid engine_session_id: {engine_session_id}")
                         continue
 
-                    session_contexts[engine_session_id] = {
+                    ctx = session_contexts[engine_session_id] = {
                         "session": target_session,
-                        "created_at": datetime.now().isoformat()
+                        "created_at": now_iso()
                     }
                     logger.info(f"Created session context for engine_session_id={engine_session_id}")
 
-                # 更新会话活动时间
-                if engine_session_id:
-                    manager.update_activity(engine_session_id)
-
-                # 处理消息
-                if engine_session_id and engine_session_id in session_contexts:
-                    ctx = session_contexts[engine_session_id]
-                    await handle_message(websocket, ctx["session"], message, is_user_based)
-                elif message.get("type") in ["webrtc_offer", "webrtc_ice_candidate"]:
-                    await handle_message(websocket, session, message, is_user_based)
-                else:
-                    await send_error(websocket, f"Session context not found: {engine_session_id}")
+                # 更新会话活动时间并处理消息
+                update_activity(engine_session_id)
+                await handle_message(websocket, ctx["session"], message, is_user_based)
 
             else:
                 # 旧模式：使用 connection_id 作为 session_id
-                session_id = connection_id
-                manager.update_activity(session_id)
+                update_activity(connection_id)
                 await handle_message(websocket, session, message, is_user_based)
 
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected: connection_id={connection_id}")
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         logger.error(f"Invalid JSON: {e}")
         await send_error(websocket, "Invalid message format")
     except Exception as e:
@@ -228,91 +238,127 @@ async def websocket_endpoint(
         logger.info(f"Connection cleaned up: connection_id={connection_id}")
 
 
-async def handle_message(websocket: WebSocket, session, message: dict, is_user_based: bool = False):
-    """处理客户端消息"""
-    msg_type = message.get("type")
-    content = message.get("content", "")
+async def receive_message(websocket: WebSocket) -> dict:
+    """
+    接收一条客户端 JSON 消息
 
-    logger.info(f"📨 Received message: session_id={session.session_id}, type={msg_type}")
+    文本帧和二进制帧都按 JSON 解析（内容必须是 UTF-8）；二进制帧的字节直接交给 orjson，
+    不经过 receive_text() 的 UTF-8 解码。
 
-    try:
-        if msg_type == "text_webrtc":
-            # 处理文本消息 - WebRTC 模式
-            avatar_id = message.get("avatar_id")
-            user_id = message.get("user_id")
-            engine_session_id = message.get("engine_session_id")
+    Returns:
+        dict: 解析后的消息
+
+    Raises:
+        WebSocketDisconnect: 连接已断开
+        orjson.JSONDecodeError: 消息不是合法的 JSON
+    """
+    frame = await websocket.receive()
+    if frame["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(frame.get("code", 1000))
+    data = frame.get("bytes")
+    return orjson.loads(data if data is not None else frame["text"])
 
-            if not avatar_id:
-                await send_error(websocket, "avatar_id is required for WebRTC streaming")
-                return
 
-            if not user_id:
-                await send_error(websocket, "user_id is required for WebRTC streaming")
-                return
+async def _handle_text_webrtc(websocket: WebSocket, session, message: dict):
+    """处理文本消息 - WebRTC 模式"""
+    avatar_id = message.get("avatar_id")
+    user_id = message.get("user_id")
+    engine_session_id = message.get("engine_session_id")
 
-            logger.info(f"Processing text_webrtc: avatar_id={avatar_id}, user_id={user_id}, engine_session_id={engine_session_id}")
+    if not avatar_id:
+        await send_error(websocket, "avatar_id is required for WebRTC streaming")
+        return
 
-            # 简化版：直接返回模拟响应
-            response_text = f"[简化版] 收到消息: {content}"
+    if not user_id:
+        await send_error(websocket, "user_id is required for WebRTC streaming")
+        return
 
-            await send_message(websocket, {
-                "type": "text",
-                "content": response_text,
-                "audio": None,  # 简化版不生成音频
-                "role": "assistant",
-                "timestamp": datetime.now().isoformat()
-            })
+    logger.info(f"Processing text_webrtc: avatar_id={avatar_id}, user_id={user_id}, engine_session_id={engine_session_id}")
 
-            logger.info("✅ Response sent")
+    # 简化版：直接返回模拟响应
+    response_text = f"[简化版] 收到消息: {message.get('content', '')}"
+
+    await send_message(websocket, {
+        "type": "text",
+        "content": response_text,
+        "audio": None,  # 简化版不生成音频
+        "role": "assistant",
+        "timestamp": now_iso()
+    })
 
-        elif msg_type == "text":
-            # 处理普通文本消息
-            logger.info(f"Processing text: {content}")
+    logger.info("✅ Response sent")
 
-            response_text = f"[简化版] 收到消息: {content}"
 
-            await send_message(websocket, {
-                "type": "text",
-                "content": response_text,
-                "role": "assistant",
-                "timestamp": datetime.now().isoformat()
-            })
+async def _handle_text(websocket: WebSocket, session, message: dict):
+    """处理普通文本消息"""
+    content = message.get("content", "")
+    logger.info(f"Processing text: {content}")
 
-            logger.info("✅ Response sent")
+    response_text = f"[简化版] 收到消息: {content}"
 
-        elif msg_type == "webrtc_offer":
-            # 处理 WebRTC offer
-            user_id = message.get("user_id")
-            avatar_id = message.get("avatar_id", "avatar_tutor_13")
+    await send_message(websocket, {
+        "type": "text",
+        "content": response_text,
+        "role": "assistant",
+        "timestamp": now_iso()
+    })
 
-            if not user_id:
-                await send_error(websocket, "user_id is required for WebRTC")
-                return
+    logger.info("✅ Response sent")
 
-            logger.info(f"Received WebRTC offer from user_id={user_id}")
 
-            # 简化版：返回模拟的 answer
-            await send_message(websocket, {
-                "type": "webrtc_answer",
-                "sdp": "v=0\r\no=- 0 0 IN IP4 127.0.0.1\r\ns=-\r\nt=0 0\r\n",
-                "timestamp": datetime.now().isoformat()
-            })
+async def _handle_webrtc_offer(websocket: WebSocket, session, message: dict):
+    """处理 WebRTC offer"""
+    user_id = message.get("user_id")
 
-            logger.info(f"✅ WebRTC answer sent to user {user_id}")
+    if not user_id:
+        await send_error(websocket, "user_id is required for WebRTC")
+        return
 
-        elif msg_type == "webrtc_ice_candidate":
-            # 处理 ICE candidate
-            user_id = message.get("user_id")
+    logger.info(f"Received WebRTC offer from user_id={user_id}")
 
-            if not user_id:
-                await send_error(websocket, "user_id is required for WebRTC")
-                return
+    # 简化版：返回模拟的 answer
+    await send_message(websocket, {
+        "type": "webrtc_answer",
+        "sdp": "v=0\r\no=- 0 0 IN IP4 127.0.0.1\r\ns=-\r\nt=0 0\r\n",
+        "timestamp": now_iso()
+    })
 
-            logger.info(f"Received ICE candidate from user_id={user_id}")
-            # 简化版：不做实际处理
+    logger.info(f"✅ WebRTC answer sent to user {user_id}")
 
-        else:
+
+async def _handle_ice(websocket: WebSocket, session, message: dict):
+    """处理 ICE candidate"""
+    user_id = message.get("user_id")
+
+    if not user_id:
+        await send_error(websocket, "user_id is required for WebRTC")
+        return
+
+    logger.info(f"Received ICE candidate from user_id={user_id}")
+    # 简化版：不做实际处理
+
+
+# 消息类型 → 处理函数（导入时建好，每条消息一次字典查找代替 if/elif 链）
+HANDLERS: Dict[str, Callable[[WebSocket, Any, dict], Awaitable[None]]] = {
+    "text_webrtc": _handle_text_webrtc,
+    "text": _handle_text,
+    "webrtc_offer": _handle_webrtc_offer,
+    "webrtc_ice_candidate": _handle_ice,
+}
+
+
+async def handle_message(websocket: WebSocket, session, message: dict, is_user_based: bool = False):
+    """处理客户端消息"""
+    msg_type = message.get("type")
+
+    logger.info(f"📨 Received message: session_id={session.session_id}, type={msg_type}")
+
+    try:
+        handler = HANDLERS.get(msg_type)
+        if handler is None:
             await send_error(websocket, f"Unsupported message type: {msg_type}")
+        else:
+            await handler(websocket, session, message)
 
     except Exception as e:
         logger.error(f"Error processing message: {e}", exc_info=True)
@@ -320,9 +366,18 @@ async def handle_message(websocket: WebSocket, session, message: dict, is_user_b
 
 
 async def send_message(websocket: WebSocket, message: dict):
-    """发送消息给客户端"""
+    """
+    发送消息给客户端
+
+    使用 orjson 序列化（比标准库 json 快数倍），默认以文本帧发送，客户端协议不变；
+    连接时带 binary_json=true 的客户端直接收到 orjson 输出的字节（二进制帧）。
+    """
     try:
-        await websocket.send_json(message)
+        payload = orjson.dumps(message)
+        if websocket.state.binary_json:
+            await websocket.send_bytes(payload)
+        else:
+            await websocket.send_text(payload.decode("utf-8"))
     except Exception as e:
         logger.error(f"Failed to send message: {e}")
 
@@ -332,21 +387,40 @@ async def send_error(websocket: WebSocket, error: str):
     await send_message(websocket, {
         "type": "error",
         "content": error,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now_iso()
     })
 
 
+def _has_module(name: str) -> bool:
+    """检查可选依赖是否已安装"""
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        return False
+    return True
+
+
 def main():
     """启动 WebSocket 服务"""
     logger.info("🚀 Starting Simplified GPU Server...")
     logger.info(f"📍 Host: {settings.websocket_host}")
     logger.info(f"📍 Port: {settings.websocket_port}")
+    logger.info(f"📍 Workers: {settings.websocket_workers}")
     logger.info("⚠️  This is a simplified version without AI capabilities")
 
+    # 每个 worker 各自持有 active_connections / session_contexts，
+    # 大于 1 时需要前置代理按 connection_id 做粘性路由；多 worker 时 uvicorn 需要以导入字符串的形式传入 app
+    workers = settings.websocket_workers
+
+    # 有 uvloop / httptools（uvicorn[standard] 提供）时使用，否则回退到 asyncio 和纯 Python 解析（如 Windows）
     uvicorn.run(
-        app,
+        app if workers == 1 else "api.websocket_server_simplified:app",
         host=settings.websocket_host,
         port=settings.websocket_port,
+        loop="uvloop" if _has_module("uvloop") else "asyncio",
+        http="httptools" if _has_module("httptools") else "h11",
+        ws="websockets" if _has_module("websockets") else "auto",
+        workers=workers,
         log_level="info"
     )
 
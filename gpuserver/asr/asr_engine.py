@@ -7,13 +7,61 @@ Supports:
 """
 
 import asyncio
-import base64
+import binascii
+import contextlib
 import io
 import logging
 import os
-from typing import Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Union
+
+from config import get_settings
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+try:
+    # SIMD（SSSE3 / AVX2）加速的 base64，未安装时回退到 binascii
+    import pybase64
+except ImportError:
+    pybase64 = None
+
+
+# Whisper 输入的采样率
+_WHISPER_SAMPLE_RATE = 16000
+
+
+def _decode_audio(audio_bytes: Union[bytes, bytearray, memoryview]):
+    """
+    在内存中把音频解码为 Whisper 的输入格式（16 kHz 单声道 float32）
+
+    Args:
+        audio_bytes: 原始音频字节（WAV / FLAC / OGG 等 libsndfile 支持的格式）
+
+    Returns:
+        np.ndarray: float32 音频数组；格式不受支持或需要重采样但未安装 soxr 时返回 None
+    """
+    import soundfile as sf
+
+    try:
+        audio, sample_rate = sf.read(io.BytesIO(audio_bytes), dtype="float32", always_2d=False)
+    except Exception:
+        return None
+
+    # 多声道取平均
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+
+    if sample_rate != _WHISPER_SAMPLE_RATE:
+        try:
+            import soxr
+        except ImportError:
+            return None
+        audio = soxr.resample(audio, sample_rate, _WHISPER_SAMPLE_RATE)
+
+    return audio
 
 
 class ASREngine:
@@ -21,7 +69,7 @@ class ASREngine:
     ASR 引擎 - 将音频转换为文本
 
     支持:
-    - Whisper 模型（openai-whisper）
+    - Whisper 模型（优先使用 faster-whisper，未安装时回退到 openai-whisper）
     - Mock 模式（用于测试）
     """
 
@@ -29,7 +77,9 @@ class ASREngine:
         self,
         model_name: str = "base",
         enable_real: bool = True,
-        device: str = "cuda"
+        device: str = "cuda",
+        compute_type: str = "float16",
+        max_workers: int = 2
     ):
         """
         初始化 ASR 引擎
@@ -38,11 +88,20 @@ class ASREngine:
             model_name: Whisper 模型名称 (tiny, base, small, medium, large)
             enable_real: 是否启用真实 ASR（False 则使用 Mock）
             device: 设备 ("cuda" 或 "cpu")
+            compute_type: faster-whisper 的计算精度 (float16, int8_float16, int8)；CPU 上固定使用 int8
+            max_workers: 转录线程数（同时在 GPU 上运行的 Whisper 调用数）
         """
         self.model_name = model_name
         self.enable_real = enable_real
         self.device = device
+        self.compute_type = compute_type if device == "cuda" else "int8"
         self.model = None
+        # 实际使用的后端："faster_whisper" 或 "whisper"
+        self.backend: Optional[str] = None
+        # openai-whisper 在 CUDA 上推理时使用的专用 CUDA stream（不与 LLM / TTS 在默认 stream 上串行）
+        self._stream = None
+        # 专用的有界转录线程池，不占用事件循环的默认线程池
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="asr")
 
         if self.enable_real:
             try:
@@ -56,27 +115,49 @@ class ASREngine:
             logger.info("ASR Engine initialized in Mock mode")
 
     def _load_model(self):
-        """加载 Whisper 模型"""
+        """
+        加载 Whisper 模型
+
+        优先使用 faster-whisper（CTranslate2，吞吐约为 openai-whisper 的 4 倍，INT8 时显存减半），
+        未安装时回退到 openai-whisper。
+        """
         try:
-            import whisper
-            self.model = whisper.load_model(
-                self.model_name,
-                device=self.device
-            )
-            logger.info(f"Whisper model '{self.model_name}' loaded successfully")
+            from faster_whisper import WhisperModel
+        except ImportError:
+            WhisperModel = None
+
+        try:
+            if WhisperModel is not None:
+                self.model = WhisperModel(
+                    self.model_name,
+                    device=self.device,
+                    compute_type=self.compute_type
+                )
+                self.backend = "faster_whisper"
+            else:
+                import whisper
+                self.model = whisper.load_model(
+                    self.model_name,
+                    device=self.device
+                )
+                self.backend = "whisper"
+                if self.device == "cuda":
+                    import torch
+                    self._stream = torch.cuda.Stream()
+            logger.info(f"Whisper model '{self.model_name}' loaded successfully (backend={self.backend})")
         except ImportError:
-            logger.error("whisper package not installed. Install with: pip install openai-whisper")
+            logger.error("whisper package not installed. Install with: pip install faster-whisper")
             raise
         except Exception as e:
             logger.error(f"Error loading Whisper model: {e}")
             raise
 
-    async def transcribe(self, audio_data: str, language: str = "zh") -> str:
+    async def transcribe(self, audio_data: Union[bytes, str], language: str = "zh") -> str:
         """
         将音频转换为文本
 
         Args:
-            audio_data: base64 编码的音频数据（支持多种格式：WAV, MP3, OGG, WebM 等）
+            audio_data: 原始音频字节（bytes 或 memoryview）或 base64 编码的音频数据（支持多种格式：WAV, MP3, OGG, WebM 等）
             language: 语言代码（zh: 中文, en: 英文）
 
         Returns:
@@ -87,10 +168,10 @@ class ASREngine:
             return await self._mock_transcribe(audio_data)
 
         try:
-            # 在线程池中运行同步的 Whisper 调用
-            loop = asyncio.get_event_loop()
+            # 在专用线程池中运行同步的 Whisper 调用
+            loop = asyncio.get_running_loop()
             result = await loop.run_in_executor(
-                None,
+                self._executor,
                 self._transcribe_sync,
                 audio_data,
                 language
@@ -101,94 +182,163 @@ class ASREngine:
             # 降级到 Mock 模式
             return await self._mock_transcribe(audio_data)
 
-    def _transcribe_sync(self, audio_data: str, language: str) -> str:
+    def _transcribe_sync(self, audio_data: Union[bytes, str], language: str) -> str:
         """
         同步转录音频（在线程池中运行）
 
         Args:
-            audio_data: base64 编码的音频数据
+            audio_data: 原始音频字节或 base64 编码的音频数据
             language: 语言代码
 
         Returns:
             str: 转录的文本
         """
-        import tempfile
-        import numpy as np
-        import soundfile as sf
+        # 1. 解码 base64（调用方已传入原始字节时跳过）
+        if isinstance(audio_data, (bytes, bytearray, memoryview)):
+            audio_bytes = audio_data
+        else:
+            audio_bytes = pybase64.b64decode(audio_data, validate=False) if pybase64 else binascii.a2b_base64(audio_data)
+
+        # 2. 在内存中解码为 16 kHz 单声道 float32 数组，直接交给 Whisper（不写临时文件、不启动 ffmpeg）
+        audio = _decode_audio(audio_bytes)
+        if audio is not None:
+            text = self._run_model(audio, language)
+        else:
+            # soundfile 不支持的格式（如 WebM）：保存到临时文件，由 Whisper 调用 ffmpeg 解码
+            text = self._transcribe_file(audio_bytes, language)
 
-        # 1. 解码 base64
-        audio_bytes = base64.b64decode(audio_data)
+        logger.info(f"ASR transcribed: {text[:100]}...")
+        return text
+
+    def _transcribe_file(self, audio_bytes: Union[bytes, bytearray, memoryview], language: str) -> str:
+        """
+        通过临时文件转录音频（内存解码失败时的回退路径）
+
+        Args:
+            audio_bytes: 原始音频字节
+            language: 语言代码
+
+        Returns:
+            str: 转录的文本
+        """
+        import tempfile
 
-        # 2. 保存到临时文件（Whisper 需要文件路径）
         with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
             tmp_path = tmp_file.name
             tmp_file.write(audio_bytes)
 
         try:
-            # 3. 调用 Whisper 进行转录
+            return self._run_model(tmp_path, language)
+        finally:
+            # 清理临时文件
+            try:
+                os.unlink(tmp_path)
+            except:
+                pass
+
+    def _run_model(self, audio, language: str, vad_filter: bool = True) -> str:
+        """
+        调用 Whisper 进行转录，并提取文本
+
+        Args:
+            audio: 16 kHz 单声道 float32 数组，或音频文件路径
+            language: 语言代码
+            vad_filter: 是否跳过静音段（仅 faster-whisper）
+
+        Returns:
+            str: 转录的文本
+        """
+        if self.backend == "faster_whisper":
+            # segments 是惰性生成器，遍历时才真正解码；CTranslate2 自行管理 CUDA stream
+            segments, _ = self.model.transcribe(
+                audio,
+                language=language,
+                beam_size=1,
+                vad_filter=vad_filter
+            )
+            return "".join(segment.text for segment in segments).strip()
+
+        if self._stream is not None:
+            import torch
+            stream_context = torch.cuda.stream(self._stream)
+        else:
+            stream_context = contextlib.nullcontext()
+
+        with stream_context:
             result = self.model.transcribe(
-                tmp_path,
+                audio,
                 language=language,
                 fp16=self.device == "cuda"  # 使用 FP16 加速（仅 CUDA）
             )
+        return result["text"].strip()
 
-            # 4. 提取文本
-            text = result["text"].strip()
-            logger.info(f"ASR transcribed: {text[:100]}...")
+    def warmup(self, language: str = "zh"):
+        """
+        用 1 秒静音预热模型（触发 CUDA 初始化和 cuDNN 自动调优），避免首个用户请求承担冷启动延迟
 
-            return text
+        Args:
+            language: 语言代码
+        """
+        if not self.enable_real or self.model is None:
+            return
 
-        finally:
-            # 5. 清理临时文件
-            try:
-                os.unlink(tmp_path)
-            except:
-                pass
+        import numpy as np
+
+        try:
+            # 不做 VAD 过滤，否则静音会被整段跳过，模型不会真正运行
+            self._run_model(np.zeros(_WHISPER_SAMPLE_RATE, dtype=np.float32), language, vad_filter=False)
+            logger.info(f"ASR model '{self.model_name}' warmed up")
+        except Exception as e:
+            logger.warning(f"ASR warmup failed: {e}")
 
-    async def _mock_transcribe(self, audio_data: str) -> str:
+    async def _mock_transcribe(self, audio_data: Union[bytes, str]) -> str:
         """
         Mock 转录（用于测试）
 
         Args:
-            audio_data: base64 编码的音频数据
+            audio_data: 原始音频字节或 base64 编码的音频数据
 
         Returns:
             str: Mock 转录结果
         """
         # 模拟处理延迟
-        await asyncio.sleep(0.3)
+        if settings.mock_delay_enabled:
+            await asyncio.sleep(0.3)
 
         # Mock 结果
         return "[Mock ASR] 这是一段模拟的语音转文本结果"
 
 
-# 全局 ASR 引擎实例
-_asr_engine: Optional[ASREngine] = None
-
-
+# 相同配置的调用方（所有 tutor）共享同一个实例，Whisper 模型只加载一次
+@lru_cache(maxsize=8)
 def get_asr_engine(
     model_name: str = "base",
     enable_real: bool = True,
-    device: str = "cuda"
+    device: str = "cuda",
+    compute_type: str = "float16",
+    max_workers: int = 2
 ) -> ASREngine:
     """
-    获取 ASR 引擎实例（单例模式）
+    获取 ASR 引擎实例（按配置参数缓存）
 
     Args:
         model_name: Whisper 模型名称
         enable_real: 是否启用真实 ASR
         device: 设备
+        compute_type: faster-whisper 的计算精度
+        max_workers: 转录线程数
 
     Returns:
         ASREngine: ASR 引擎实例
     """
-    global _asr_engine
-
-    if _asr_engine is None:
-        _asr_engine = ASREngine(
-            model_name=model_name,
-            enable_real=enable_real,
-            device=device
-        )
-
-    return _asr_engine
+    engine = ASREngine(
+        model_name=model_name,
+        enable_real=enable_real,
+        device=device,
+        compute_type=compute_type,
+        max_workers=max_workers
+    )
+    # 后台预热模型，不阻塞调用方
+    if engine.enable_real:
+        threading.Thread(target=engine.warmup, name="asr-warmup", daemon=True).start()
+    return engine
@@ -10,11 +10,23 @@ class Settings(BaseSettings):
     # 管理 API 配置
     management_api_host: str = "0.0.0.0"
     management_api_port: int = 9000
+    # 管理 API 的 worker 进程数（会话保存在进程内存中，多 worker 时需配合共享会话存储使用）
+    management_api_workers: int = 1
 
     # WebSocket 配置
     websocket_host: str = "0.0.0.0"
     websocket_port: int = 9001
     websocket_url: str = "ws://localhost:9001"
+    # WebSocket 服务的 worker 进程数。每个 worker 各自加载模型、持有连接和会话，
+    # 大于 1 时需要前置代理按 connection_id 做粘性路由
+    websocket_workers: int = 1
+    # WebSocket 心跳间隔和超时（秒）
+    websocket_ping_interval: float = 20
+    websocket_ping_timeout: float = 20
+    # WebSocket permessage-deflate 压缩（JSON / base64 负载压缩率高；CPU 紧张时可关闭）
+    websocket_per_message_deflate: bool = True
+    # 分块发送视频时每个二进制帧的字节数（客户端声明 caps.video_stream=true 时生效）
+    websocket_video_chunk_size: int = 16384
 
     # GPU 配置
     cuda_visible_devices: str = "0"
@@ -22,13 +34,48 @@ class Settings(BaseSettings):
     # 会话配置
     max_sessions: int = 10
     session_timeout_seconds: int = 3600
+    # 按 tutor_id 缓存的 AI 引擎实例上限（超出时按 LRU 淘汰）
+    max_cached_engines: int = 32
+    # AI 引擎空闲超过该时间（秒）后被淘汰，0 表示不按时间淘汰
+    engine_idle_ttl_seconds: int = 1800
+    # WebSocket 按 engine_session_id 缓存的 session 上下文上限（超出时按 LRU 淘汰）
+    session_context_cache_size: int = 1024
+    # session 上下文空闲超过该时间（秒）后被淘汰，0 表示不按时间淘汰
+    session_context_ttl_seconds: int = 3600
+
+    # 推理并发限制（所有 tutor 共享，超出的请求排队等待，避免 GPU 争抢）
+    llm_max_concurrency: int = 4
+    asr_max_concurrency: int = 2
+    tts_max_concurrency: int = 4
+    # 视频生成占用显存最多，默认串行
+    video_max_concurrency: int = 1
+
+    # Mock 模式配置
+    # Mock 模式（enable_llm / enable_asr / enable_tts / enable_rag / enable_avatar 为 False）下是否模拟处理延迟；
+    # 默认关闭，压测时避免每个请求都向事件循环注册定时器
+    mock_delay_enabled: bool = False
 
     # LLM 配置
     ollama_base_url: str = "http://127.0.0.1:11434"
     default_llm_model: str = "mistral-nemo:12b-instruct-2407-fp16"
     llm_temperature: float = 0.4
+    # 模型在 Ollama 中的驻留时间，保持模型和前缀 KV 缓存常驻，避免空闲后重新加载
+    llm_keep_alive: str = "30m"
+    # 到 Ollama 的 HTTP 连接池（每个模型配置共享一个）：最大连接数、保持的空闲连接数、请求超时（秒）
+    llm_max_connections: int = 32
+    llm_max_keepalive_connections: int = 16
+    llm_request_timeout: float = 120
     # 是否启用 LLM（如果为 False，则使用 Mock 模式）
     enable_llm: bool = True
+    # 同一 tutor 并发请求的微批处理：窗口内最多合并 llm_batch_size 个请求（1 表示关闭）
+    llm_batch_size: int = 1
+    llm_batch_window_ms: int = 5
+    # 每个 tutor 缓存的 LLM 响应条数（相同问题直接返回缓存结果，0 表示关闭）；
+    # 知识库文档变化后调用 POST /v1/knowledge-bases/{kb_id}/invalidate 清除相关条目
+    # （请求头 X-Admin-Token 需与 admin_token 一致）
+    llm_response_cache_size: int = 256
+    # WebSocket 服务管理接口（如知识库缓存失效）的共享密钥；未设置时这些接口一律返回 401
+    admin_token: Optional[str] = None
 
     # ASR 配置
     # Whisper 模型: tiny, base, small, medium, large
@@ -37,6 +84,8 @@ class Settings(BaseSettings):
     enable_asr: bool = True
     # ASR 设备: cuda 或 cpu
     asr_device: str = "cuda"
+    # faster-whisper 计算精度: float16, int8_float16（显存更省）, int8；CPU 上固定为 int8
+    asr_compute_type: str = "float16"
     # ASR 默认语言: zh (中文), en (英文)
     asr_language: str = "zh"
 
@@ -49,6 +98,8 @@ class Settings(BaseSettings):
     tts_rate: str = "+10%"
     # TTS 音调: "+0Hz" (默认), "+10Hz" (稍高), "-10Hz" (稍低)
     tts_pitch: str = "+0Hz"
+    # 缓存的 TTS 合成结果条数（相同回复文本直接复用音频，0 表示关闭）
+    tts_cache_size: int = 256
 
     # RAG 配置
     # 是否启用 RAG（如果为 False，则使用 Mock 模式）
@@ -57,6 +108,8 @@ class Settings(BaseSettings):
     rag_url: Optional[str] = None
     # RAG 检索返回的文档数量
     rag_top_k: int = 5
+    # 同一问题的 RAG 检索结果在该时间（秒）内复用，0 表示关闭
+    rag_memo_ttl_seconds: int = 30
 
     # MuseTalk / Avatar 配置
     # 是否启用 MuseTalk（如果为 False，则使用 Mock 模式）
@@ -69,6 +122,23 @@ class Settings(BaseSettings):
     musetalk_conda_env: Optional[str] = None
     # FFmpeg 路径
     ffmpeg_path: str = "ffmpeg"
+    # 缓存的口型视频条数（相同 avatar + 相同音频直接复用视频，0 表示关闭；视频较大，默认条数较少）
+    video_cache_size: int = 16
+    # 缓存解码后待机帧的 avatar 数（WebRTC 连接共享，LRU 淘汰；每个 avatar 约 125 帧原始图像）
+    idle_frame_cache_size: int = 8
+    # 待机帧 PNG 是否用进程池解码（绕过 GIL，多 avatar 冷启动时更快；进程启动和帧回传有额外开销，默认用线程池）
+    idle_frame_decode_processes: bool = False
+    # 待机帧读取 / 编码专用线程池的线程数（与 asyncio.to_thread 的默认线程池隔离）
+    image_io_workers: int = 16
+    # WebRTC 待机帧的目标分辨率（宽, 高），解码时直接缩放；0 表示保持原始分辨率
+    idle_frame_width: int = 0
+    idle_frame_height: int = 0
+    # 待机视频是否尝试 NVDEC 硬件解码（需要 ffmpegcv 和 NVIDIA 驱动；纯 CPU 主机可关闭，省去每次失败的尝试）
+    idle_frame_nvdec: bool = True
+    # 分块上传未完成时临时分块的保留时间（秒），超时未续传则清理
+    avatar_upload_chunk_ttl_seconds: int = 3600
+    # 上传视频的临时目录（tmpfs，内存盘），空间不足或不存在时回退到系统临时目录；为空表示不使用
+    upload_tmpfs_dir: Optional[str] = "/dev/shm"
 
     # WebRTC 配置
     # 公网IP地址（用于WebRTC连接）
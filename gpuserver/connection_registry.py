@@ -0,0 +1,77 @@
+"""
+WebSocket 连接表
+
+按 connection_id 哈希分片，每个分片有独立的锁，连接建立/断开时只锁住所在分片。
+断开时只移除自己登记的连接，同一 connection_id 重连后旧连接的清理不会把新连接移除。
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional
+
+
+class ConnectionRegistry:
+    """按 connection_id 分片的 WebSocket 连接表"""
+
+    def __init__(self, shards: int = 32):
+        """
+        初始化连接表
+
+        Args:
+            shards: 分片数量
+        """
+        self._shards: List[Dict[str, Any]] = [{} for _ in range(shards)]
+        self._locks: List[asyncio.Lock] = [asyncio.Lock() for _ in range(shards)]
+
+    def _index(self, connection_id: str) -> int:
+        return hash(connection_id) % len(self._shards)
+
+    async def register(self, connection_id: str, websocket) -> Optional[Any]:
+        """
+        登记连接
+
+        Args:
+            connection_id: 连接标识符
+            websocket: WebSocket 连接
+
+        Returns:
+            被替换的旧连接（同一 connection_id 重连时），没有则返回 None
+        """
+        index = self._index(connection_id)
+        async with self._locks[index]:
+            previous = self._shards[index].get(connection_id)
+            self._shards[index][connection_id] = websocket
+        return previous
+
+    async def unregister(self, connection_id: str, websocket) -> bool:
+        """
+        移除连接（仅当登记的仍是该连接时）
+
+        Args:
+            connection_id: 连接标识符
+            websocket: 要移除的 WebSocket 连接
+
+        Returns:
+            bool: 是否移除
+        """
+        index = self._index(connection_id)
+        async with self._locks[index]:
+            shard = self._shards[index]
+            if shard.get(connection_id) is websocket:
+                del shard[connection_id]
+                return True
+        return False
+
+    def get(self, connection_id: str) -> Optional[Any]:
+        """
+        查询连接（只读，不加锁）
+
+        Args:
+            connection_id: 连接标识符
+
+        Returns:
+            WebSocket 连接，不存在返回 None
+        """
+        return self._shards[self._index(connection_id)].get(connection_id)
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
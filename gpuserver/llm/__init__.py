@@ -4,8 +4,9 @@ LLM 模块
 提供 LLM 文本生成功能，支持 Ollama 集成。
 """
 
-from .llm_engine import LLMEngine, get_llm_engine
+from .llm_engine import FallbackText, LLMEngine, get_llm_engine, remove_llm_engine
+from .response_cache import ResponseCache
 
-__all__ = ["LLMEngine", "get_llm_engine"]
+__all__ = ["FallbackText", "LLMEngine", "get_llm_engine", "remove_llm_engine", "ResponseCache"]
 
 
@@ -8,12 +8,13 @@ LLM 引擎实现
 import asyncio
 import logging
 import os
-from typing import Optional, Dict, AsyncIterator
+from typing import Optional, Dict, AsyncIterator, List, Sequence
 from threading import Lock
 from functools import lru_cache
 
 # LLM imports (optional, will fallback to mock if not available)
 try:
+    import httpx
     from langchain_ollama import ChatOllama
     from langchain_core.prompts import ChatPromptTemplate
     from langchain_core.output_parsers import StrOutputParser
@@ -27,6 +28,54 @@ logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
+class FallbackText(str):
+    """
+    降级生成的文本（Mock 回复，或 LLM 调用失败后的补救输出）
+
+    与普通 str 用法相同；调用方可以用 isinstance 判断，避免把它写入响应缓存。
+    """
+
+
+# Ollama 客户端和 chain 按模型配置缓存：使用同一模型的 tutor 共享同一个 ChatOllama（及其 HTTP 连接池，
+# ChatOllama 在实例上持有 httpx 客户端，连接在请求之间复用）
+@lru_cache(maxsize=8)
+def _get_ollama_chain(model_name: str, base_url: str, temperature: float, keep_alive: str):
+    """
+    获取指定模型配置的共享 LLM chain（prompt | ChatOllama | StrOutputParser）
+
+    Args:
+        model_name: Ollama 模型名称
+        base_url: Ollama 服务地址
+        temperature: 采样温度
+        keep_alive: 模型在 Ollama 中的驻留时间
+
+    Returns:
+        Tuple[ChatOllama, ChatPromptTemplate, Runnable]: LLM、prompt 模板和组合好的 chain
+    """
+    llm = ChatOllama(
+        temperature=temperature,
+        model=model_name,
+        base_url=base_url,
+        keep_alive=keep_alive,
+        # 传给底层 httpx 客户端：保持长连接，省去每次请求的 TCP 握手
+        client_kwargs={
+            "limits": httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_keepalive_connections
+            ),
+            "timeout": httpx.Timeout(settings.llm_request_timeout)
+        }
+    )
+    # 构建 prompt 模板
+    # RAG 上下文放在 system 消息中、用户问题之前：命中同一组文档的请求共享相同的
+    # prompt 前缀，Ollama 可以复用已缓存的前缀 KV，只对问题部分做 prefill
+    prompt_template = ChatPromptTemplate.from_messages([
+        ("system", "你是一个专业的虚拟导师助手，能够友好、准确地回答学生的问题。{context}"),
+        ("user", "{input}")
+    ])
+    return llm, prompt_template, prompt_template | llm | StrOutputParser()
+
+
 class LLMEngine:
     """
     LLM 引擎
@@ -50,23 +99,27 @@ class LLMEngine:
         tutor_model_key = f"TUTOR_{tutor_id}_LLM_MODEL"
         self.model_name = os.getenv(tutor_model_key, settings.default_llm_model)
         
+        # Mock 回复的前后缀（tutor_id 固定，预先填入，每次请求只需拼接 text）
+        self._mock_prefix = f"[Mock LLM Response - Tutor {tutor_id}] 您刚才说：「"
+        self._mock_suffix = "」。这是一个模拟的 LLM 回复。在真实环境中，这里会调用 LLM 模型生成智能回复。"
+        self._mock_stream_tmpl = (
+            f"[Mock LLM Stream - Tutor {tutor_id}] "
+            "您刚才说：「{text}」。这是一个模拟的流式 LLM 回复。"
+            "在真实环境中，这里会调用 LLM 模型逐 token 生成智能回复。"
+        )
+
         # 初始化 LLM（如果启用）
         self.llm = None
         self.llm_chain = None
         
         if self.use_llm:
             try:
-                self.llm = ChatOllama(
-                    temperature=settings.llm_temperature,
-                    model=self.model_name,
-                    base_url=settings.ollama_base_url
+                self.llm, self.prompt_template, self.llm_chain = _get_ollama_chain(
+                    self.model_name,
+                    settings.ollama_base_url,
+                    settings.llm_temperature,
+                    settings.llm_keep_alive
                 )
-                # 构建 prompt 模板
-                self.prompt_template = ChatPromptTemplate.from_messages([
-                    ("system", "你是一个专业的虚拟导师助手，能够友好、准确地回答学生的问题。"),
-                    ("user", "{input}")
-                ])
-                self.llm_chain = self.prompt_template | self.llm | StrOutputParser()
                 logger.info(f"LLM Engine initialized for tutor_id={tutor_id} with model: {self.model_name}")
             except Exception as e:
                 logger.error(f"Failed to initialize LLM for tutor_id={tutor_id}: {e}, falling back to Mock mode")
@@ -76,52 +129,104 @@ class LLMEngine:
         else:
             logger.info(f"LLM Engine initialized for tutor_id={tutor_id} (Mock mode - LLM disabled or not available)")
 
-    async def generate(
+        # 初始化时确定 generate 的实现，每轮调用不再重复判断是否启用 LLM
+        self.generate = self._generate_real if self.use_llm else self._generate_mock
+
+    @staticmethod
+    def _build_input(text: str, context: Optional[str]) -> Dict[str, str]:
+        """
+        构建 prompt 模板的输入
+
+        Args:
+            text: 用户输入的文本
+            context: RAG 上下文（可选）
+
+        Returns:
+            Dict[str, str]: prompt 模板变量
+        """
+        return {"input": text, "context": f"\n\n{context}" if context else ""}
+
+    async def _generate_real(
         self,
         text: str,
         context: Optional[str] = None
     ) -> str:
         """
-        生成 LLM 响应
+        生成 LLM 响应（启用 LLM 时绑定为 generate）
 
         Args:
             text: 用户输入的文本
-            context: 可选的上下文信息（用于 RAG，当前版本暂未实现）
+            context: 可选的 RAG 上下文
 
         Returns:
             str: LLM 生成的响应文本
         """
         logger.info(f"LLM generating response for tutor_id={self.tutor_id}, text={text[:50]}...")
 
-        # 如果启用了 LLM 且有可用的 chain，使用真实 LLM
+        try:
+            # 调用 LLM 生成响应
+            response = await self.llm_chain.ainvoke(self._build_input(text, context))
+
+            logger.info(f"LLM generated response (tutor_id={self.tutor_id}, model={self.model_name}): {response[:100]}...")
+            return response
+
+        except Exception as e:
+            logger.error(f"LLM call failed for tutor_id={self.tutor_id}: {e}, falling back to Mock")
+            # Fallback to Mock on error
+            return await self._generate_mock(text, context)
+
+    async def _generate_mock(
+        self,
+        text: str,
+        context: Optional[str] = None
+    ) -> str:
+        """
+        生成 Mock 响应（Mock 模式下绑定为 generate，也是 LLM 调用失败时的 fallback）
+
+        Args:
+            text: 用户输入的文本
+            context: 可选的 RAG 上下文（Mock 模式下不使用）
+
+        Returns:
+            str: Mock 响应文本
+        """
+        mock_response = FallbackText(self._mock_prefix + text + self._mock_suffix)
+        logger.info(f"Generated mock response: {mock_response[:100]}...")
+        return mock_response
+
+    async def generate_batch(
+        self,
+        texts: Sequence[str],
+        contexts: Optional[Sequence[Optional[str]]] = None
+    ) -> List[str]:
+        """
+        批量生成 LLM 响应（一次提交多个输入）
+
+        Args:
+            texts: 用户输入的文本列表
+            contexts: 与 texts 一一对应的 RAG 上下文（可选）
+
+        Returns:
+            List[str]: 与输入顺序一致的响应列表
+        """
+        logger.info(f"LLM generating batch for tutor_id={self.tutor_id}, size={len(texts)}")
+
         if self.use_llm and self.llm_chain is not None:
             try:
-                # 构建输入
-                input_data = {"input": text}
-                
-                # TODO: 如果 context 存在，应该将其添加到 prompt 中（用于 RAG）
-                if context:
-                    logger.info(f"Context provided but RAG integration not yet implemented")
-                
-                # 调用 LLM 生成响应
-                response = await self.llm_chain.ainvoke(input_data)
-                
-                logger.info(f"LLM generated response (tutor_id={self.tutor_id}, model={self.model_name}): {response[:100]}...")
-                return response
-                
+                # 单个请求失败不影响同批的其他请求
+                contexts = contexts or [None] * len(texts)
+                responses = await self.llm_chain.abatch(
+                    [self._build_input(text, context) for text, context in zip(texts, contexts)],
+                    return_exceptions=True
+                )
+                return [
+                    FallbackText(self._mock_prefix + text + self._mock_suffix) if isinstance(response, Exception) else response
+                    for text, response in zip(texts, responses)
+                ]
             except Exception as e:
-                logger.error(f"LLM call failed for tutor_id={self.tutor_id}: {e}, falling back to Mock")
-                # Fallback to Mock on error
-                pass
-
-        # Mock 模式或 LLM 调用失败时的 fallback
-        mock_response = (
-            f"[Mock LLM Response - Tutor {self.tutor_id}] "
-            f"您刚才说：「{text}」。这是一个模拟的 LLM 回复。"
-            f"在真实环境中，这里会调用 LLM 模型生成智能回复。"
-        )
-        logger.info(f"Generated mock response: {mock_response[:100]}...")
-        return mock_response
+                logger.error(f"LLM batch call failed for tutor_id={self.tutor_id}: {e}, falling back to Mock")
+
+        return [FallbackText(self._mock_prefix + text + self._mock_suffix) for text in texts]
 
     async def stream_generate(
         self,
@@ -133,10 +238,10 @@ class LLMEngine:
 
         Args:
             text: 用户输入的文本
-            context: 可选的上下文信息（用于 RAG，当前版本暂未实现）
+            context: 可选的 RAG 上下文
 
         Yields:
-            str: LLM 生成的 token 流
+            str: LLM 生成的 token 流；降级输出的块为 FallbackText
         """
         logger.info(f"LLM streaming response for tutor_id={self.tutor_id}, text={text[:50]}...")
 
@@ -144,11 +249,7 @@ class LLMEngine:
         if self.use_llm and self.llm_chain is not None:
             try:
                 # 构建输入
-                input_data = {"input": text}
-
-                # TODO: 如果 context 存在，应该将其添加到 prompt 中（用于 RAG）
-                if context:
-                    logger.info(f"Context provided but RAG integration not yet implemented")
+                input_data = self._build_input(text, context)
 
                 # 调用 LLM 流式生成响应
                 async for chunk in self.llm_chain.astream(input_data):
@@ -159,23 +260,20 @@ class LLMEngine:
 
             except Exception as e:
                 logger.error(f"LLM stream failed for tutor_id={self.tutor_id}: {e}, falling back to Mock")
-                # 异常时降级到阻塞式调用
+                # 异常时降级到阻塞式调用；此前可能已输出部分 token，补救输出整体标记为降级文本
                 response = await self.generate(text, context)
-                yield response
+                yield FallbackText(response)
                 return
 
         # Mock 模式流式生成（模拟逐字输出）
-        mock_response = (
-            f"[Mock LLM Stream - Tutor {self.tutor_id}] "
-            f"您刚才说：「{text}」。这是一个模拟的流式 LLM 回复。"
-            f"在真实环境中，这里会调用 LLM 模型逐 token 生成智能回复。"
-        )
+        mock_response = self._mock_stream_tmpl.format_map({"text": text})
         logger.info(f"Generating mock stream response: {mock_response[:100]}...")
 
         # 模拟逐字输出
         for char in mock_response:
-            await asyncio.sleep(0.05)  # 模拟生成延迟
-            yield char
+            if settings.mock_delay_enabled:
+                await asyncio.sleep(0.05)  # 模拟生成延迟
+            yield FallbackText(char)
 
 
 # 按 tutor_id 隔离的 LLM 引擎实例缓存
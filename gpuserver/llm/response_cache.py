@@ -0,0 +1,111 @@
+"""
+LLM 响应缓存
+
+按 (kb_id, 规范化后的问题文本) 缓存 LLM 回复。
+重复或仅在空白、大小写、句末标点上不同的提问直接返回缓存结果，跳过 RAG 检索和 LLM 推理。
+文本中间的符号（运算符、小数点、分隔符等）保留，避免 "2+2" 与 "22" 这类不同问题共用同一个键。
+"""
+
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Sequence, Union
+
+# 连续空白（规范化时合并为一个空格）
+_WHITESPACE = re.compile(r"\s+")
+# 规范化时从末尾去掉的句末标点（中英文）
+_TRAILING_PUNCTUATION = " .!?。！？…~～"
+
+
+class ResponseCache:
+    """
+    LLM 响应的 LRU 缓存
+
+    每个 AIEngine（即每个 tutor）持有一个实例，随引擎一起释放。
+    """
+
+    def __init__(self, max_size: int = 256):
+        """
+        初始化响应缓存
+
+        Args:
+            max_size: 最大缓存条目数，超出时淘汰最久未使用的条目
+        """
+        self.max_size = max_size
+        self._entries: OrderedDict[tuple, str] = OrderedDict()
+
+    @staticmethod
+    def make_key(text: str, kb_id: Optional[Union[str, Sequence[str]]] = None) -> tuple:
+        """
+        生成缓存键
+
+        Args:
+            text: 用户输入的文本
+            kb_id: 知识库 ID 或 ID 列表（可选）
+
+        Returns:
+            tuple: (知识库键, 规范化文本)
+        """
+        normalized = _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text).casefold())
+        normalized = normalized.strip().rstrip(_TRAILING_PUNCTUATION)
+        if kb_id is None or isinstance(kb_id, str):
+            kb_key = kb_id
+        else:
+            kb_key = tuple(sorted(kb_id))
+        return kb_key, normalized
+
+    def get(self, key: tuple) -> Optional[str]:
+        """
+        查询缓存
+
+        Args:
+            key: make_key 生成的缓存键
+
+        Returns:
+            str: 缓存的响应，未命中返回 None
+        """
+        response = self._entries.get(key)
+        if response is not None:
+            try:
+                self._entries.move_to_end(key)
+            except KeyError:
+                pass
+        return response
+
+    def put(self, key: tuple, response: str):
+        """
+        写入缓存
+
+        Args:
+            key: make_key 生成的缓存键
+            response: LLM 响应文本
+        """
+        self._entries[key] = response
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, kb_id: str) -> int:
+        """
+        删除使用了指定知识库的条目（知识库文档变化时调用）
+
+        Args:
+            kb_id: 知识库 ID
+
+        Returns:
+            int: 删除的条目数
+        """
+        stale = [
+            key for key in list(self._entries)
+            if key[0] == kb_id or (isinstance(key[0], tuple) and kb_id in key[0])
+        ]
+        for key in stale:
+            self._entries.pop(key, None)
+        return len(stale)
+
+    def clear(self):
+        """清空缓存"""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,49 @@
+"""
+日志上下文
+
+在请求入口设置一次 tutor_id / session_id，由日志 Filter 注入到每条日志记录中，
+热路径上的日志调用不再需要逐行拼接这些字段。
+"""
+
+import contextvars
+import logging
+from typing import Any, Dict
+
+# 当前请求的日志字段（每个 asyncio 任务各自持有一份，create_task 时自动复制）
+session_ctx: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("session", default={})
+
+# 未设置上下文时（启动、后台任务等）的占位值
+_DEFAULT_FIELDS = {"tutor_id": "-", "session_id": "-"}
+
+# 带上下文前缀的日志格式
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [tutor=%(tutor_id)s session=%(session_id)s] %(message)s'
+
+
+class SessionContextFilter(logging.Filter):
+    """把 session_ctx 中的字段合并到日志记录上，供 Formatter 使用"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.__dict__.update(_DEFAULT_FIELDS)
+        record.__dict__.update(session_ctx.get())
+        return True
+
+
+def set_session_context(tutor_id: Any = None, session_id: Any = None):
+    """
+    设置当前请求的日志上下文
+
+    Args:
+        tutor_id: 导师 ID（可选）
+        session_id: 会话 ID（可选）
+    """
+    session_ctx.set({
+        "tutor_id": "-" if tutor_id is None else tutor_id,
+        "session_id": "-" if session_id is None else session_id,
+    })
+
+
+def install_session_filter():
+    """给 root logger 的所有 handler 安装 SessionContextFilter（在 basicConfig 之后调用）"""
+    for handler in logging.getLogger().handlers:
+        if not any(isinstance(f, SessionContextFilter) for f in handler.filters):
+            handler.addFilter(SessionContextFilter())
@@ -15,7 +15,7 @@ Reference:
 - MuseTalk base: /workspace/MuseTalk/
 """
 
-from .avatar_manager import AvatarManager, get_avatar_manager
+from .avatar_manager import AvatarManager, FallbackVideo, get_avatar_manager
 
 # 流式引擎（低延迟TTS+Lip-Sync）
 from .streaming_engine import (
@@ -44,6 +44,7 @@ def get_video_engine(
 
 __all__ = [
     "AvatarManager", 
+    "FallbackVideo",
     "get_avatar_manager", 
     "get_video_engine",
     # 流式引擎
@@ -16,8 +16,10 @@ import asyncio
 import logging
 import os
 import subprocess
+import threading
 import shutil
-from typing import Optional, Dict, Any, AsyncIterator
+from collections import OrderedDict
+from typing import Optional, Dict, Any, AsyncIterator, List, Union
 from pathlib import Path
 import numpy as np
 
@@ -25,7 +27,48 @@ import numpy as np
 from .realtime_engine import MuseTalkRealtimeEngine
 from .subprocess_engine import SubprocessRealtimeEngine
 
+from config import get_settings
+
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class FallbackVideo(bytes):
+    """
+    降级生成的静态视频（MuseTalk 推理失败时由 avatar 的第一张图片生成）
+
+    与普通 bytes 用法相同；调用方可以用 isinstance 判断，避免把它写入视频缓存。
+    """
+
+
+# 视频编码器的低延迟参数
+_ENCODER_OPTIONS = {
+    'h264_nvenc': {'preset': 'p1', 'tune': 'll', 'rc': 'cbr', 'bf': '0'},
+    'libx264': {'preset': 'ultrafast', 'tune': 'zerolatency', 'bf': '0'},
+}
+
+# 保存到磁盘、之后反复解码使用的视频（如待机视频）的编码参数：优先画质（恒定质量，接近无损）
+_ARCHIVE_ENCODER_OPTIONS = {
+    'h264_nvenc': {'preset': 'p6', 'rc': 'vbr', 'cq': '18', 'bf': '0'},
+    'libx264': {'preset': 'medium', 'crf': '18', 'bf': '0'},
+}
+
+
+def _detect_nvenc() -> bool:
+    """
+    检测是否可以使用 NVENC 硬件编码（需要 CUDA 设备且 FFmpeg 编译了 h264_nvenc）
+
+    Returns:
+        bool: 是否可用
+    """
+    try:
+        import av
+        import torch
+        available = torch.cuda.is_available() and 'h264_nvenc' in av.codecs_available
+    except ImportError:
+        available = False
+    logger.info(f"Video encoder: {'h264_nvenc' if available else 'libx264'}")
+    return available
 
 
 class AvatarManager:
@@ -39,6 +82,12 @@ class AvatarManager:
     - 与 MuseTalk 集成
     """
 
+    # 待机视频缓存的最大条目数（LRU 淘汰）
+    _idle_video_cache_size: int = 16
+
+    # 是否使用 NVENC 编码（None 表示尚未检测，首次编码时检测一次）
+    _nvenc_available: Optional[bool] = None
+
     def __init__(
         self,
         enable_real: bool = False,
@@ -63,9 +112,9 @@ class AvatarManager:
         self.conda_env = conda_env
         self.ffmpeg_path = ffmpeg_path or "ffmpeg"
 
-        # 视频缓存：{(avatar_id, duration, fps): base64_video_data}
-        # 参考 try/lip-sync 的实现，缓存生成的视频以避免重复生成
-        self._idle_video_cache: Dict[tuple, str] = {}
+        # 视频缓存：{(avatar_id, duration, fps): MP4 视频数据}
+        # 参考 try/lip-sync 的实现，缓存生成的视频以避免重复生成；按 LRU 限制条目数
+        self._idle_video_cache: OrderedDict[tuple, bytes] = OrderedDict()
 
         # 实时推理引擎缓存：{avatar_id: MuseTalkRealtimeEngine}
         # 每个 avatar 使用独立的推理引擎实例
@@ -462,7 +511,8 @@ class AvatarManager:
             Dict: Mock 创建结果
         """
         # 模拟处理延迟
-        await asyncio.sleep(1.0)
+        if settings.mock_delay_enabled:
+            await asyncio.sleep(1.0)
 
         # 创建 Mock Avatar 目录
         avatar_path = os.path.join(self.avatars_dir, avatar_id)
@@ -537,37 +587,45 @@ class AvatarManager:
         列出所有 Avatar
 
         Returns:
-            list: Avatar ID 列表
+            list: 按 ID 排序的 Avatar ID 列表
         """
-        if not os.path.exists(self.avatars_dir):
-            return []
-
         try:
-            avatars = [
-                d for d in os.listdir(self.avatars_dir)
-                if os.path.isdir(os.path.join(self.avatars_dir, d))
-            ]
-            return avatars
+            # 目录扫描在线程池中进行，avatar 很多时不阻塞事件循环
+            return await asyncio.to_thread(self._list_avatars_sync)
         except Exception as e:
             logger.error(f"Failed to list avatars: {e}")
             return []
 
+    def _list_avatars_sync(self) -> list:
+        """
+        扫描 avatars 目录（在线程池中运行）
+
+        Returns:
+            list: 按 ID 排序的 Avatar ID 列表
+        """
+        if not os.path.exists(self.avatars_dir):
+            return []
+
+        # scandir 的 is_dir() 直接使用目录项类型，不需要对每个条目单独 stat
+        with os.scandir(self.avatars_dir) as entries:
+            return sorted(entry.name for entry in entries if entry.is_dir())
+
     async def generate_video(
         self,
-        audio_data: str,
+        audio_data: Union[bytes, str],
         avatar_id: str,
         fps: int = 25
-    ) -> Optional[str]:
+    ) -> Optional[bytes]:
         """
         生成口型同步视频（Avatar + Audio）
 
         Args:
-            audio_data: base64 编码的音频数据
+            audio_data: 音频数据（原始字节，兼容 base64 字符串）
             avatar_id: Avatar ID
             fps: 视频帧率
 
         Returns:
-            str: base64 编码的视频数据，失败返回 None
+            bytes: MP4 视频数据（base64 编码只在发给 JSON 客户端时做一次），失败返回 None
         """
         if not self.enable_real:
             # Mock 模式
@@ -590,19 +648,19 @@ class AvatarManager:
 
     def _generate_video_sync(
         self,
-        audio_data: str,
+        audio_data: Union[bytes, str],
         avatar_id: str,
         fps: int
-    ) -> Optional[str]:
+    ) -> Optional[bytes]:
         """
         同步生成视频（在线程池中运行）
 
         步骤:
-        1. 解码 base64 音频数据
+        1. 取得音频字节
         2. 保存音频到临时文件
         3. 调用 MuseTalk 实时推理脚本
         4. 读取生成的视频
-        5. 编码为 base64 返回
+        5. 返回 MP4 字节
 
         参考: /workspace/MuseTalk/scripts/realtime_inference.py
         """
@@ -610,8 +668,8 @@ class AvatarManager:
         import tempfile
 
         try:
-            # 1. 解码音频数据
-            audio_bytes = base64.b64decode(audio_data)
+            # 1. 取得音频字节（内部传递原始字节，仅兼容旧调用方时解码 base64）
+            audio_bytes = audio_data if isinstance(audio_data, (bytes, bytearray, memoryview)) else base64.b64decode(audio_data)
 
             # 2. 保存音频到临时文件
             with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as audio_file:
@@ -643,24 +701,123 @@ class AvatarManager:
             with open(video_path, 'rb') as f:
                 video_bytes = f.read()
 
-            # 6. 编码为 base64
-            video_data = base64.b64encode(video_bytes).decode('utf-8')
-
-            # 7. 清理临时文件
+            # 6. 清理临时文件
             try:
                 os.unlink(audio_path)
                 os.unlink(video_path)
             except Exception as e:
                 logger.warning(f"Failed to clean up temp files: {e}")
 
-            logger.info(f"Video generated successfully: {len(video_data)} bytes")
-            return video_data
+            logger.info(f"Video generated successfully: {len(video_bytes)} bytes")
+            return video_bytes
 
         except Exception as e:
             logger.error(f"Error in _generate_video_sync: {e}")
             return self._generate_static_video(avatar_id)
 
-    def _generate_static_video(self, avatar_id: str) -> Optional[str]:
+    def _encode_mp4(self, frames: List[np.ndarray], fps: int, archive: bool = False) -> bytes:
+        """
+        在内存中把 BGR 帧编码为 MP4（PyAV + BytesIO，不经过临时文件）
+
+        有 CUDA 且 FFmpeg 编译了 NVENC 时使用 h264_nvenc，否则使用 libx264；
+        NVENC 编码失败（如驱动不可用）时自动回退到 libx264，之后不再尝试 NVENC。
+
+        Args:
+            frames: BGR 帧（numpy array）列表
+            fps: 视频帧率
+            archive: 是否使用画质优先的参数（保存到磁盘的视频），默认使用低延迟参数
+
+        Returns:
+            bytes: MP4 视频数据
+        """
+        options = _ARCHIVE_ENCODER_OPTIONS if archive else _ENCODER_OPTIONS
+        if AvatarManager._nvenc_available is None:
+            AvatarManager._nvenc_available = _detect_nvenc()
+
+        if AvatarManager._nvenc_available:
+            try:
+                return self._encode_mp4_with(frames, fps, 'h264_nvenc', options['h264_nvenc'])
+            except Exception as e:
+                logger.warning(f"NVENC encoding failed, falling back to libx264: {e}")
+                AvatarManager._nvenc_available = False
+
+        return self._encode_mp4_with(frames, fps, 'libx264', options['libx264'])
+
+    def save_idle_clip(self, frames: List[np.ndarray], path: str, fps: int = 25) -> bool:
+        """
+        把待机帧编码为 MP4 保存（供之后直接解码视频，不再逐帧读取 PNG）
+
+        先写入临时文件再原子替换，并发读取时不会读到写了一半的文件。
+        使用画质优先的编码参数：之后每次加载都从这个文件解码，不应叠加低延迟编码的损失。
+
+        Args:
+            frames: BGR 帧（numpy array）列表
+            path: 输出文件路径
+            fps: 视频帧率
+
+        Returns:
+            bool: 是否保存成功
+        """
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            video_bytes = self._encode_mp4(frames, fps, archive=True)
+            with open(tmp_path, "wb") as f:
+                f.write(video_bytes)
+            os.replace(tmp_path, path)
+            logger.info(f"Idle clip saved: {path} ({len(frames)} frames, {len(video_bytes)} bytes)")
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to save idle clip {path}: {e}")
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return False
+
+    def _encode_mp4_with(self, frames: List[np.ndarray], fps: int, codec: str, options: Dict[str, str]) -> bytes:
+        """
+        用指定编码器在内存中编码 MP4
+
+        无 B 帧、GOP 为 1 秒（客户端无需等待即可开始播放）。
+
+        Args:
+            frames: BGR 帧（numpy array）列表
+            fps: 视频帧率
+            codec: 'h264_nvenc' 或 'libx264'
+            options: 编码器参数（_ENCODER_OPTIONS 或 _ARCHIVE_ENCODER_OPTIONS 中对应 codec 的一项）
+
+        Returns:
+            bytes: MP4 视频数据
+        """
+        import io
+        import av
+
+        output = io.BytesIO()
+        container = av.open(output, mode='w', format='mp4')
+        stream = None
+        try:
+            for frame in frames:
+                # yuv420p 要求宽高为偶数
+                height, width = frame.shape[:2]
+                frame = frame[:height - height % 2, :width - width % 2]
+                if stream is None:
+                    stream = container.add_stream(codec, rate=fps)
+                    stream.width = frame.shape[1]
+                    stream.height = frame.shape[0]
+                    stream.pix_fmt = 'yuv420p'
+                    stream.gop_size = fps
+                    stream.options = options
+                video_frame = av.VideoFrame.from_ndarray(frame, format='bgr24')
+                for packet in stream.encode(video_frame):
+                    container.mux(packet)
+            if stream is not None:
+                for packet in stream.encode():
+                    container.mux(packet)
+        finally:
+            container.close()
+        return output.getvalue()
+
+    def _generate_static_video(self, avatar_id: str) -> Optional[FallbackVideo]:
         """
         生成静态视频（降级方案）
 
@@ -670,11 +827,8 @@ class AvatarManager:
             avatar_id: Avatar ID
 
         Returns:
-            str: base64 编码的视频数据，失败返回 None
+            FallbackVideo: MP4 视频数据，失败返回 None
         """
-        import base64
-        import tempfile
-
         try:
             # 查找 avatar 的第一张图片 (优先使用 avatars_dir)
             avatar_path = os.path.join(self.avatars_dir, avatar_id)
@@ -698,42 +852,17 @@ class AvatarManager:
             first_image = images[0]
             logger.info(f"Using static image: {first_image}")
 
-            # 使用 ffmpeg 从单张图片生成 2 秒的视频
-            with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as video_file:
-                video_path = video_file.name
-
-            cmd = [
-                self.ffmpeg_path,
-                '-loop', '1',
-                '-i', first_image,
-                '-t', '2',  # 2 秒视频
-                '-c:v', 'libx264',
-                '-pix_fmt', 'yuv420p',
-                '-vf', 'scale=trunc(iw/2)*2:trunc(ih/2)*2',  # 确保尺寸是偶数
-                '-y',
-                video_path
-            ]
-
-            result = subprocess.run(cmd, capture_output=True, text=True)
-
-            if result.returncode != 0:
-                logger.error(f"Failed to create static video: {result.stderr}")
+            # 从单张图片生成 2 秒的视频（在内存中编码）
+            import cv2
+            frame = cv2.imread(first_image)
+            if frame is None:
+                logger.error(f"Failed to read image: {first_image}")
                 return None
 
-            # 读取视频并编码
-            with open(video_path, 'rb') as f:
-                video_bytes = f.read()
+            video_bytes = FallbackVideo(self._encode_mp4([frame] * (2 * 25), fps=25))
 
-            video_data = base64.b64encode(video_bytes).decode('utf-8')
-
-            # 清理临时文件
-            try:
-                os.unlink(video_path)
-            except:
-                pass
-
-            logger.info(f"Static video generated: {len(video_data)} bytes")
-            return video_data
+            logger.info(f"Static video generated: {len(video_bytes)} bytes")
+            return video_bytes
 
         except Exception as e:
             logger.error(f"Error generating static video: {e}")
@@ -916,39 +1045,37 @@ class AvatarManager:
 
     async def _mock_generate_video(
         self,
-        audio_data: str,
+        audio_data: Union[bytes, str],
         avatar_id: str,
         fps: int
-    ) -> Optional[str]:
+    ) -> Optional[bytes]:
         """
         Mock 视频生成（用于测试）
 
         Args:
-            audio_data: base64 编码的音频数据
+            audio_data: 音频数据（原始字节，兼容 base64 字符串）
             avatar_id: Avatar ID
             fps: 视频帧率
 
         Returns:
-            str: Mock base64 编码的视频数据
+            bytes: Mock 视频数据
         """
-        import base64
-
         # 模拟处理延迟
-        await asyncio.sleep(0.5)
+        if settings.mock_delay_enabled:
+            await asyncio.sleep(0.5)
 
         # 返回一个 Mock 视频数据（实际上是一个小的占位符）
-        mock_video = b"MOCK_VIDEO_DATA_" + avatar_id.encode() + b"_FPS_" + str(fps).encode()
-        video_data = base64.b64encode(mock_video).decode('utf-8')
+        mock_video = b"".join([b"MOCK_VIDEO_DATA_", avatar_id.encode(), b"_FPS_", str(fps).encode()])
 
-        logger.info(f"Mock video generated: {len(video_data)} bytes")
-        return video_data
+        logger.info(f"Mock video generated: {len(mock_video)} bytes")
+        return mock_video
 
     async def get_idle_video(
         self,
         avatar_id: str,
         duration: int = 5,
         fps: int = 25
-    ) -> Optional[str]:
+    ) -> Optional[bytes]:
         """
         获取 Avatar 的待机视频（循环播放的静态视频）
 
@@ -958,12 +1085,23 @@ class AvatarManager:
             fps: 视频帧率
 
         Returns:
-            str: base64 编码的待机视频数据，失败返回 None
+            bytes: MP4 待机视频数据，失败返回 None
         """
         if not self.enable_real:
             # Mock 模式
             return await self._mock_get_idle_video(avatar_id, duration, fps)
 
+        # 缓存命中时直接返回，不再进入线程池
+        cache_key = (avatar_id, duration, fps)
+        video_data = self._idle_video_cache.get(cache_key)
+        if video_data is not None:
+            try:
+                self._idle_video_cache.move_to_end(cache_key)
+            except KeyError:
+                pass  # 已被线程池中的写入淘汰
+            logger.info(f"Returning cached idle video for {avatar_id} (duration={duration}s, fps={fps})")
+            return video_data
+
         try:
             # 在线程池中运行同步的视频生成过程
             loop = asyncio.get_event_loop()
@@ -984,7 +1122,7 @@ class AvatarManager:
         avatar_id: str,
         duration: int,
         fps: int
-    ) -> Optional[str]:
+    ) -> Optional[bytes]:
         """
         同步生成待机视频（在线程池中运行）
 
@@ -997,17 +1135,15 @@ class AvatarManager:
             fps: 视频帧率
 
         Returns:
-            str: base64 编码的视频数据，失败返回 None
+            bytes: MP4 视频数据，失败返回 None
         """
-        import base64
-        import tempfile
         import glob
 
-        # 检查缓存
+        # 检查缓存（线程池中可能有并发生成同一视频的任务已先完成）
         cache_key = (avatar_id, duration, fps)
-        if cache_key in self._idle_video_cache:
-            logger.info(f"Returning cached idle video for {avatar_id} (duration={duration}s, fps={fps})")
-            return self._idle_video_cache[cache_key]
+        video_data = self._idle_video_cache.get(cache_key)
+        if video_data is not None:
+            return video_data
 
         try:
             # 1. 查找 avatar 的图片帧
@@ -1034,74 +1170,27 @@ class AvatarManager:
 
             logger.info(f"Found {len(images)} frames for avatar {avatar_id}")
 
-            # 3. 创建临时输出文件
-            with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as video_file:
-                video_path = video_file.name
-
-            # 4. 使用 ffmpeg 从图片序列生成循环视频
-            # 计算需要循环多少次才能达到指定时长
+            # 3. 计算需要循环多少次才能达到指定时长
             total_frames = len(images)
             target_frames = duration * fps
             loop_count = max(1, int(target_frames / total_frames))
 
-            # 创建一个临时文件列表，包含循环的图片
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as list_file:
-                list_path = list_file.name
-                for _ in range(loop_count):
-                    for img in images:
-                        list_file.write(f"file '{img}'\n")
-                        list_file.write(f"duration {1.0/fps}\n")
-                # 最后一帧需要额外指定
-                list_file.write(f"file '{images[-1]}'\n")
-
-            # 5. 使用 ffmpeg concat 生成视频
-            cmd = [
-                self.ffmpeg_path,
-                '-f', 'concat',
-                '-safe', '0',
-                '-i', list_path,
-                '-c:v', 'libx264',
-                '-pix_fmt', 'yuv420p',
-                '-vf', f'fps={fps},scale=trunc(iw/2)*2:trunc(ih/2)*2',
-                '-t', str(duration),  # 限制时长
-                '-y',
-                video_path
-            ]
-
-            logger.info(f"Generating idle video: {duration}s @ {fps}fps")
-            result = subprocess.run(cmd, capture_output=True, text=True)
-
-            if result.returncode != 0:
-                logger.error(f"Failed to create idle video: {result.stderr}")
-                # 清理临时文件
-                try:
-                    os.unlink(list_path)
-                except:
-                    pass
-                return None
-
-            # 6. 读取生成的视频
-            if not os.path.exists(video_path):
-                logger.error(f"Generated idle video not found: {video_path}")
+            # 4. 读取图片帧（只读取时长内用得到的帧，每张只读一次，循环时复用）
+            import cv2
+            frames = [frame for frame in (cv2.imread(img) for img in images[:target_frames]) if frame is not None]
+            if not frames:
+                logger.error(f"Failed to read images in {full_imgs_dir}")
                 return None
 
-            with open(video_path, 'rb') as f:
-                video_bytes = f.read()
-
-            # 7. 编码为 base64
-            video_data = base64.b64encode(video_bytes).decode('utf-8')
-
-            # 8. 清理临时文件
-            try:
-                os.unlink(video_path)
-                os.unlink(list_path)
-            except Exception as e:
-                logger.warning(f"Failed to clean up temp files: {e}")
+            # 5. 在内存中编码循环视频（不再生成 concat 列表文件和临时输出文件）
+            logger.info(f"Generating idle video: {duration}s @ {fps}fps")
+            looped = (frames * loop_count)[:target_frames]
+            video_bytes = self._encode_mp4(looped, fps=fps)
 
-            # 9. 存入缓存（参考 try/lip-sync 的缓存策略）
-            self._idle_video_cache[cache_key] = video_data
-            logger.info(f"Idle video generated successfully: {len(video_data)} bytes (cached)")
-            return video_data
+            # 6. 存入缓存（参考 try/lip-sync 的缓存策略）
+            self._cache_idle_video(cache_key, video_bytes)
+            logger.info(f"Idle video generated successfully: {len(video_bytes)} bytes (cached)")
+            return video_bytes
 
         except Exception as e:
             logger.error(f"Error generating idle video: {e}")
@@ -1109,6 +1198,19 @@ class AvatarManager:
             logger.error(traceback.format_exc())
             return None
 
+    def _cache_idle_video(self, cache_key: tuple, video_data: bytes):
+        """
+        写入待机视频缓存，超过上限时淘汰最久未使用的条目
+
+        Args:
+            cache_key: (avatar_id, duration, fps)
+            video_data: MP4 视频数据
+        """
+        self._idle_video_cache[cache_key] = video_data
+        self._idle_video_cache.move_to_end(cache_key)
+        while len(self._idle_video_cache) > self._idle_video_cache_size:
+            self._idle_video_cache.popitem(last=False)
+
     def _get_realtime_engine(self, avatar_id: str) -> MuseTalkRealtimeEngine:
         """
         获取或创建实时推理引擎
@@ -1247,7 +1349,7 @@ class AvatarManager:
 
     async def generate_frames_stream(
         self,
-        audio_data: str,
+        audio_data: Union[bytes, str],
         avatar_id: str,
         fps: int = 25
     ) -> AsyncIterator[np.ndarray]:
@@ -1265,7 +1367,7 @@ class AvatarManager:
         参考: /workspace/virtual-tutor/lip-sync/musereal.py
 
         Args:
-            audio_data: base64 编码的音频数据
+            audio_data: 音频数据（原始字节，兼容 base64 字符串）
             avatar_id: Avatar ID
             fps: 视频帧率
 
@@ -1337,7 +1439,7 @@ class AvatarManager:
 
     async def _generate_frames_stream_fallback(
         self,
-        audio_data: str,
+        audio_data: Union[bytes, str],
         avatar_id: str,
         fps: int = 25
     ):
@@ -1347,7 +1449,7 @@ class AvatarManager:
         当实时引擎失败时使用此方法
 
         Args:
-            audio_data: base64 编码的音频数据
+            audio_data: 音频数据（原始字节，兼容 base64 字符串）
             avatar_id: Avatar ID
             fps: 视频帧率
 
@@ -1367,39 +1469,38 @@ class AvatarManager:
                 logger.error("Failed to generate video for streaming")
                 return
 
-            # 将 base64 视频解码并保存到临时文件
-            import base64
+            # 将视频保存到临时文件
             import tempfile
             import cv2
 
-            video_bytes = base64.b64decode(video_data)
-
             with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as tmp_file:
-                tmp_file.write(video_bytes)
+                tmp_file.write(video_data)
                 video_path = tmp_file.name
 
             try:
-                # 使用 cv2 读取视频并逐帧 yield
-                cap = cv2.VideoCapture(video_path)
-
-                if not cap.isOpened():
-                    logger.error(f"Failed to open video: {video_path}")
-                    return
+                # 使用 cv2 读取视频并逐帧 yield（打开和解码在线程池中进行，不阻塞事件循环）
+                cap = await asyncio.to_thread(cv2.VideoCapture, video_path)
 
-                frame_count = 0
-                while True:
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
+                try:
+                    if not cap.isOpened():
+                        logger.error(f"Failed to open video: {video_path}")
+                        return
+
+                    frame_count = 0
+                    while True:
+                        ret, frame = await asyncio.to_thread(cap.read)
+                        if not ret:
+                            break
 
-                    yield frame
-                    frame_count += 1
+                        yield frame
+                        frame_count += 1
 
-                    # 控制帧率
-                    await asyncio.sleep(1.0 / fps)
+                        # 控制帧率
+                        await asyncio.sleep(1.0 / fps)
 
-                cap.release()
-                logger.info(f"Streamed {frame_count} frames via WebRTC (fallback)")
+                    logger.info(f"Streamed {frame_count} frames via WebRTC (fallback)")
+                finally:
+                    cap.release()
 
             finally:
                 # 清理临时文件
@@ -1413,7 +1514,7 @@ class AvatarManager:
 
     def _generate_frames_sync(
         self,
-        audio_data: str,
+        audio_data: Union[bytes, str],
         avatar_id: str,
         fps: int,
         frame_queue: asyncio.Queue,
@@ -1425,7 +1526,7 @@ class AvatarManager:
         使用 MuseTalk 实时推理，逐帧生成并放入队列
 
         Args:
-            audio_data: base64 编码的音频数据
+            audio_data: 音频数据（原始字节，兼容 base64 字符串）
             avatar_id: Avatar ID
             fps: 视频帧率
             frame_queue: 帧队列（用于传递帧到主线程）
@@ -1437,8 +1538,8 @@ class AvatarManager:
         import numpy as np
 
         try:
-            # 1. 解码音频数据
-            audio_bytes = base64.b64decode(audio_data)
+            # 1. 取得音频字节（内部传递原始字节，仅兼容旧调用方时解码 base64）
+            audio_bytes = audio_data if isinstance(audio_data, (bytes, bytearray, memoryview)) else base64.b64decode(audio_data)
 
             # 2. 保存音频到临时文件
             with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as audio_file:
@@ -1615,7 +1716,7 @@ class AvatarManager:
         avatar_id: str,
         duration: int,
         fps: int
-    ) -> Optional[str]:
+    ) -> Optional[bytes]:
         """
         Mock 待机视频生成（用于测试）
 
@@ -1625,19 +1726,17 @@ class AvatarManager:
             fps: 视频帧率
 
         Returns:
-            str: Mock base64 编码的视频数据
+            bytes: Mock 视频数据
         """
-        import base64
-
         # 模拟处理延迟
-        await asyncio.sleep(0.3)
+        if settings.mock_delay_enabled:
+            await asyncio.sleep(0.3)
 
         # 返回一个 Mock 待机视频数据
-        mock_video = b"MOCK_IDLE_VIDEO_" + avatar_id.encode() + f"_{duration}s_{fps}fps".encode()
-        video_data = base64.b64encode(mock_video).decode('utf-8')
+        mock_video = b"".join([b"MOCK_IDLE_VIDEO_", avatar_id.encode(), f"_{duration}s_{fps}fps".encode()])
 
-        logger.info(f"Mock idle video generated: {len(video_data)} bytes")
-        return video_data
+        logger.info(f"Mock idle video generated: {len(mock_video)} bytes")
+        return mock_video
 
 
 # 全局 Avatar 管理器实例
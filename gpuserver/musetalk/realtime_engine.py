@@ -13,7 +13,7 @@ import logging
 import sys
 import os
 import time
-from typing import Optional, AsyncIterator
+from typing import Optional, AsyncIterator, Union
 import asyncio
 from queue import Queue, Empty
 from threading import Thread, Event
@@ -358,7 +358,7 @@ class MuseTalkRealtimeEngine:
 
     async def generate_frames(
         self,
-        audio_data: str,
+        audio_data: Union[bytes, str],
         fps: int = 25
     ) -> AsyncIterator[np.ndarray]:
         """
@@ -375,8 +375,8 @@ class MuseTalkRealtimeEngine:
         import subprocess
         import soundfile as sf
 
-        # 1. 解码音频
-        audio_bytes = base64.b64decode(audio_data)
+        # 1. 取得音频字节（兼容 base64 字符串）
+        audio_bytes = audio_data if isinstance(audio_data, (bytes, bytearray, memoryview)) else base64.b64decode(audio_data)
 
         # 检测音频格式并转换为 WAV（MuseTalk 需要 WAV 格式）
         # 先保存原始音频（可能是 MP3 或 WAV）
@@ -11,7 +11,7 @@ import os
 import signal
 import requests
 import base64
-from typing import Optional, AsyncIterator
+from typing import Optional, AsyncIterator, Union
 import asyncio
 import aiohttp
 
@@ -113,14 +113,14 @@ class SubprocessRealtimeEngine:
 
     async def generate_frames(
         self,
-        audio_data: str,
+        audio_data: Union[bytes, str],
         fps: int = 25
     ) -> AsyncIterator[bytes]:
         """
         生成视频帧流
 
         Args:
-            audio_data: base64编码的音频数据
+            audio_data: 音频数据（原始字节或 base64 字符串，HTTP 请求中以 base64 传输）
             fps: 帧率
 
         Yields:
@@ -132,7 +132,7 @@ class SubprocessRealtimeEngine:
         # 准备请求
         generate_url = f"{self.service_url}/generate"
         payload = {
-            "audio_data": audio_data,
+            "audio_data": audio_data if isinstance(audio_data, str) else base64.b64encode(audio_data).decode("ascii"),
             "fps": fps
         }
 
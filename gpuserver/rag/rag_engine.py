@@ -17,9 +17,13 @@ For full implementation, refer to /workspace/try/rag/
 import asyncio
 import logging
 import os
+from functools import lru_cache
 from typing import Optional, List, Dict, Any
 
+from config import get_settings
+
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 
 class RAGEngine:
@@ -120,6 +124,7 @@ class RAGEngine:
         Returns:
             List[Dict]: 检索到的文档列表
                 [{
+                    "doc_id": "文档块 ID",
                     "content": "文档内容",
                     "score": 0.95,
                     "source": "文档来源",
@@ -196,23 +201,27 @@ class RAGEngine:
             List[Dict]: Mock 检索结果
         """
         # 模拟处理延迟
-        await asyncio.sleep(0.2)
+        if settings.mock_delay_enabled:
+            await asyncio.sleep(0.2)
 
         # Mock 结果
         mock_results = [
             {
+                "doc_id": f"{kb_id}:1",
                 "content": f"[Mock RAG] 这是关于 '{query}' 的相关知识库内容 1",
                 "score": 0.95,
                 "source": f"knowledge_base_{kb_id}",
                 "page": 1
             },
             {
+                "doc_id": f"{kb_id}:2",
                 "content": f"[Mock RAG] 这是关于 '{query}' 的相关知识库内容 2",
                 "score": 0.88,
                 "source": f"knowledge_base_{kb_id}",
                 "page": 2
             },
             {
+                "doc_id": f"{kb_id}:5",
                 "content": f"[Mock RAG] 这是关于 '{query}' 的相关知识库内容 3",
                 "score": 0.82,
                 "source": f"knowledge_base_{kb_id}",
@@ -228,6 +237,10 @@ class RAGEngine:
         """
         将检索到的文档格式化为 LLM 上下文
 
+        文档按 doc_id（无则按来源和页码）排序，且不包含随查询变化的相关度分数，
+        这样命中同一组文档的请求得到完全相同的 prompt 前缀，LLM 服务端（Ollama）
+        可以复用该前缀的 KV 缓存，只需对问题部分做 prefill。
+
         Args:
             retrieved_docs: 检索到的文档列表
 
@@ -239,14 +252,17 @@ class RAGEngine:
 
         context_parts = ["以下是相关的知识库内容：\n"]
 
-        for i, doc in enumerate(retrieved_docs, 1):
+        ordered_docs = sorted(
+            retrieved_docs,
+            key=lambda doc: (str(doc.get("doc_id", "")), str(doc.get("source", "")), str(doc.get("page", "")))
+        )
+        for i, doc in enumerate(ordered_docs, 1):
             content = doc.get("content", "")
             source = doc.get("source", "unknown")
             page = doc.get("page", "")
-            score = doc.get("score", 0.0)
 
             context_parts.append(
-                f"[文档 {i}] (来源: {source}, 页码: {page}, 相关度: {score:.2f})\n"
+                f"[文档 {i}] (来源: {source}, 页码: {page})\n"
                 f"{content}\n"
             )
 
@@ -255,17 +271,15 @@ class RAGEngine:
         return "\n".join(context_parts)
 
 
-# 全局 RAG 引擎实例
-_rag_engine: Optional[RAGEngine] = None
-
-
+# 按 RAG 服务 URL / top_k 配置各返回一个实例（取代首次调用的参数决定全局单例的旧行为）
+@lru_cache(maxsize=8)
 def get_rag_engine(
     enable_real: bool = False,
     rag_url: Optional[str] = None,
     top_k: int = 5
 ) -> RAGEngine:
     """
-    获取 RAG 引擎实例（单例模式）
+    获取 RAG 引擎实例（按配置参数缓存）
 
     Args:
         enable_real: 是否启用真实 RAG
@@ -275,13 +289,8 @@ def get_rag_engine(
     Returns:
         RAGEngine: RAG 引擎实例
     """
-    global _rag_engine
-
-    if _rag_engine is None:
-        _rag_engine = RAGEngine(
-            enable_real=enable_real,
-            rag_url=rag_url,
-            top_k=top_k
-        )
-
-    return _rag_engine
+    return RAGEngine(
+        enable_real=enable_real,
+        rag_url=rag_url,
+        top_k=top_k
+    )
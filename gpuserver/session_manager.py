@@ -3,6 +3,7 @@ import time
 from typing import Dict, Optional
 from dataclasses import dataclass, field
 from datetime import datetime
+from functools import cached_property
 import secrets
 
 
@@ -18,6 +19,16 @@ class Session:
     created_at: float = field(default_factory=time.time)
     last_activity: float = field(default_factory=time.time)
 
+    @cached_property
+    def created_at_iso(self) -> str:
+        """创建时间（ISO 格式，创建后不变，只格式化一次）"""
+        return datetime.fromtimestamp(self.created_at).isoformat()
+
+    @property
+    def last_activity_iso(self) -> str:
+        """最后活动时间（ISO 格式）"""
+        return datetime.fromtimestamp(self.last_activity).isoformat()
+
     def to_dict(self) -> dict:
         """转换为字典"""
         return {
@@ -27,8 +38,8 @@ class Session:
             "kb_id": self.kb_id,
             "engine_token": self.engine_token,
             "status": self.status,
-            "created_at": datetime.fromtimestamp(self.created_at).isoformat(),
-            "last_activity": datetime.fromtimestamp(self.last_activity).isoformat(),
+            "created_at": self.created_at_iso,
+            "last_activity": self.last_activity_iso,
         }
 
 
@@ -7,12 +7,24 @@ Supports:
 """
 
 import asyncio
-import base64
+import binascii
 import io
 import logging
+from functools import lru_cache
 from typing import Optional
 
+from config import get_settings
+
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class FallbackAudio(bytes):
+    """
+    Mock 静音音频（Mock 模式，或 Edge TTS 调用失败时的降级结果）
+
+    与普通 bytes 用法相同；调用方可以用 isinstance 判断，避免把它写入合成结果缓存。
+    """
 
 
 class TTSEngine:
@@ -42,6 +54,9 @@ class TTSEngine:
         """
         self.voice = voice
         self.enable_real = enable_real
+        # Mock 静音音频（base64），首次使用时生成
+        self._mock_audio_base64: Optional[str] = None
+        self._mock_audio_bytes: Optional[bytes] = None
 
         if self.enable_real:
             try:
@@ -73,14 +88,36 @@ class TTSEngine:
 
         try:
             # 使用 Edge TTS 合成
-            audio_data = await self._synthesize_with_edge_tts(text)
-            return audio_data
+            audio_bytes = await self._synthesize_with_edge_tts(text)
+            return binascii.b2a_base64(audio_bytes, newline=False).decode("ascii")
         except Exception as e:
             logger.error(f"TTS synthesis failed: {e}")
             # 降级到 Mock 模式
             return await self._mock_synthesize(text)
 
-    async def _synthesize_with_edge_tts(self, text: str) -> str:
+    async def synthesize_bytes(self, text: str, language: str = "zh") -> bytes:
+        """
+        将文本转换为语音，直接返回原始音频字节（不做 base64 编码）
+
+        供引擎内部流水线使用，base64 编码只在 API 边界做一次。
+
+        Args:
+            text: 要合成的文本
+            language: 语言代码（zh: 中文, en: 英文）
+
+        Returns:
+            bytes: 音频数据（MP3 格式；Mock 模式或合成失败时为 FallbackAudio 静音 WAV）
+        """
+        if not self.enable_real:
+            return await self._mock_synthesize_bytes(text)
+
+        try:
+            return await self._synthesize_with_edge_tts(text)
+        except Exception as e:
+            logger.error(f"TTS synthesis failed: {e}")
+            return await self._mock_synthesize_bytes(text)
+
+    async def _synthesize_with_edge_tts(self, text: str) -> bytes:
         """
         使用 Edge TTS 合成语音
 
@@ -88,7 +125,7 @@ class TTSEngine:
             text: 要合成的文本
 
         Returns:
-            str: base64 编码的音频数据（MP3 格式）
+            bytes: 音频数据（MP3 格式）
         """
         import tempfile
         import os
@@ -102,14 +139,12 @@ class TTSEngine:
             communicate = self.edge_tts.Communicate(text, self.voice)
             await communicate.save(tmp_path)
 
-            # 读取并编码为 base64
             with open(tmp_path, "rb") as f:
                 audio_bytes = f.read()
-                audio_base64 = base64.b64encode(audio_bytes).decode("utf-8")
 
             logger.info(f"TTS synthesized: {len(audio_bytes)} bytes, text={text[:50]}...")
 
-            return audio_base64
+            return audio_bytes
 
         finally:
             # 清理临时文件
@@ -122,7 +157,8 @@ class TTSEngine:
         """
         Mock 合成（用于测试）
 
-        生成一个有效的 WAV 音频文件（静音），这样可以被 ffmpeg 正确处理
+        生成一个有效的 WAV 音频文件（静音），这样可以被 ffmpeg 正确处理。
+        静音内容与文本无关，首次调用时在内存中生成并缓存 base64 结果。
 
         Args:
             text: 要合成的文本
@@ -130,60 +166,70 @@ class TTSEngine:
         Returns:
             str: Mock 音频数据（base64 编码的 WAV 文件）
         """
-        import wave
-        import tempfile
-        import os
+        audio_bytes = await self._mock_synthesize_bytes(text)
+
+        if self._mock_audio_base64 is None:
+            self._mock_audio_base64 = binascii.b2a_base64(audio_bytes, newline=False).decode("ascii")
+
+        return self._mock_audio_base64
+
+    async def _mock_synthesize_bytes(self, text: str) -> bytes:
+        """
+        Mock 合成，返回原始 WAV 字节（首次调用时生成并缓存）
 
+        Args:
+            text: 要合成的文本
+
+        Returns:
+            bytes: Mock 音频数据（WAV 文件）
+        """
         # 模拟处理延迟
-        await asyncio.sleep(0.4)
+        if settings.mock_delay_enabled:
+            await asyncio.sleep(0.4)
+
+        if self._mock_audio_bytes is None:
+            self._mock_audio_bytes = self._build_mock_audio()
+
+        return self._mock_audio_bytes
+
+    @staticmethod
+    def _build_mock_audio() -> "FallbackAudio":
+        """
+        在内存中生成 2 秒静音 WAV
+
+        Returns:
+            FallbackAudio: WAV 文件内容
+        """
+        import wave
 
         # 生成一个有效的 WAV 文件（2秒静音）
         sample_rate = 16000  # 16kHz
         duration = 2  # 2秒
         num_samples = sample_rate * duration
 
-        # 创建临时 WAV 文件
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp_file:
-            tmp_path = tmp_file.name
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav_file:
+            wav_file.setnchannels(1)  # 单声道
+            wav_file.setsampwidth(2)  # 16-bit
+            wav_file.setframerate(sample_rate)
 
-        try:
-            # 写入 WAV 文件
-            with wave.open(tmp_path, 'wb') as wav_file:
-                wav_file.setnchannels(1)  # 单声道
-                wav_file.setsampwidth(2)  # 16-bit
-                wav_file.setframerate(sample_rate)
-
-                # 写入静音数据（全零）
-                silence = b'\x00\x00' * num_samples
-                wav_file.writeframes(silence)
-
-            # 读取并编码为 base64
-            with open(tmp_path, 'rb') as f:
-                audio_bytes = f.read()
-                audio_base64 = base64.b64encode(audio_bytes).decode("utf-8")
+            # 写入静音数据（全零）
+            wav_file.writeframes(bytes(2 * num_samples))
 
-            logger.info(f"Mock TTS synthesized: {len(audio_bytes)} bytes WAV file")
+        audio_bytes = FallbackAudio(buffer.getvalue())
+        logger.info(f"Mock TTS synthesized: {len(audio_bytes)} bytes WAV file (cached)")
 
-            return audio_base64
-
-        finally:
-            # 清理临时文件
-            try:
-                os.unlink(tmp_path)
-            except:
-                pass
-
-
-# 全局 TTS 引擎实例
-_tts_engine: Optional[TTSEngine] = None
+        return audio_bytes
 
 
+# 按 voice 配置各返回一个实例（取代首次调用的参数决定全局单例的旧行为）
+@lru_cache(maxsize=8)
 def get_tts_engine(
     voice: str = "zh-CN-XiaoxiaoNeural",
     enable_real: bool = True
 ) -> TTSEngine:
     """
-    获取 TTS 引擎实例（单例模式）
+    获取 TTS 引擎实例（按配置参数缓存）
 
     Args:
         voice: Edge TTS 声音名称
@@ -192,12 +238,7 @@ def get_tts_engine(
     Returns:
         TTSEngine: TTS 引擎实例
     """
-    global _tts_engine
-
-    if _tts_engine is None:
-        _tts_engine = TTSEngine(
-            voice=voice,
-            enable_real=enable_real
-        )
-
-    return _tts_engine
+    return TTSEngine(
+        voice=voice,
+        enable_real=enable_real
+    )
@@ -16,8 +16,7 @@ import uuid
 import re
 import os
 import time
-from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, Union
 import numpy as np
 import cv2
 from aiortc import RTCPeerConnection, RTCSessionDescription, VideoStreamTrack, AudioStreamTrack, RTCIceServer, RTCConfiguration
@@ -29,8 +28,13 @@ import base64
 import io
 import av
 
+from ws_codec import now_iso, send_ws_message
+
 logger = logging.getLogger(__name__)
 
+# SDP 中 c= 行的 IPv4 地址（模块加载时编译一次）
+_SDP_CONNECTION_IP = re.compile(r'c=IN IP4 \d+\.\d+\.\d+\.\d+')
+
 # 延迟加载配置，避免循环导入
 _config = None
 
@@ -101,7 +105,8 @@ class AvatarVideoTrack(VideoStreamTrack):
         self._start = None
         self.current_frame_count = 0
         
-        self.idle_frames = idle_frames or []
+        # 待机帧：(N, H, W, 3) 连续数组或帧列表
+        self.idle_frames = idle_frames if idle_frames is not None else []
         self.idle_frame_index = 0
         
         # 时间常量 - 与 try 完全一致
@@ -187,19 +192,39 @@ class AvatarVideoTrack(VideoStreamTrack):
     
     def _get_idle_frame(self):
         """获取 idle frame"""
-        if self.idle_frames and len(self.idle_frames) > 0:
+        if len(self.idle_frames) > 0:
             idle_frame = self.idle_frames[self.idle_frame_index]
             self.idle_frame_index = (self.idle_frame_index + 1) % len(self.idle_frames)
             return VideoFrame.from_ndarray(idle_frame, format="bgr24")
         else:
             return VideoFrame.from_ndarray(np.zeros((512, 512, 3), dtype=np.uint8), format="bgr24")
 
-    def set_idle_frames(self, frames: list):
-        """设置待机帧"""
+    def set_idle_frames(self, frames):
+        """设置待机帧（(N, H, W, 3) 连续数组或帧列表）"""
         self.idle_frames = frames
         self.idle_frame_index = 0
         logger.info(f"Set {len(frames)} idle frames for WebRTC track")
     
+    async def add_frame(self, frame: np.ndarray):
+        """
+        放入一帧视频（BGR numpy 数组）
+
+        Args:
+            frame: numpy array (H, W, 3) in BGR format
+        """
+        self._queue.put_nowait((VideoFrame.from_ndarray(frame, format="bgr24"), None))
+
+    def add_frames(self, frames: list):
+        """
+        批量放入多帧视频，一次调用完成，不经过事件循环调度
+
+        Args:
+            frames: numpy array (H, W, 3) BGR 帧列表
+        """
+        put = self._queue.put_nowait
+        for frame in frames:
+            put((VideoFrame.from_ndarray(frame, format="bgr24"), None))
+
     async def end_stream(self):
         """结束流"""
         await self._queue.put((None, None))
@@ -381,10 +406,10 @@ class WebRTCStreamer:
             # 通知前端连接状态变化
             if session_id in self.websockets:
                 try:
-                    await self.websockets[session_id].send_json({
+                    await send_ws_message(self.websockets[session_id], {
                         "type": "webrtc_state",
                         "state": pc.connectionState,
-                        "timestamp": datetime.now().isoformat()
+                        "timestamp": now_iso()
                     })
                     logger.info(f"Sent WebRTC state to frontend: {pc.connectionState}")
                 except Exception as e:
@@ -408,6 +433,10 @@ class WebRTCStreamer:
         expect to receive them via onicecandidate events. This method
         extracts candidates from SDP and sends them separately.
 
+        所有 candidate 都来自同一个 SDP，一次性就能全部取出。客户端声明了
+        caps {"ice_batch": true} 时合并为一条 webrtc_ice_candidates 消息发送，
+        否则保持逐条发送 webrtc_ice_candidate。
+
         Args:
             sdp: SDP string containing ICE candidates
             session_id: Session identifier
@@ -417,6 +446,7 @@ class WebRTCStreamer:
             lines = sdp.split('\n')
             sdp_mline_index = -1
             sdp_mid = None
+            candidates = []
 
             for line in lines:
                 # Track media line index
@@ -440,16 +470,28 @@ class WebRTCStreamer:
                         logger.info(f"Skipping non-relay candidate (port not accessible): {candidate_str[:60]}...")
                         continue
 
-                    # Send candidate to client
-                    await websocket.send_json({
+                    candidates.append({
+                        "candidate": candidate_str,
+                        "sdpMLineIndex": sdp_mline_index,
+                        "sdpMid": sdp_mid
+                    })
+
+            caps = getattr(websocket.state, "caps", None) or {}
+            if caps.get("ice_batch") and candidates:
+                # Send all candidates to client in one frame
+                await send_ws_message(websocket, {
+                    "type": "webrtc_ice_candidates",
+                    "candidates": candidates
+                })
+                logger.info(f"Sent {len(candidates)} relay ICE candidates to client in one message for session {session_id}")
+            else:
+                # Send candidates to client one by one
+                for candidate in candidates:
+                    await send_ws_message(websocket, {
                         "type": "webrtc_ice_candidate",
-                        "candidate": {
-                            "candidate": candidate_str,
-                            "sdpMLineIndex": sdp_mline_index,
-                            "sdpMid": sdp_mid
-                        }
+                        "candidate": candidate
                     })
-                    logger.info(f"Sent relay ICE candidate to client for session {session_id}: {candidate_str[:60]}...")
+                    logger.info(f"Sent relay ICE candidate to client for session {session_id}: {candidate['candidate'][:60]}...")
 
             logger.info(f"Finished sending ICE candidates for session {session_id}")
         except Exception as e:
@@ -470,7 +512,7 @@ class WebRTCStreamer:
 
         # 替换 c= 行中的IP地址
         # c=IN IP4 192.168.x.x -> c=IN IP4 51.161.209.200
-        sdp = re.sub(r'c=IN IP4 \d+\.\d+\.\d+\.\d+', f'c=IN IP4 {public_ip}', sdp)
+        sdp = _SDP_CONNECTION_IP.sub(f'c=IN IP4 {public_ip}', sdp)
 
         # 过滤candidates：只保留relay类型，移除host和srflx类型
         # 原因：只有 10110-10115 端口被映射到公网，其他端口（如 39498）无法访问
@@ -614,20 +656,34 @@ class WebRTCStreamer:
         else:
             logger.warning(f"No video track found for session {session_id}")
 
-    async def prepare_audio_chunks(self, audio_base64: str) -> list:
+    async def stream_frames(self, session_id: str, frames: list):
+        """
+        Stream a batch of frames to the client in one call
+
+        Args:
+            session_id: Session identifier
+            frames: list of numpy arrays (H, W, 3) in BGR format
+        """
+        video_track = self.video_tracks.get(session_id)
+        if video_track is not None:
+            video_track.add_frames(frames)
+        else:
+            logger.warning(f"No video track found for session {session_id}")
+
+    async def prepare_audio_chunks(self, audio_data: Union[bytes, str]) -> list:
         """
         预先准备音频 chunks（用于同步推送）
         与 try 的实现保持一致：16kHz, 320 samples/chunk
 
         Args:
-            audio_base64: base64 encoded audio (MP3 or WAV)
+            audio_data: raw audio bytes (MP3 or WAV); base64 strings are still accepted
 
         Returns:
             list: 音频 chunk 列表，每个 chunk 是 320 samples (20ms @ 16kHz) 的 numpy array
         """
         try:
-            # 解码 base64
-            audio_bytes = base64.b64decode(audio_base64)
+            # 内部传递原始字节，仅兼容旧调用方时解码 base64
+            audio_bytes = audio_data if isinstance(audio_data, (bytes, bytearray, memoryview)) else base64.b64decode(audio_data)
 
             # 使用 PyAV 解码音频
             container = av.open(io.BytesIO(audio_bytes))
@@ -662,13 +718,13 @@ class WebRTCStreamer:
             logger.error(f"Failed to prepare audio chunks: {e}", exc_info=True)
             return []
 
-    async def stream_audio(self, session_id: str, audio_base64: str):
+    async def stream_audio(self, session_id: str, audio_data: Union[bytes, str]):
         """
         Stream audio to WebRTC audio track（独立推送，用于非同步场景）
 
         Args:
             session_id: Session identifier
-            audio_base64: base64 encoded audio (MP3 or WAV)
+            audio_data: raw audio bytes (MP3 or WAV); base64 strings are still accepted
         """
         if session_id not in self.audio_tracks:
             logger.warning(f"Audio track not found for session {session_id}")
@@ -676,9 +732,9 @@ class WebRTCStreamer:
 
         try:
             audio_track = self.audio_tracks[session_id]
-            logger.info(f"[Audio] Starting audio preparation for {session_id}, audio_base64 length: {len(audio_base64)}")
+            logger.info(f"[Audio] Starting audio preparation for {session_id}, audio length: {len(audio_data)}")
             
-            chunks = await self.prepare_audio_chunks(audio_base64)
+            chunks = await self.prepare_audio_chunks(audio_data)
             
             logger.info(f"[Audio] Prepared {len(chunks)} chunks for {session_id}")
             
@@ -695,13 +751,13 @@ class WebRTCStreamer:
         except Exception as e:
             logger.error(f"Failed to stream audio: {e}", exc_info=True)
 
-    def set_idle_frames(self, session_id: str, frames: list):
+    def set_idle_frames(self, session_id: str, frames):
         """
         Set idle video frames for a session
 
         Args:
             session_id: Session identifier
-            frames: List of numpy arrays (H, W, 3) in BGR format
+            frames: (N, H, W, 3) uint8 array or list of (H, W, 3) arrays in BGR format
         """
         if session_id in self.video_tracks:
             video_track = self.video_tracks[session_id]
@@ -752,6 +808,11 @@ def get_webrtc_streamer() -> WebRTCStreamer:
     """
     Get global WebRTC streamer instance (singleton)
 
+    The instance is created on the first call (inside the serving event loop) and
+    every later call is a single global lookup, so handlers can call this per
+    message without caching the result themselves. Each uvicorn worker process
+    runs one event loop and therefore owns exactly one streamer.
+
     Returns:
         WebRTCStreamer: Global streamer instance
     """
@@ -0,0 +1,77 @@
+"""
+WebSocket 消息编码
+
+所有服务端主动发送的 WebSocket 消息都经过这里，按连接协商的格式编码：
+默认用 orjson 序列化为 JSON 文本帧；连接时带 msgpack=true 的客户端收到 MessagePack 二进制帧。
+消息中的 timestamp 字段由 now_iso() 生成；客户端发来的 base64 音频由 b64decode() 解码。
+"""
+
+import binascii
+import time
+from datetime import datetime
+from typing import Any, Union
+
+import orjson
+import ormsgpack
+
+try:
+    # SIMD（SSSE3 / AVX2）加速的 base64，未安装时回退到 binascii
+    import pybase64
+except ImportError:
+    pybase64 = None
+
+# now_iso() 的时间戳精度（秒）：同一时间片内的消息复用同一个字符串
+_TIMESTAMP_RESOLUTION = 0.01
+_cached_tick = -1
+_cached_timestamp = ""
+
+
+def now_iso() -> str:
+    """
+    当前时间的 ISO 格式字符串（10ms 内复用缓存的字符串）
+
+    只在时间片变化时才构造 datetime 并格式化，高频发送消息时省去大部分格式化开销；
+    不需要后台定时任务刷新。
+
+    Returns:
+        str: ISO 8601 时间戳
+    """
+    global _cached_tick, _cached_timestamp
+    now = time.time()
+    tick = int(now / _TIMESTAMP_RESOLUTION)
+    if tick != _cached_tick:
+        _cached_timestamp = datetime.fromtimestamp(now).isoformat()
+        _cached_tick = tick
+    return _cached_timestamp
+
+
+async def send_ws_message(websocket, message: Any):
+    """
+    按连接的协议发送一条消息
+
+    Args:
+        websocket: WebSocket 连接（websocket.state.msgpack 为 True 时使用 MessagePack）
+        message: dict 或消息 dataclass
+    """
+    if getattr(websocket.state, "msgpack", False):
+        await websocket.send_bytes(ormsgpack.packb(message))
+    else:
+        await websocket.send_text(orjson.dumps(message).decode("utf-8"))
+
+
+def b64decode(data: Union[str, bytes]) -> bytes:
+    """
+    解码客户端发来的 base64 数据（安装了 pybase64 时使用 SIMD 实现）
+
+    Args:
+        data: base64 字符串或字节
+
+    Returns:
+        bytes: 解码后的原始字节
+
+    Raises:
+        binascii.Error: 不是合法的 base64
+    """
+    if pybase64 is not None:
+        return pybase64.b64decode(data, validate=False)
+    return binascii.a2b_base64(data)